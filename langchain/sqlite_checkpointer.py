@@ -0,0 +1,655 @@
+import asyncio
+import copy
+import functools
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.base import SerializerProtocol
+
+
+"""
+InMemorySaver keeps every thread_id conversation (full message history and tool results) in process memory for as long as the process lives, and loses all of it on restart.
+Like InMemorySaver and SqliteSaver, it also stores each new version of a channel as a full copy, so a thread whose "messages" list grows by two messages per turn stores the whole history again on every step.
+
+DeltaSqliteSaver is a drop-in checkpointer backed by a local SQLite file:
+1. WAL Mode: Readers never block the writer, and commits are cheap (synchronous=NORMAL). State survives restarts.
+2. Only New Versions: As in InMemorySaver, a checkpoint row holds no channel values; each channel version listed in new_versions is stored once as its own blob, and unchanged channels are shared between checkpoints.
+3. List Deltas: When a channel's new value is the previous list plus new items (add_messages / operator.add histories), only the new items are stored, with a reference to the base version. Anything else (edits, removals, non-list values) is stored in full. Chains are capped at max_delta_chain, after which a full snapshot is written, so a read never replays more than that many deltas.
+4. Hot-Thread LRU: The latest list values of the max_hot_threads most recently used threads stay in memory. get_tuple() serves those channels without reading or deserializing the history, and put() uses them to detect append-only updates. Memory is bounded by the hot set, not by the number of conversations.
+   The hot copies are private deep copies: put() copies what it stores and reads hand out copies, so a message mutated in place by a node still compares as changed.
+5. TTL Eviction: Threads that have not been written to for ttl_seconds are deleted.
+6. Background Compaction: With keep_checkpoints set, a background thread trims each changed thread to its newest keep_checkpoints checkpoints. Surviving deltas whose base was trimmed are folded into full snapshots, and unreferenced blobs are dropped. The WAL file is then checkpointed and freed pages returned to the OS.
+
+keep_checkpoints trims history that time travel (get_state_history) would otherwise use. It must also stay unset for graphs using DeltaChannel, which rebuild state from ancestor checkpoints.
+The hot LRU assumes one process owns the database file; give each serving process its own file rather than sharing one between processes.
+"""
+
+
+# Blob kinds: a complete value, new list items on top of base_version, or a cleared channel
+FULL, DELTA, EMPTY = "full", "delta", "empty"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    updated_at REAL NOT NULL,
+    compacted_at REAL NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS blobs (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    channel TEXT NOT NULL,
+    version TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    type TEXT,
+    blob BLOB,
+    base_version TEXT,
+    depth INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (thread_id, checkpoint_ns, channel, version)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE INDEX IF NOT EXISTS threads_updated ON threads (updated_at);
+"""
+
+# A blob and the deltas beneath it, oldest (the full snapshot) first
+CHAIN_QUERY = """
+WITH RECURSIVE chain(kind, type, blob, base_version, step) AS (
+    SELECT kind, type, blob, base_version, 0 FROM blobs
+    WHERE thread_id = ? AND checkpoint_ns = ? AND channel = ? AND version = ?
+    UNION ALL
+    SELECT b.kind, b.type, b.blob, b.base_version, chain.step + 1 FROM blobs b JOIN chain
+    ON chain.kind = 'delta' AND b.thread_id = ? AND b.checkpoint_ns = ? AND b.channel = ?
+    AND b.version = chain.base_version
+)
+SELECT kind, type, blob FROM chain ORDER BY step DESC
+"""
+
+# Returned by _materialize for cleared channels and missing blobs
+_MISSING = object()
+
+
+class _Head:
+    """Latest known list value of one channel (a private copy), used to detect append-only updates."""
+
+    __slots__ = ("version", "value", "depth")
+
+    def __init__(self, version: str, value: List[Any], depth: int):
+        self.version = version
+        self.value = value
+        self.depth = depth
+
+
+class DeltaSqliteSaver(BaseCheckpointSaver[str]):
+    """
+    SQLite (WAL) checkpointer storing list channels as deltas, with a bounded
+    in-memory LRU of hot threads, TTL eviction and background compaction.
+    """
+    def __init__(
+        self,
+        path: str = "checkpoints.sqlite",
+        *,
+        serde: Optional[SerializerProtocol] = None,
+        max_hot_threads: int = 256,
+        max_delta_chain: int = 64,
+        ttl_seconds: Optional[float] = None,
+        keep_checkpoints: Optional[int] = None,
+        compact_interval: float = 300.0,
+    ):
+        super().__init__(serde=serde)
+        if keep_checkpoints is not None and keep_checkpoints < 1:
+            raise ValueError("keep_checkpoints must be at least 1 (use delete_thread to drop a thread)")
+
+        self.path = path
+        self.max_hot_threads = max_hot_threads
+        self.max_delta_chain = max_delta_chain
+        self.ttl_seconds = ttl_seconds
+        self.keep_checkpoints = keep_checkpoints
+        self.compact_interval = compact_interval
+
+        folder = os.path.dirname(os.path.abspath(path))
+        os.makedirs(folder, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")  # Only takes effect on a new file
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        self._lock = threading.RLock()
+
+        # thread_id -> {(checkpoint_ns, channel): _Head}, least recently used first
+        self._hot: "OrderedDict[str, Dict[Tuple[str, str], _Head]]" = OrderedDict()
+
+        self._closed = threading.Event()
+        self._compactor = None
+        if compact_interval and (ttl_seconds is not None or keep_checkpoints is not None):
+            self._compactor = threading.Thread(target=self._compact_loop, name="checkpoint-compactor", daemon=True)
+            self._compactor.start()
+
+    # --------------------------------------------------
+    # BaseCheckpointSaver API
+    # --------------------------------------------------
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+
+        with self._lock:
+            query = (
+                "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, metadata_type, metadata "
+                "FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+            )
+            if checkpoint_id:
+                row = self._conn.execute(query + " AND checkpoint_id = ?", (thread_id, checkpoint_ns, checkpoint_id)).fetchone()
+            else:
+                row = self._conn.execute(query + " ORDER BY checkpoint_id DESC LIMIT 1", (thread_id, checkpoint_ns)).fetchone()
+            if row is None:
+                return None
+            return self._make_tuple(thread_id, checkpoint_ns, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        clauses, params = [], []
+        if config is not None:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+            checkpoint_id = get_checkpoint_id(config)
+            if checkpoint_id:
+                clauses.append("checkpoint_id = ?")
+                params.append(checkpoint_id)
+        before_id = get_checkpoint_id(before) if before else None
+        if before_id:
+            clauses.append("checkpoint_id < ?")
+            params.append(before_id)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        # Without a metadata filter every row counts, so the limit can go to SQLite
+        limit_clause = ""
+        if limit is not None and not filter:
+            limit_clause = " LIMIT ?"
+            params.append(max(limit, 0))
+
+        # Only the (small) checkpoint rows are fetched up front; channel values are
+        # loaded per yielded tuple, so the lock is never held across a yield
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                f"metadata_type, metadata FROM checkpoints{where} ORDER BY checkpoint_id DESC{limit_clause}",
+                params,
+            ).fetchall()
+
+        for thread_id, checkpoint_ns, *row in rows:
+            if limit is not None and limit <= 0:
+                return
+            if filter:
+                metadata = self.serde.loads_typed((row[4], row[5]))
+                if not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+            with self._lock:
+                item = self._make_tuple(thread_id, checkpoint_ns, row)
+            if limit is not None:
+                limit -= 1
+            yield item
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        c = checkpoint.copy()
+        values = c.pop("channel_values")
+
+        with self._lock:
+            heads = self._hot_thread(thread_id)
+            rows = []
+            # Applied to the hot heads only once the rows are committed (None drops a head)
+            new_heads: Dict[Tuple[str, str], Optional[_Head]] = {}
+            for channel, version in new_versions.items():
+                version = str(version)
+                key = (checkpoint_ns, channel)
+                if channel not in values:
+                    rows.append((thread_id, checkpoint_ns, channel, version, EMPTY, None, None, None, 0))
+                    new_heads[key] = None
+                    continue
+
+                value = values[channel]
+                head = heads.get(key)
+                suffix = self._suffix(head, value)
+                if suffix is not None:
+                    depth = head.depth + 1
+                    rows.append((thread_id, checkpoint_ns, channel, version, DELTA, *self.serde.dumps_typed(suffix), head.version, depth))
+                else:
+                    depth = 0
+                    rows.append((thread_id, checkpoint_ns, channel, version, FULL, *self.serde.dumps_typed(value), None, 0))
+
+                if isinstance(value, list):
+                    # Items already in the head are private copies; only new ones need copying
+                    snapshot = head.value + copy.deepcopy(suffix) if suffix is not None else copy.deepcopy(value)
+                    new_heads[key] = _Head(version, snapshot, depth)
+                else:
+                    new_heads[key] = None
+
+            checkpoint_type, checkpoint_blob = self.serde.dumps_typed(c)
+            metadata_type, metadata_blob = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+            with self._transaction():
+                self._conn.executemany("INSERT OR REPLACE INTO blobs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),
+                        checkpoint_type,
+                        checkpoint_blob,
+                        metadata_type,
+                        metadata_blob,
+                    ),
+                )
+                self._conn.execute(
+                    "INSERT INTO threads (thread_id, updated_at) VALUES (?, ?) "
+                    "ON CONFLICT(thread_id) DO UPDATE SET updated_at = excluded.updated_at",
+                    (thread_id, time.time()),
+                )
+
+            for key, head in new_heads.items():
+                if head is None:
+                    heads.pop(key, None)
+                else:
+                    heads[key] = head
+
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+
+        # Special writes (errors, interrupts) replace earlier ones; regular writes are kept once
+        verb = "INSERT OR REPLACE" if all(channel in WRITES_IDX_MAP for channel, _ in writes) else "INSERT OR IGNORE"
+        rows = [
+            (
+                thread_id,
+                checkpoint_ns,
+                checkpoint_id,
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.serde.dumps_typed(value),
+                task_path,
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        with self._lock, self._transaction():
+            self._conn.executemany(f"{verb} INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock, self._transaction():
+            self._delete_thread(thread_id)
+
+    def prune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        """"keep_latest" keeps the newest checkpoint per namespace; "delete" removes the threads."""
+        if strategy not in ("keep_latest", "delete"):
+            raise ValueError(f"Unknown prune strategy: {strategy}")
+        for thread_id in thread_ids:
+            if strategy == "delete":
+                self.delete_thread(thread_id)
+            else:
+                self._compact_thread(thread_id, keep=1)
+
+    def get_next_version(self, current: Optional[str], channel: None) -> str:
+        # Same scheme as InMemorySaver: a zero-padded counter plus a random tiebreaker
+        if current is None:
+            current_v = 0
+        elif isinstance(current, int):
+            current_v = current
+        else:
+            current_v = int(current.split(".")[0])
+        return f"{current_v + 1:032}.{random.random():016}"
+
+    # Async variants run the blocking SQLite calls on the default executor
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await self._run(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        items = await self._run(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for item in items:
+            yield item
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self._run(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await self._run(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await self._run(self.delete_thread, thread_id)
+
+    async def aprune(self, thread_ids: Sequence[str], *, strategy: str = "keep_latest") -> None:
+        await self._run(functools.partial(self.prune, thread_ids, strategy=strategy))
+
+    @staticmethod
+    async def _run(func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    # --------------------------------------------------
+    # Reading
+    # --------------------------------------------------
+    def _make_tuple(self, thread_id: str, checkpoint_ns: str, row: Sequence[Any]) -> CheckpointTuple:
+        checkpoint_id, parent_checkpoint_id, checkpoint_type, checkpoint_blob, metadata_type, metadata_blob = row
+        checkpoint = self.serde.loads_typed((checkpoint_type, checkpoint_blob))
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_path, task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint={
+                **checkpoint,
+                "channel_values": self._load_channels(thread_id, checkpoint_ns, checkpoint["channel_versions"]),
+            },
+            metadata=self.serde.loads_typed((metadata_type, metadata_blob)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+    def _load_channels(self, thread_id: str, checkpoint_ns: str, versions: ChannelVersions) -> Dict[str, Any]:
+        heads = self._hot_thread(thread_id)
+        values = {}
+        for channel, version in versions.items():
+            version = str(version)
+            key = (checkpoint_ns, channel)
+            head = heads.get(key)
+            if head is not None and head.version == version:
+                # Callers get their own copy, so mutating it cannot alter the hot one
+                values[channel] = copy.deepcopy(head.value)
+                continue
+
+            value, depth = self._materialize(thread_id, checkpoint_ns, channel, version)
+            if value is _MISSING:
+                continue
+            values[channel] = value
+            if isinstance(value, list):
+                heads[key] = _Head(version, copy.deepcopy(value), depth)
+        return values
+
+    def _materialize(self, thread_id: str, checkpoint_ns: str, channel: str, version: str) -> Tuple[Any, int]:
+        """Value of one channel version (replaying its deltas) and its chain depth."""
+        chain = self._conn.execute(
+            CHAIN_QUERY, (thread_id, checkpoint_ns, channel, version, thread_id, checkpoint_ns, channel)
+        ).fetchall()
+        if not chain or chain[0][0] == EMPTY:
+            return _MISSING, 0
+        if chain[0][0] != FULL:
+            raise ValueError(f"Broken delta chain for {thread_id}/{channel}@{version}: base snapshot is missing")
+
+        value = self.serde.loads_typed((chain[0][1], chain[0][2]))
+        if len(chain) > 1:
+            value = list(value)
+            for _, delta_type, delta in chain[1:]:
+                value.extend(self.serde.loads_typed((delta_type, delta)))
+        return value, len(chain) - 1
+
+    # --------------------------------------------------
+    # Writing
+    # --------------------------------------------------
+    def _suffix(self, head: Optional[_Head], value: Any) -> Optional[List[Any]]:
+        """The items appended to head's list, or None when value is not an append-only update."""
+        if head is None or not isinstance(value, list) or head.depth >= self.max_delta_chain:
+            return None
+        base = head.value
+        if len(value) < len(base):
+            return None
+        for old, new in zip(base, value):
+            if old != new:
+                return None
+        return value[len(base):]
+
+    def _hot_thread(self, thread_id: str) -> Dict[Tuple[str, str], _Head]:
+        """The thread's hot heads, marked as most recently used; evicts beyond max_hot_threads."""
+        heads = self._hot.get(thread_id)
+        if heads is None:
+            heads = self._hot[thread_id] = {}
+            while len(self._hot) > self.max_hot_threads:
+                self._hot.popitem(last=False)
+        else:
+            self._hot.move_to_end(thread_id)
+        return heads
+
+    def _transaction(self):
+        return _Transaction(self._conn)
+
+    def _delete_thread(self, thread_id: str):
+        for table in ("checkpoints", "blobs", "writes", "threads"):
+            self._conn.execute(f"DELETE FROM {table} WHERE thread_id = ?", (thread_id,))
+        self._hot.pop(thread_id, None)
+
+    # --------------------------------------------------
+    # Eviction + compaction
+    # --------------------------------------------------
+    def evict_expired(self) -> int:
+        """Deletes threads not written to for ttl_seconds; returns how many."""
+        if self.ttl_seconds is None:
+            return 0
+        cutoff = time.time() - self.ttl_seconds
+        with self._lock:
+            expired = [row[0] for row in self._conn.execute("SELECT thread_id FROM threads WHERE updated_at < ?", (cutoff,))]
+        for thread_id in expired:
+            self.delete_thread(thread_id)
+        return len(expired)
+
+    def compact(self) -> Dict[str, int]:
+        """One maintenance pass: TTL eviction, then trimming of threads changed since the last pass."""
+        expired = self.evict_expired()
+
+        compacted = 0
+        if self.keep_checkpoints is not None:
+            with self._lock:
+                changed = [
+                    row[0] for row in self._conn.execute("SELECT thread_id FROM threads WHERE updated_at > compacted_at")
+                ]
+            # One thread per lock acquisition, so live conversations are never stalled for long
+            for thread_id in changed:
+                self._compact_thread(thread_id, self.keep_checkpoints)
+                compacted += 1
+
+        with self._lock:
+            self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            self._conn.execute("PRAGMA incremental_vacuum")
+        return {"expired": expired, "compacted": compacted}
+
+    def _compact_thread(self, thread_id: str, keep: int):
+        with self._lock, self._transaction():
+            namespaces = [
+                row[0]
+                for row in self._conn.execute("SELECT DISTINCT checkpoint_ns FROM checkpoints WHERE thread_id = ?", (thread_id,))
+            ]
+            for checkpoint_ns in namespaces:
+                self._compact_namespace(thread_id, checkpoint_ns, keep)
+            self._conn.execute("UPDATE threads SET compacted_at = updated_at WHERE thread_id = ?", (thread_id,))
+
+    def _compact_namespace(self, thread_id: str, checkpoint_ns: str, keep: int):
+        where = "thread_id = ? AND checkpoint_ns = ?"
+        ids = [
+            row[0]
+            for row in self._conn.execute(
+                f"SELECT checkpoint_id FROM checkpoints WHERE {where} ORDER BY checkpoint_id DESC", (thread_id, checkpoint_ns)
+            )
+        ]
+
+        # 1. Drop checkpoints (and their pending writes) older than the newest keep
+        if len(ids) > keep:
+            oldest_kept = ids[keep - 1]
+            for table in ("checkpoints", "writes"):
+                self._conn.execute(f"DELETE FROM {table} WHERE {where} AND checkpoint_id < ?", (thread_id, checkpoint_ns, oldest_kept))
+
+        # 2. Channel versions still referenced by a surviving checkpoint
+        referenced: Set[Tuple[str, str]] = set()
+        for checkpoint_type, checkpoint_blob in self._conn.execute(
+            f"SELECT type, checkpoint FROM checkpoints WHERE {where}", (thread_id, checkpoint_ns)
+        ):
+            versions = self.serde.loads_typed((checkpoint_type, checkpoint_blob))["channel_versions"]
+            referenced.update((channel, str(version)) for channel, version in versions.items())
+
+        # 3. Fold surviving deltas whose base is going away into full snapshots (oldest first,
+        #    so a folded row can serve as the base of the next), then drop unreferenced blobs
+        blobs = self._conn.execute(
+            f"SELECT channel, version, kind, base_version FROM blobs WHERE {where} ORDER BY version",
+            (thread_id, checkpoint_ns),
+        ).fetchall()
+        for channel, version, kind, base_version in blobs:
+            if kind == DELTA and (channel, version) in referenced and (channel, base_version) not in referenced:
+                value, _ = self._materialize(thread_id, checkpoint_ns, channel, version)
+                self._conn.execute(
+                    f"UPDATE blobs SET kind = ?, type = ?, blob = ?, base_version = NULL, depth = 0 "
+                    f"WHERE {where} AND channel = ? AND version = ?",
+                    (FULL, *self.serde.dumps_typed(value), thread_id, checkpoint_ns, channel, version),
+                )
+        self._conn.executemany(
+            f"DELETE FROM blobs WHERE {where} AND channel = ? AND version = ?",
+            [
+                (thread_id, checkpoint_ns, channel, version)
+                for channel, version, _, _ in blobs
+                if (channel, version) not in referenced
+            ],
+        )
+
+        # Hot heads must never point at a dropped (or re-based) blob
+        heads = self._hot.get(thread_id, {})
+        for key in [key for key in heads if key[0] == checkpoint_ns]:
+            if (key[1], heads[key].version) not in referenced:
+                del heads[key]
+
+    def _compact_loop(self):
+        while not self._closed.wait(self.compact_interval):
+            try:
+                self.compact()
+            except Exception as e:
+                # Maintenance must never take the agent down; the next pass retries
+                print(f"Checkpoint compaction failed: {e}")
+
+    def close(self):
+        self._closed.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        with self._lock:
+            self._conn.close()
+        self._hot.clear()
+
+    def __enter__(self) -> "DeltaSqliteSaver":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class _Transaction:
+    """BEGIN IMMEDIATE ... COMMIT/ROLLBACK on an autocommit connection."""
+
+    def __init__(self, conn: sqlite3.Connection):
+        self._conn = conn
+
+    def __enter__(self):
+        self._conn.execute("BEGIN IMMEDIATE")
+
+    def __exit__(self, exc_type, exc, tb):
+        self._conn.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -0,0 +1,396 @@
+import argparse
+import importlib
+import json
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+
+
+"""
+Performance changes are only trustworthy when they are measured the same way every time.
+This module generates a deterministic synthetic corpus and benchmarks every adapter and the end-to-end IngestionFactory.process_file path over it.
+
+Corpus (same seed, same bytes):
+1. Plain Text: Paragraphs of pseudo-words separated by blank lines, plus a short log-style file.
+2. Markdown: Header-heavy documents (#, ##, ###) with lists and fenced code blocks.
+3. Digital PDF: Multi-page PDFs with a real text layer, written directly as PDF objects (no extra dependency).
+4. Scanned PDF: Pages that are only a slightly rotated grayscale image of rendered text, so they need OCR.
+5. Images: PNG and JPEG renders of text pages for the OCRAdapter.
+
+Measurements (per case):
+- chunks/sec and MB/sec over the case's input files
+- per-stage latency (mime detection, adapter construction, load, process), median over repeats
+- peak RSS: every case runs in its own freshly spawned process, so the high-water mark belongs to that case alone
+
+Results are written as JSON. Passing --baseline compares against an earlier run and exits non-zero when throughput drops or peak RSS grows by more than --tolerance.
+
+Usage:
+    python benchmark.py --corpus /tmp/bench_corpus --output bench.json
+    python benchmark.py --corpus /tmp/bench_corpus --output new.json --baseline bench.json
+"""
+
+
+WORDS_SEED = 1234
+
+# case name -> (adapter target or None for the full pipeline, corpus subfolders)
+CASES: Dict[str, Tuple[Optional[str], Tuple[str, ...]]] = {
+    "text": ("text_adapter:TextAdapter", ("text",)),
+    "markdown": ("markdown_adapter:MarkdownAdapter", ("markdown",)),
+    "pdf_digital": ("pdf_adapter:GenericPDFAdapter", ("pdf_digital",)),
+    "pdf_scanned": ("pdf_adapter:GenericPDFAdapter", ("pdf_scanned",)),
+    "ocr_png": ("ocr_img_adapter:OCRAdapter", ("png",)),
+    "ocr_jpeg": ("ocr_img_adapter:OCRAdapter", ("jpeg",)),
+    "pipeline": (None, ("text", "markdown", "pdf_digital", "pdf_scanned", "png", "jpeg")),
+}
+
+
+# --------------------------------------------------
+# Synthetic corpus
+# --------------------------------------------------
+def _vocabulary(rng: random.Random, size: int = 3000) -> List[str]:
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(2, 10))) for _ in range(size)]
+
+
+def _sentence(rng: random.Random, vocab: List[str]) -> str:
+    words = rng.choices(vocab, k=rng.randint(6, 20))
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random, vocab: List[str]) -> str:
+    return " ".join(_sentence(rng, vocab) for _ in range(rng.randint(2, 7)))
+
+
+def make_text(rng: random.Random, vocab: List[str], size: int) -> str:
+    parts, total = [], 0
+    while total < size:
+        paragraph = _paragraph(rng, vocab)
+        parts.append(paragraph)
+        total += len(paragraph) + 2
+    return "\n\n".join(parts)
+
+
+def make_log(rng: random.Random, vocab: List[str], lines: int) -> str:
+    levels = ["INFO", "DEBUG", "WARN", "ERROR"]
+    return "\n".join(
+        f"2024-01-01T00:{i // 60 % 60:02d}:{i % 60:02d} {rng.choice(levels)} {_sentence(rng, vocab)}"
+        for i in range(lines)
+    )
+
+
+def make_markdown(rng: random.Random, vocab: List[str], size: int) -> str:
+    parts, total = [], 0
+    while total < size:
+        section = [f"# {_sentence(rng, vocab)[:-1]}"]
+        for _ in range(rng.randint(2, 4)):
+            section.append(f"## {' '.join(rng.choices(vocab, k=3))}")
+            for _ in range(rng.randint(1, 3)):
+                section.append(f"### {' '.join(rng.choices(vocab, k=2))}")
+                section.append(_paragraph(rng, vocab))
+                if rng.random() < 0.3:
+                    section.append("\n".join(f"- {_sentence(rng, vocab)}" for _ in range(rng.randint(2, 5))))
+                if rng.random() < 0.2:
+                    section.append("```python\n" + "\n".join(
+                        f"{rng.choice(vocab)} = {rng.randint(0, 999)}" for _ in range(rng.randint(2, 6))
+                    ) + "\n```")
+        block = "\n\n".join(section)
+        parts.append(block)
+        total += len(block) + 2
+    return "\n\n".join(parts)
+
+
+def render_page(rng: random.Random, vocab: List[str], width: int = 1240, height: int = 1754, angle: float = 1.5) -> np.ndarray:
+    """Grayscale image of a text page, slightly rotated and noisy like a scan."""
+    import cv2
+
+    image = np.full((height, width), 255, dtype=np.uint8)
+    y = 120
+    while y < height - 100:
+        line = " ".join(rng.choices(vocab, k=rng.randint(5, 9)))
+        cv2.putText(image, line, (90, y), cv2.FONT_HERSHEY_SIMPLEX, 1.0, 0, 2, cv2.LINE_AA)
+        y += rng.choice([48, 48, 48, 96])
+
+    center = (width / 2, height / 2)
+    matrix = cv2.getRotationMatrix2D(center, angle, 1.0)
+    image = cv2.warpAffine(image, matrix, (width, height), borderMode=cv2.BORDER_REPLICATE)
+
+    noise = np.random.default_rng(rng.randint(0, 2 ** 31)).normal(0, 12, image.shape)
+    return np.clip(image.astype(np.float32) + noise, 0, 255).astype(np.uint8)
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(pages: List[Dict[str, Any]]) -> bytes:
+    """
+    Writes a minimal PDF. Each page is {"lines": [...]} (text layer) or
+    {"image": grayscale ndarray} (scanned page without text).
+    """
+    objects: List[bytes] = []
+
+    def add(body: bytes) -> int:
+        objects.append(body)
+        return len(objects)
+
+    catalog = add(b"")  # Filled in once the page tree exists
+    page_tree = add(b"")
+    font = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    kids = []
+    for page in pages:
+        resources = f"/Font << /F1 {font} 0 R >>"
+        if "image" in page:
+            image = page["image"]
+            data = zlib.compress(image.tobytes())
+            image_obj = add(
+                f"<< /Type /XObject /Subtype /Image /Width {image.shape[1]} /Height {image.shape[0]} "
+                f"/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /FlateDecode /Length {len(data)} >>\nstream\n"
+                .encode("latin-1") + data + b"\nendstream"
+            )
+            resources += f" /XObject << /Im0 {image_obj} 0 R >>"
+            content = b"q 612 0 0 792 0 0 cm /Im0 Do Q"
+        else:
+            commands = ["BT", "/F1 11 Tf", "14 TL", "72 740 Td"]
+            for line in page["lines"]:
+                commands.append(f"({_pdf_escape(line)}) Tj T*")
+            commands.append("ET")
+            content = "\n".join(commands).encode("latin-1")
+
+        stream = add(f"<< /Length {len(content)} >>\nstream\n".encode("latin-1") + content + b"\nendstream")
+        kids.append(add(
+            f"<< /Type /Page /Parent {page_tree} 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << {resources} >> /Contents {stream} 0 R >>".encode("latin-1")
+        ))
+
+    objects[catalog - 1] = f"<< /Type /Catalog /Pages {page_tree} 0 R >>".encode("latin-1")
+    objects[page_tree - 1] = (
+        f"<< /Type /Pages /Kids [{' '.join(f'{k} 0 R' for k in kids)}] /Count {len(kids)} >>".encode("latin-1")
+    )
+
+    out = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n".encode("latin-1") + body + b"\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        out += f"{offset:010d} 00000 n \n".encode("latin-1")
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(out)
+
+
+def _digital_pages(rng: random.Random, vocab: List[str], count: int) -> List[Dict[str, Any]]:
+    pages = []
+    for _ in range(count):
+        lines = []
+        for _ in range(45):
+            lines.append(" ".join(rng.choices(vocab, k=rng.randint(8, 12))))
+        pages.append({"lines": lines})
+    return pages
+
+
+def generate_corpus(out_dir: str, seed: int = 0, scale: float = 1.0) -> Dict[str, List[str]]:
+    """
+    Writes the synthetic corpus into out_dir/<kind>/ and returns the paths per kind.
+    The same seed and scale always produce byte-identical files.
+    """
+    import cv2
+
+    vocab = _vocabulary(random.Random(WORDS_SEED))
+    rng = random.Random(seed)
+    corpus: Dict[str, List[str]] = {}
+
+    def write(kind: str, name: str, data):
+        folder = os.path.join(out_dir, kind)
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, name)
+        mode = "wb" if isinstance(data, bytes) else "w"
+        with open(path, mode, **({} if mode == "wb" else {"encoding": "utf-8", "newline": "\n"})) as f:
+            f.write(data)
+        corpus.setdefault(kind, []).append(path)
+
+    write("text", "article.txt", make_text(rng, vocab, int(2_000_000 * scale)))
+    write("text", "service.log", make_log(rng, vocab, int(20_000 * scale)))
+    write("markdown", "handbook.md", make_markdown(rng, vocab, int(1_000_000 * scale)))
+    write("markdown", "readme.md", make_markdown(rng, vocab, int(50_000 * scale)))
+
+    write("pdf_digital", "report.pdf", build_pdf(_digital_pages(rng, vocab, max(1, int(20 * scale)))))
+    write("pdf_scanned", "scan.pdf", build_pdf([
+        {"image": render_page(rng, vocab, angle=rng.uniform(-3, 3))} for _ in range(max(1, int(3 * scale)))
+    ]))
+
+    for i in range(max(1, int(2 * scale))):
+        write("png", f"page_{i}.png", cv2.imencode(".png", render_page(rng, vocab, angle=rng.uniform(-3, 3)))[1].tobytes())
+        write("jpeg", f"page_{i}.jpg", cv2.imencode(".jpg", render_page(rng, vocab, angle=rng.uniform(-3, 3)))[1].tobytes())
+
+    return corpus
+
+
+# --------------------------------------------------
+# Measurement (runs inside a fresh process per case)
+# --------------------------------------------------
+def peak_rss_mb() -> float:
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS reports bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _close(raw_data: Any):
+    close = getattr(raw_data, "close", None)
+    if callable(close):
+        close()
+
+
+def _run_case(target: Optional[str], paths: List[str], repeat: int) -> Dict[str, Any]:
+    """Benchmarks one adapter (or the full pipeline when target is None) over paths."""
+    from rag_config import RAGConfig
+
+    config = RAGConfig()
+    stages: Dict[str, List[float]] = {}
+    totals: List[float] = []
+    chunks = 0
+
+    def timed(stage: str, fn, *args):
+        start = time.perf_counter()
+        result = fn(*args)
+        stages.setdefault(stage, []).append(time.perf_counter() - start)
+        return result
+
+    if target is None:
+        from ingestion_factory import IngestionFactory
+        factory = IngestionFactory(config)
+    else:
+        module, name = target.split(":")
+        adapter_class = getattr(importlib.import_module(module), name)
+
+    for _ in range(repeat):
+        chunks = 0
+        start = time.perf_counter()
+        for path in paths:
+            if target is None:
+                mime_type = timed("mime", factory.detect_mime_type, path)
+                adapter_class = factory.get_adapter_class(mime_type)
+            # Construct directly: the factory's get_adapter() would re-detect and reuse a cached instance
+            adapter = timed("construct", adapter_class, config)
+            raw_data = timed("load", adapter.load, path)
+            try:
+                chunks += len(timed("process", adapter.process, raw_data))
+            finally:
+                _close(raw_data)
+        totals.append(time.perf_counter() - start)
+
+    seconds = statistics.median(totals)
+    size = sum(os.path.getsize(path) for path in paths)
+    return {
+        "files": len(paths),
+        "bytes": size,
+        "chunks": chunks,
+        "seconds": seconds,
+        "cold_seconds": totals[0],
+        "chunks_per_sec": chunks / seconds if seconds else 0.0,
+        "mb_per_sec": size / (1024 * 1024) / seconds if seconds else 0.0,
+        # Median per file and repeat, so cases with different file counts stay comparable
+        "stages": {stage: statistics.median(values) for stage, values in stages.items()},
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+def run_benchmarks(corpus: Dict[str, List[str]], cases: List[str] = None, repeat: int = 3) -> Dict[str, Any]:
+    """Runs each case in its own spawned process and collects the results."""
+    results = {}
+    for case in cases or list(CASES):
+        target, kinds = CASES[case]
+        paths = [path for kind in kinds for path in corpus.get(kind, [])]
+        print(f"[{case}] {len(paths)} files ...", flush=True)
+        try:
+            # A fresh interpreter per case keeps peak RSS and model caches isolated
+            with ProcessPoolExecutor(max_workers=1, mp_context=get_context("spawn")) as pool:
+                results[case] = pool.submit(_run_case, target, paths, repeat).result()
+            r = results[case]
+            print(f"[{case}] {r['chunks_per_sec']:.1f} chunks/s, {r['mb_per_sec']:.2f} MB/s, "
+                  f"peak RSS {r['peak_rss_mb']:.0f} MB", flush=True)
+        except Exception as e:
+            # Missing optional dependencies (unstructured, docling, ...) fail one case, not the suite
+            results[case] = {"error": f"{type(e).__name__}: {e}"}
+            print(f"[{case}] failed: {results[case]['error']}", flush=True)
+    return results
+
+
+# --------------------------------------------------
+# Reporting
+# --------------------------------------------------
+def compare(baseline: Dict[str, Any], current: Dict[str, Any], tolerance: float = 0.2) -> List[str]:
+    """
+    Returns human-readable regressions: throughput down or peak RSS up by more than tolerance.
+    Cases that failed in either run are skipped.
+    """
+    regressions = []
+    for case, now in current["results"].items():
+        before = baseline.get("results", {}).get(case)
+        if not before or "error" in before or "error" in now:
+            continue
+        if before["mb_per_sec"] and now["mb_per_sec"] < before["mb_per_sec"] * (1 - tolerance):
+            regressions.append(
+                f"{case}: throughput {before['mb_per_sec']:.2f} -> {now['mb_per_sec']:.2f} MB/s"
+            )
+        if before["peak_rss_mb"] and now["peak_rss_mb"] > before["peak_rss_mb"] * (1 + tolerance):
+            regressions.append(
+                f"{case}: peak RSS {before['peak_rss_mb']:.0f} -> {now['peak_rss_mb']:.0f} MB"
+            )
+    return regressions
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion adapters and pipeline.")
+    parser.add_argument("--corpus", default=os.path.join("data", "bench_corpus"), help="Corpus directory (rewritten on every run from --seed and --scale)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scale", type=float, default=1.0, help="Corpus size multiplier")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--cases", nargs="*", choices=list(CASES), help="Subset of cases to run")
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument("--baseline", help="Earlier results to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative regression")
+    args = parser.parse_args(argv)
+
+    corpus = generate_corpus(args.corpus, seed=args.seed, scale=args.scale)
+    report = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seed": args.seed,
+            "scale": args.scale,
+            "repeat": args.repeat,
+        },
+        "results": run_benchmarks(corpus, args.cases, args.repeat),
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(json.load(f), report, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+        print("No regressions.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
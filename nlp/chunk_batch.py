@@ -0,0 +1,393 @@
+import json
+from array import array
+from collections.abc import Mapping
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+
+"""
+Adapters emit one Python dict per chunk, each with its own nested metadata dict. Once chunks are small, that per-object overhead dominates memory: the same keys and
+values ("format": "markdown", file_name, source_type, header titles) are referenced again from every chunk, behind two dicts' worth of hash tables.
+
+A ChunkBatch stores the same chunks column-wise:
+1. Text Buffer: All chunk texts are concatenated into one UTF-8 buffer, with an int64 end offset per chunk (the layout of an Arrow large_string column).
+2. Dictionary-Encoded Metadata: Each metadata key becomes a column of int32 codes into a list of distinct values, so a repeated value is stored once per batch. Chunks that lack a key get MISSING (-1). Integer-only keys (start_index, page_number) are stored as plain int64 columns instead, since their values rarely repeat.
+3. Embeddings: Optional float32 vectors in one contiguous array (dimension fixed by the first vector).
+4. Row Views: Iterating yields ChunkRow objects (__slots__, no per-row dicts) that read like the usual chunk dicts, so sinks, dedup and the embedding stage accept them unchanged. Only "embedding" can be assigned; use to_dict() for a mutable copy.
+5. Arrow Export: to_arrow() wraps the buffers without copying them (text, codes, vectors); to_parquet() and to_ipc() write the result. pyarrow is an optional dependency.
+   Columns whose values Arrow cannot dictionary-encode are exported plainly instead: all-None columns as null, nested values (lists, dicts) materialized per row, and
+   mixed-type columns as a struct with one typed child per Python type (e.g. {"int": 3, "str": null}), so no value is turned into a string.
+
+Batches pickle as a handful of buffers, so a result returned from a worker process is rebuilt in the parent without creating any per-chunk objects.
+Arrow arrays returned by to_arrow() share the batch's buffers, so the batch cannot grow while they are alive (Python raises BufferError).
+"""
+
+
+Chunk = Dict[str, Any]
+
+# Code of a chunk that has no value for a metadata key (dictionary / integer columns)
+MISSING = -1
+MISSING_INT = -(1 << 63)
+
+_SCALARS = (str, int, float, bool, type(None))
+_ABSENT = object()
+
+
+def _is_int(value: Any) -> bool:
+    return type(value) is int and -(1 << 63) <= value < (1 << 63)
+
+
+def _intern_key(value: Any) -> Any:
+    """Lookup key for a metadata value; type-qualified so True, 1 and 1.0 stay distinct."""
+    if isinstance(value, _SCALARS):
+        return type(value), value
+    try:
+        return type(value), json.dumps(value, sort_keys=True)
+    except (TypeError, ValueError):
+        return None  # Not interned: stored once per occurrence
+
+
+class _Column:
+    """
+    One metadata column. Integer columns (offsets, page numbers) are nearly unique per
+    chunk, so they store int64 values directly; every other column is dictionary-encoded.
+    A column switches to dictionary encoding the first time it sees a non-integer.
+    """
+
+    __slots__ = ("codes", "values", "_lookup")
+
+    def __init__(self, length: int = 0, integer: bool = False):
+        # values is None for integer columns
+        self.codes = array("q", [MISSING_INT]) * length if integer else array("i", [MISSING]) * length
+        self.values: Optional[List[Any]] = None if integer else []
+        self._lookup: Dict[Any, int] = {}
+
+    @property
+    def is_integer(self) -> bool:
+        return self.values is None
+
+    def append(self, value: Any):
+        if self.values is None:
+            if _is_int(value) and value != MISSING_INT:
+                self.codes.append(value)
+                return
+            self._to_dictionary()
+        self.codes.append(self._code_for(value))
+
+    def append_missing(self):
+        self.codes.append(MISSING if self.values is not None else MISSING_INT)
+
+    def get(self, index: int, default: Any = None) -> Any:
+        code = self.codes[index]
+        if self.values is None:
+            return default if code == MISSING_INT else code
+        return default if code == MISSING else self.values[code]
+
+    def _code_for(self, value: Any) -> int:
+        key = _intern_key(value)
+        code = self._lookup.get(key) if key is not None else None
+        if code is None:
+            code = len(self.values)
+            self.values.append(value)
+            if key is not None:
+                self._lookup[key] = code
+        return code
+
+    def _to_dictionary(self):
+        integers, self.codes, self.values = self.codes, array("i"), []
+        for value in integers:
+            self.codes.append(MISSING if value == MISSING_INT else self._code_for(value))
+
+    def __getstate__(self):
+        # The lookup table is rebuilt on demand; only codes and values are shipped
+        return self.codes, self.values
+
+    def __setstate__(self, state):
+        self.codes, self.values = state
+        self._lookup = {}
+        for code, value in enumerate(self.values or ()):
+            key = _intern_key(value)
+            if key is not None:
+                self._lookup.setdefault(key, code)
+
+
+class ChunkRow(Mapping):
+    """
+    Read-only view of one chunk in a ChunkBatch, usable wherever a chunk dict is read.
+    """
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch: "ChunkBatch", index: int):
+        self.batch = batch
+        self.index = index
+
+    @property
+    def text(self) -> str:
+        return self.batch.text(self.index)
+
+    @property
+    def metadata(self) -> Dict[str, Any]:
+        return self.batch.metadata(self.index)
+
+    def __getitem__(self, key: str) -> Any:
+        if key == "text":
+            return self.batch.text(self.index)
+        if key == "metadata":
+            return self.batch.metadata(self.index)
+        if key == "embedding" and self.batch.has_embedding(self.index):
+            return self.batch.embedding(self.index)
+        raise KeyError(key)
+
+    def __setitem__(self, key: str, value: Any):
+        """Only embeddings can be attached to a row (see EmbeddingStage)."""
+        if key != "embedding":
+            raise TypeError(f"ChunkRow is read-only except for 'embedding'; use to_dict() to modify {key!r}")
+        self.batch.set_embedding(self.index, value)
+
+    def __iter__(self) -> Iterator[str]:
+        yield "text"
+        yield "metadata"
+        if self.batch.has_embedding(self.index):
+            yield "embedding"
+
+    def __len__(self) -> int:
+        return 3 if self.batch.has_embedding(self.index) else 2
+
+    def to_dict(self) -> Chunk:
+        return {key: self[key] for key in self}
+
+    def __reduce__(self):
+        # A pickled row travels as a plain dict rather than dragging its whole batch along
+        return dict, (self.to_dict(),)
+
+    def __repr__(self) -> str:
+        return f"ChunkRow({self.to_dict()!r})"
+
+
+class ChunkBatch:
+    """
+    Columnar container for chunks: one text buffer, dictionary-encoded metadata columns
+    and optional float32 embeddings.
+    """
+    def __init__(self):
+        self._text = bytearray()
+        self._offsets = array("q", [0])
+        self._columns: Dict[str, _Column] = {}
+
+        # Allocated when the first embedding is set; one flag per row marks which are filled
+        self.dimension: Optional[int] = None
+        self._embeddings: Optional[array] = None
+        self._has_embedding: Optional[bytearray] = None
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[Chunk]) -> "ChunkBatch":
+        batch = cls()
+        batch.extend(chunks)
+        return batch
+
+    # --------------------------------------------------
+    # Building
+    # --------------------------------------------------
+    def append(self, text: str, metadata: Dict[str, Any] = None, embedding: Iterable[float] = None):
+        index = len(self)
+        self._text += text.encode("utf-8")
+        self._offsets.append(len(self._text))
+
+        metadata = metadata or {}
+        for key, value in metadata.items():
+            if key not in self._columns:
+                # Backfilled as missing for earlier rows
+                self._columns[key] = _Column(index, integer=_is_int(value))
+        for key, column in self._columns.items():
+            if key in metadata:
+                column.append(metadata[key])
+            else:
+                column.append_missing()
+
+        if self._embeddings is not None:
+            self._embeddings.extend(array("f", bytes(4 * self.dimension)))
+            self._has_embedding.append(0)
+        if embedding is not None:
+            self.set_embedding(index, embedding)
+
+    def extend(self, chunks: Iterable[Chunk]):
+        for chunk in chunks:
+            self.append(chunk["text"], chunk.get("metadata"), chunk.get("embedding"))
+
+    def set_embedding(self, index: int, vector: Iterable[float]):
+        vector = array("f", vector)
+        if self._embeddings is None:
+            self.dimension = len(vector)
+            self._embeddings = array("f", bytes(4 * self.dimension * len(self)))
+            self._has_embedding = bytearray(len(self))
+        if len(vector) != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional embeddings, got {len(vector)}")
+        index = self._row(index)
+        start = index * self.dimension
+        self._embeddings[start:start + self.dimension] = vector
+        self._has_embedding[index] = 1
+
+    # --------------------------------------------------
+    # Reading
+    # --------------------------------------------------
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> ChunkRow:
+        return ChunkRow(self, self._row(index))
+
+    def __iter__(self) -> Iterator[ChunkRow]:
+        for index in range(len(self)):
+            yield ChunkRow(self, index)
+
+    def _row(self, index: int) -> int:
+        size = len(self)
+        if index < 0:
+            index += size
+        if not 0 <= index < size:
+            raise IndexError("ChunkBatch index out of range")
+        return index
+
+    @property
+    def columns(self) -> List[str]:
+        """Metadata keys, in the order they were first seen."""
+        return list(self._columns)
+
+    def text(self, index: int) -> str:
+        index = self._row(index)
+        return self._text[self._offsets[index]:self._offsets[index + 1]].decode("utf-8")
+
+    def metadata(self, index: int) -> Dict[str, Any]:
+        """A fresh dict built from the columns (changes to it are not written back)."""
+        index = self._row(index)
+        metadata = {}
+        for key, column in self._columns.items():
+            value = column.get(index, _ABSENT)
+            if value is not _ABSENT:
+                metadata[key] = value
+        return metadata
+
+    def has_embedding(self, index: int) -> bool:
+        return self._has_embedding is not None and bool(self._has_embedding[index])
+
+    def embedding(self, index: int) -> Optional[List[float]]:
+        index = self._row(index)
+        if not self.has_embedding(index):
+            return None
+        start = index * self.dimension
+        return self._embeddings[start:start + self.dimension].tolist()
+
+    def to_dicts(self) -> List[Chunk]:
+        return [row.to_dict() for row in self]
+
+    @property
+    def nbytes(self) -> int:
+        """Size of the buffers (text, offsets, codes, vectors); dictionary values are not counted."""
+        size = len(self._text) + self._offsets.itemsize * len(self._offsets)
+        size += sum(column.codes.itemsize * len(column.codes) for column in self._columns.values())
+        if self._embeddings is not None:
+            size += self._embeddings.itemsize * len(self._embeddings) + len(self._has_embedding)
+        return size
+
+    # --------------------------------------------------
+    # Arrow export (optional dependency)
+    # --------------------------------------------------
+    def to_arrow(self):
+        """
+        pyarrow Table with columns text (large_string), metadata (struct of dictionary
+        columns, except the plain ones described in the module docstring) and, when
+        present, embedding (fixed_size_list<float32>).
+        """
+        import pyarrow as pa
+
+        size = len(self)
+        columns = {
+            "text": pa.Array.from_buffers(
+                pa.large_string(), size, [None, pa.py_buffer(self._offsets), pa.py_buffer(self._text)]
+            )
+        }
+
+        if self._columns:
+            fields = [_arrow_column(pa, column, size) for column in self._columns.values()]
+            columns["metadata"] = pa.StructArray.from_arrays(fields, names=list(self._columns))
+
+        if self._embeddings is not None:
+            flags = pa.Array.from_buffers(pa.uint8(), size, [None, pa.py_buffer(self._has_embedding)])
+            values = pa.Array.from_buffers(
+                pa.float32(), size * self.dimension, [None, pa.py_buffer(self._embeddings)]
+            )
+            columns["embedding"] = pa.Array.from_buffers(
+                pa.list_(pa.float32(), self.dimension), size, [_validity(flags, 0)], children=[values]
+            )
+
+        return pa.table(columns)
+
+    def to_parquet(self, path: str, **kwargs):
+        """Writes the batch as a Parquet file; metadata columns stay dictionary-encoded."""
+        import pyarrow.parquet as pq
+
+        pq.write_table(self.to_arrow(), path, **kwargs)
+
+    def to_ipc(self, path: str):
+        """Writes the batch as an Arrow IPC file (memory-mappable by pyarrow.ipc.open_file)."""
+        import pyarrow as pa
+
+        table = self.to_arrow()
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+def _validity(values, missing: int):
+    """Validity bitmap for rows whose value is not missing, or None when all are valid."""
+    import pyarrow.compute as pc
+
+    valid = pc.not_equal(values, missing)
+    if pc.all(valid).as_py() is not False:
+        return None
+    return valid.buffers()[1]
+
+
+def _arrow_column(pa, column: _Column, size: int):
+    """Arrow array for one metadata column."""
+    buffer = pa.py_buffer(column.codes)
+    if column.is_integer:
+        raw = pa.Array.from_buffers(pa.int64(), size, [None, buffer])
+        return pa.Array.from_buffers(pa.int64(), size, [_validity(raw, MISSING_INT), buffer])
+
+    raw = pa.Array.from_buffers(pa.int32(), size, [None, buffer])
+    codes = pa.Array.from_buffers(pa.int32(), size, [_validity(raw, MISSING), buffer])
+    try:
+        values = pa.array(column.values)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        return _by_type(pa, column)
+    if pa.types.is_null(values.type):
+        return pa.nulls(size)
+    if pa.types.is_nested(values.type):
+        # Parquet cannot dictionary-encode nested values
+        return values.take(codes)
+    if values.null_count:
+        # A None value becomes a null row; Parquet rejects nulls inside the dictionary
+        import pyarrow.compute as pc
+
+        none_codes = pa.array([code for code, value in enumerate(column.values) if value is None], type=pa.int32())
+        codes = pc.if_else(pc.is_in(codes, value_set=none_codes), pa.scalar(None, pa.int32()), codes)
+        values = pc.if_else(values.is_valid(), values, values.drop_null()[0])
+    return pa.DictionaryArray.from_arrays(codes, values)
+
+
+def _by_type(pa, column: _Column):
+    """Struct with one child per Python type of a mixed-type column; a row sets only its own type's child."""
+    values = column.values
+    kinds = sorted({type(value).__name__ for value in values if value is not None})
+    children = []
+    for kind in kinds:
+        rows = [
+            None if code == MISSING or type(values[code]).__name__ != kind else values[code]
+            for code in column.codes
+        ]
+        try:
+            children.append(pa.array(rows))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            # Objects Arrow has no type for (the kind name still tells them apart)
+            children.append(pa.array([None if v is None else str(v) for v in rows], type=pa.string()))
+    missing = pa.array([code == MISSING for code in column.codes])
+    return pa.StructArray.from_arrays(children, names=kinds, mask=missing)
@@ -0,0 +1,427 @@
+import codecs
+from collections import deque
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+
+"""
+LangChain's RecursiveCharacterTextSplitter needs the whole document as one string, and then holds every chunk in a list on top of it.
+For multi-GB log files that means several copies of the file in memory.
+
+This module re-implements the same recursive separator algorithm over *spans* of a text buffer instead of copied strings:
+1. Separator Choice: For each span, the first separator that occurs anywhere in it is chosen (a find() over the buffer, no copy).
+2. Piece Splitting: The span is cut at every occurrence of that separator, keeping the separator at the start of the following piece (LangChain's keep_separator=True).
+3. Merging: Consecutive pieces shorter than chunk_size are merged greedily into chunks, carrying up to chunk_overlap of trailing pieces into the next chunk. Pieces that are too long are split again with the remaining separators.
+
+Because every decision only looks at (start, end) offsets, the splitter produces exactly the same chunks as LangChain while only ever materializing one chunk's worth of text at a time.
+The buffer can be a Python str (StrView) or an encoded bytes/mmap buffer (ByteView). ASCII separators are found directly in the encoded bytes, which is safe for UTF-8 and Latin-1 because neither encoding uses ASCII byte values inside multi-byte characters.
+
+On top of that:
+- Spans Out: iter_spans() yields (start, end) offsets of each chunk in the original buffer; callers slice the text only when they emit it and can record exact character offsets (start_index/end_index) for citations.
+- Token Sizing: With chunk_unit="tokens", piece lengths come from a local tokenizer (tiktoken's cl100k_base when installed, a 4-characters-per-token estimate otherwise) instead of len().
+- MarkdownSpanChunker: Header-aware splitting in the same pass. One scan over the lines finds the header sections (skipping fenced code blocks) and hands each section's span straight to the recursive splitter, with no intermediate strings or Document objects. Chunks are verbatim (whitespace-trimmed) slices of the original Markdown.
+"""
+
+
+# --------------------------------------------------
+# Length functions
+# --------------------------------------------------
+_encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken's cl100k_base when installed, else a 4-chars-per-token estimate."""
+    global _encoding
+    if _encoding is None:
+        try:
+            import tiktoken
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        except ImportError:
+            _encoding = False
+    if _encoding:
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4 + 1
+
+
+def length_function(chunk_unit: str) -> Optional[Callable[[str], int]]:
+    """Maps RAGConfig.chunk_unit to a length function (None means characters)."""
+    if chunk_unit == "chars":
+        return None
+    if chunk_unit == "tokens":
+        return count_tokens
+    raise ValueError(f"Unknown chunk_unit: {chunk_unit} (expected 'chars' or 'tokens')")
+
+
+# Spans this many times longer than chunk_size (in chars/bytes) are treated as too
+# long without tokenizing them; no tokenizer packs that many characters per token
+TOKENIZE_SPAN_FACTOR = 64
+
+
+class StrView:
+    """Span access over an in-memory string."""
+
+    def __init__(self, text: str):
+        self.buf = text
+        self.size = len(text)
+
+    def find(self, sep: str, start: int, end: int) -> int:
+        return self.buf.find(sep, start, end)
+
+    def sep_width(self, sep: str) -> int:
+        return len(sep)
+
+    def length(self, start: int, end: int, limit: int) -> int:
+        return end - start
+
+    def text(self, start: int, end: int) -> str:
+        return self.buf[start:end]
+
+    def char_spans(self, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        for i in range(start, end):
+            yield i, i + 1
+
+    def strip(self, start: int, end: int) -> Tuple[int, int]:
+        """Span with leading/trailing whitespace removed (str.strip semantics)."""
+        buf = self.buf
+        while start < end and buf[start].isspace():
+            start += 1
+        while end > start and buf[end - 1].isspace():
+            end -= 1
+        return start, end
+
+    def char_offset(self, pos: int) -> int:
+        return pos
+
+
+class ByteView:
+    """
+    Span access over an encoded buffer (bytes or mmap) in UTF-8 or Latin-1.
+    Offsets are byte offsets; text is decoded only for the spans that are emitted.
+    """
+
+    def __init__(self, buf: Union[bytes, "mmap.mmap"], encoding: str):
+        self.buf = buf
+        self.size = len(buf)
+        self.encoding = codecs.lookup(encoding).name
+        self.single_byte = self.encoding != "utf-8"
+        self._encoded = {}
+
+        # Last (byte offset, char offset) pair, so offsets are counted incrementally
+        self._cursor = (0, 0)
+
+    def _sep(self, sep: str) -> bytes:
+        encoded = self._encoded.get(sep)
+        if encoded is None:
+            encoded = self._encoded[sep] = sep.encode(self.encoding)
+        return encoded
+
+    def find(self, sep: str, start: int, end: int) -> int:
+        return self.buf.find(self._sep(sep), start, end)
+
+    def sep_width(self, sep: str) -> int:
+        return len(self._sep(sep))
+
+    def length(self, start: int, end: int, limit: int) -> int:
+        """Character length of a span; exact below limit, a lower bound otherwise."""
+        nbytes = end - start
+        if self.single_byte:
+            return nbytes
+        # A UTF-8 character is at most 4 bytes, so long spans never need decoding
+        if nbytes >= 4 * limit:
+            return nbytes // 4
+        return len(self.text(start, end))
+
+    def text(self, start: int, end: int) -> str:
+        return codecs.decode(self.buf[start:end], self.encoding)
+
+    def char_spans(self, start: int, end: int) -> Iterator[Tuple[int, int]]:
+        if self.single_byte:
+            for i in range(start, end):
+                yield i, i + 1
+            return
+        i = start
+        while i < end:
+            j = self._next_char(i, end)
+            yield i, j
+            i = j
+
+    def _next_char(self, i: int, end: int) -> int:
+        if self.single_byte:
+            return i + 1
+        # Skip UTF-8 continuation bytes (0b10xxxxxx) to find the next character
+        j = i + 1
+        while j < end and (self.buf[j] & 0xC0) == 0x80:
+            j += 1
+        return j
+
+    def _prev_char(self, start: int, end: int) -> int:
+        if self.single_byte:
+            return end - 1
+        i = end - 1
+        while i > start and (self.buf[i] & 0xC0) == 0x80:
+            i -= 1
+        return i
+
+    def strip(self, start: int, end: int) -> Tuple[int, int]:
+        """Span with leading/trailing whitespace removed (str.strip semantics)."""
+        while start < end:
+            j = self._next_char(start, end)
+            if not self.text(start, j).isspace():
+                break
+            start = j
+        while end > start:
+            i = self._prev_char(start, end)
+            if not self.text(i, end).isspace():
+                break
+            end = i
+        return start, end
+
+    def char_offset(self, pos: int) -> int:
+        """Character offset of a byte offset (which must be a character boundary)."""
+        if self.single_byte:
+            return pos
+        base_byte, base_char = self._cursor
+        if pos >= base_byte:
+            chars = base_char + len(self.text(base_byte, pos))
+        else:
+            chars = base_char - len(self.text(pos, base_byte))
+        self._cursor = (pos, chars)
+        return chars
+
+
+TextView = Union[StrView, ByteView]
+
+
+class _SpanMerger:
+    """
+    Streaming port of TextSplitter._merge_splits for contiguous pieces
+    (keep_separator=True, so pieces are joined with an empty separator).
+    Emits the stripped (start, end) span of every merged chunk.
+    """
+
+    def __init__(self, view: TextView, chunk_size: int, chunk_overlap: int):
+        self.view = view
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.docs: Deque[Tuple[int, int, int]] = deque()
+        self.total = 0
+
+    def add(self, start: int, end: int, length: int) -> Iterator[Tuple[int, int]]:
+        if self.total + length > self.chunk_size:
+            if self.docs:
+                doc = self._join()
+                if doc is not None:
+                    yield doc
+                # Drop pieces from the front until only the overlap remains
+                while self.total > self.chunk_overlap or (
+                    self.total + length > self.chunk_size and self.total > 0
+                ):
+                    self.total -= self.docs.popleft()[2]
+        self.docs.append((start, end, length))
+        self.total += length
+
+    def flush(self) -> Iterator[Tuple[int, int]]:
+        doc = self._join()
+        if doc is not None:
+            yield doc
+        self.docs.clear()
+        self.total = 0
+
+    def _join(self) -> Optional[Tuple[int, int]]:
+        if not self.docs:
+            return None
+        start, end = self.view.strip(self.docs[0][0], self.docs[-1][1])
+        return (start, end) if start < end else None
+
+
+class RecursiveSpanSplitter:
+    """
+    Separator-hierarchy splitter equivalent to LangChain's RecursiveCharacterTextSplitter
+    (default keep_separator/strip_whitespace), working on spans of a TextView.
+    length_function (e.g. count_tokens) replaces character counts for sizing.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        separators: Sequence[str],
+        length_function: Callable[[str], int] = None,
+    ):
+        if chunk_overlap > chunk_size:
+            raise ValueError(
+                f"Got a larger chunk overlap ({chunk_overlap}) than chunk size ({chunk_size})"
+            )
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.separators = list(separators)
+        self.length_function = length_function
+
+    def split_text(self, text: str) -> List[str]:
+        """Drop-in equivalent of RecursiveCharacterTextSplitter.split_text."""
+        return list(self.iter_split(StrView(text)))
+
+    def iter_split(self, view: TextView, start: int = 0, end: int = None) -> Iterator[str]:
+        """Yields chunks for view[start:end] one at a time."""
+        for chunk_start, chunk_end in self.iter_spans(view, start, end):
+            yield view.text(chunk_start, chunk_end)
+
+    def iter_spans(self, view: TextView, start: int = 0, end: int = None) -> Iterator[Tuple[int, int]]:
+        """Yields the (start, end) buffer offsets of every chunk in view[start:end]."""
+        if end is None:
+            end = view.size
+        yield from self._split(view, start, end, self.separators)
+
+    def _length(self, view: TextView, start: int, end: int) -> int:
+        if self.length_function is None:
+            return view.length(start, end, self.chunk_size)
+        if end - start > TOKENIZE_SPAN_FACTOR * self.chunk_size:
+            return end - start  # Certainly too long; not worth tokenizing
+        return self.length_function(view.text(start, end))
+
+    def _split(self, view: TextView, start: int, end: int, separators: List[str]) -> Iterator[Tuple[int, int]]:
+        # 1. Pick the first separator present anywhere in this span
+        separator = separators[-1]
+        new_separators: List[str] = []
+        for i, sep in enumerate(separators):
+            if sep == "":
+                separator = sep
+                break
+            if view.find(sep, start, end) != -1:
+                separator = sep
+                new_separators = separators[i + 1:]
+                break
+
+        # 2. Merge short pieces, recurse into long ones
+        merger = _SpanMerger(view, self.chunk_size, self.chunk_overlap)
+        for piece_start, piece_end in self._pieces(view, start, end, separator):
+            length = self._length(view, piece_start, piece_end)
+            if length < self.chunk_size:
+                yield from merger.add(piece_start, piece_end, length)
+                continue
+
+            yield from merger.flush()
+            if not new_separators:
+                yield piece_start, piece_end
+            else:
+                yield from self._split(view, piece_start, piece_end, new_separators)
+
+        yield from merger.flush()
+
+    @staticmethod
+    def _pieces(view: TextView, start: int, end: int, separator: str) -> Iterator[Tuple[int, int]]:
+        """Cuts a span before every separator occurrence, dropping empty pieces."""
+        if separator == "":
+            yield from view.char_spans(start, end)
+            return
+
+        match = view.find(separator, start, end)
+        if match == -1:
+            if start < end:
+                yield start, end
+            return
+
+        if match > start:
+            yield start, match
+
+        width = view.sep_width(separator)
+        while True:
+            following = view.find(separator, match + width, end)
+            if following == -1:
+                yield match, end
+                return
+            yield match, following
+            match = following
+
+
+# --------------------------------------------------
+# Markdown
+# --------------------------------------------------
+MARKDOWN_SEPARATORS = ["\n\n", "\n", " ", ""]
+MARKDOWN_HEADERS = (("#", "Header_1"), ("##", "Header_2"), ("###", "Header_3"))
+
+
+class MarkdownSpanChunker:
+    """
+    Single-pass header-aware Markdown chunker: header sections (outside fenced
+    code blocks) become metadata, and each section is split recursively.
+    Yields (start, end, header_metadata) spans over the original text.
+    """
+
+    def __init__(
+        self,
+        chunk_size: int,
+        chunk_overlap: int,
+        headers_to_split_on: Sequence[Tuple[str, str]] = MARKDOWN_HEADERS,
+        separators: Sequence[str] = MARKDOWN_SEPARATORS,
+        length_function: Callable[[str], int] = None,
+    ):
+        # Longest marker first, so "##" is not mistaken for "#"
+        self.headers = sorted(headers_to_split_on, key=lambda header: len(header[0]), reverse=True)
+        self.splitter = RecursiveSpanSplitter(chunk_size, chunk_overlap, separators, length_function)
+
+    def iter_spans(self, text: str) -> Iterator[Tuple[int, int, Dict[str, str]]]:
+        view = StrView(text)
+        for section_start, section_end, metadata in self.sections(text):
+            for start, end in self.splitter.iter_spans(view, section_start, section_end):
+                yield start, end, metadata
+
+    def sections(self, text: str) -> Iterator[Tuple[int, int, Dict[str, str]]]:
+        """
+        Header sections as (start, end, metadata); each starts at its header line.
+        Like MarkdownHeaderTextSplitter, a header with no body of its own is kept
+        together with the deeper section that follows it ("# Guide" + "## Setup").
+        """
+        size = len(text)
+        section_start = 0
+        metadata: Dict[str, str] = {}
+        stack: List[Tuple[int, str, str]] = []  # (level, name, title)
+        fence = ""
+        has_body = False
+
+        pos = 0
+        while pos < size:
+            line_end = text.find("\n", pos)
+            if line_end == -1:
+                line_end = size
+            line = text[pos:line_end].strip()
+            header = None
+
+            # Fenced code blocks can contain "#" lines that are not headers
+            if fence:
+                if line.startswith(fence):
+                    fence = ""
+            elif line.startswith("```") and line.count("```") == 1:
+                fence = "```"
+            elif line.startswith("~~~") and line.count("~~~") == 1:
+                fence = "~~~"
+            elif line.startswith("#"):
+                header = self._match_header(line)
+
+            if header is None:
+                has_body = has_body or bool(line)
+            else:
+                marker, name = header
+                level = len(marker)
+                while stack and stack[-1][0] >= level:
+                    stack.pop()
+                stack.append((level, name, line[len(marker):].strip()))
+                new_metadata = {header_name: title for _, header_name, title in stack}
+
+                header_only = section_start < pos and not has_body and len(metadata) < len(new_metadata)
+                if not header_only:
+                    if pos > section_start:
+                        yield section_start, pos, metadata
+                    section_start = pos
+                metadata = new_metadata
+                has_body = False
+
+            pos = line_end + 1
+
+        if section_start < size:
+            yield section_start, size, metadata
+
+    def _match_header(self, line: str) -> Optional[Tuple[str, str]]:
+        for marker, name in self.headers:
+            if line.startswith(marker) and (len(line) == len(marker) or line[len(marker)] == " "):
+                return marker, name
+        return None
@@ -0,0 +1,225 @@
+import hashlib
+import pickle
+import re
+import sqlite3
+import zlib
+from typing import TYPE_CHECKING, Any, Dict, Iterable, Iterator, List, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+"""
+Corpora repeat a lot of boilerplate: PDF headers and footers, license blocks in Markdown, identical log lines.
+Every copy becomes its own chunk, and every chunk is embedded and indexed.
+
+The ChunkDeduplicator runs over the output of all adapters and finds exact and near-duplicate chunks without comparing chunks pairwise:
+1. Exact Duplicates: The whitespace/case-normalized text is hashed; a repeated hash is a duplicate without any further work.
+2. Near Duplicates (MinHash LSH): Each chunk is reduced to a MinHash signature of its word shingles. The signature is cut into bands, and chunks sharing any identical band land in the same bucket. Only chunks in the same bucket are compared (by signature agreement, an estimate of Jaccard similarity), so lookups stay constant-time as the index grows to millions of chunks.
+3. Modes: "drop" streams the first occurrence and discards later copies; "collapse" keeps one chunk per duplicate group and lists every source in metadata["sources"] (emitted by finish(), since the full list is only known at the end).
+
+Memory is one small signature (num_perm 32-bit values) per distinct chunk text; every distinct text stays a bucket member, so a near duplicate of any
+earlier copy is found, not only one of its group's first occurrence. In collapse mode the representatives and their source lists are spilled to a
+temporary SQLite database (on disk, deleted on close) instead of being held in memory.
+numpy is imported when a deduplicator is created, so importing this module stays cheap for runs without dedup.
+"""
+
+
+Chunk = Dict[str, Any]
+
+MODES = ("drop", "collapse")
+
+# Mersenne prime for the universal hash family; keeps a * x + b within uint64
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Metadata keys copied into each entry of metadata["sources"] in collapse mode
+SOURCE_KEYS = ("file_name", "page_number", "start_index")
+
+
+def normalize(text: str) -> str:
+    """Case- and whitespace-insensitive form used for hashing and shingling."""
+    return " ".join(text.lower().split())
+
+
+class MinHasher:
+    """MinHash signatures over word shingles."""
+
+    def __init__(self, num_perm: int = 64, shingle_size: int = 5, seed: int = 1):
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self._a = rng.integers(1, (1 << 32) - 1, size=num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, (1 << 32) - 1, size=num_perm, dtype=np.uint64)
+
+    def signature(self, normalized: str) -> Optional["np.ndarray"]:
+        """Signature of already normalized text, or None when it has no words."""
+        import numpy as np
+
+        words = re.findall(r"\w+", normalized)
+        if not words:
+            return None
+        k = min(self.shingle_size, len(words))
+        shingles = {" ".join(words[i:i + k]) for i in range(len(words) - k + 1)}
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        # (a * x + b) mod p for every permutation and shingle, then the minimum per permutation
+        permuted = (np.outer(self._a, hashes) + self._b[:, None]) % np.uint64(_PRIME) & np.uint64(_MAX_HASH)
+        return permuted.min(axis=1).astype(np.uint32)
+
+
+class ChunkDeduplicator:
+    """
+    Streaming exact + near-duplicate filter for chunk dicts.
+    """
+    def __init__(
+        self,
+        mode: str = "drop",
+        threshold: float = 0.8,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle_size: int = 5,
+    ):
+        if mode not in MODES:
+            raise ValueError(f"Unknown dedup mode: {mode} (expected one of {MODES})")
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+
+        self.mode = mode
+        self.threshold = threshold
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.hasher = MinHasher(num_perm, shingle_size)
+
+        self._exact: Dict[bytes, int] = {}
+        # Every distinct text is a bucket member with its own signature; _owner maps a member to its representative
+        self._buckets: List[Dict[int, List[int]]] = [{} for _ in range(bands)]
+        self._signatures: List[Optional["np.ndarray"]] = []
+        self._owner: List[int] = []
+        self._representatives = 0
+        # Representative chunks and their sources (collapse mode), spilled to disk
+        self._kept: Optional[sqlite3.Connection] = None
+
+        self.seen = 0
+        self.duplicates = 0
+
+    def feed(self, chunks: Iterable[Chunk], source: str = None) -> Iterator[Chunk]:
+        """
+        Drop mode: yields the chunks that are not duplicates of anything seen so far.
+        Collapse mode: records the chunks (and source) and yields nothing; call finish().
+        """
+        for chunk in chunks:
+            self.seen += 1
+            match = self._match(chunk)
+
+            if self.mode == "drop":
+                if match is None:
+                    yield chunk
+                else:
+                    self.duplicates += 1
+                continue
+
+            entry = self._source_entry(chunk, source)
+            if match is None:
+                self._keep(chunk, entry)
+            else:
+                self.duplicates += 1
+                self._kept.execute("INSERT INTO sources VALUES (?, ?)", (match, pickle.dumps(entry)))
+
+    def _keep(self, chunk: Chunk, entry: Dict[str, Any]):
+        """Spills a new representative under the index _match() just assigned it."""
+        if self._kept is None:
+            # "" is a private temporary database that SQLite keeps on disk and deletes on close
+            self._kept = sqlite3.connect("")
+            self._kept.executescript(
+                """
+                CREATE TABLE kept (id INTEGER PRIMARY KEY, chunk BLOB NOT NULL);
+                CREATE TABLE sources (kept_id INTEGER NOT NULL, entry BLOB NOT NULL);
+                CREATE INDEX idx_sources_kept ON sources (kept_id);
+                """
+            )
+        index = self._representatives - 1
+        # A plain copy, so read-only chunks (ChunkBatch rows) can be collapsed too
+        row = {**chunk, "metadata": dict(chunk["metadata"])}
+        self._kept.execute("INSERT INTO kept VALUES (?, ?)", (index, pickle.dumps(row)))
+        self._kept.execute("INSERT INTO sources VALUES (?, ?)", (index, pickle.dumps(entry)))
+
+    def finish(self) -> Iterator[Chunk]:
+        """Yields the collapsed chunks (collapse mode); a no-op in drop mode."""
+        kept, self._kept = self._kept, None
+        if kept is None:
+            return
+        try:
+            sources = kept.execute("SELECT kept_id, entry FROM sources ORDER BY kept_id, rowid")
+            pending = next(sources, None)
+            for index, blob in kept.execute("SELECT id, chunk FROM kept ORDER BY id"):
+                chunk = pickle.loads(blob)
+                entries = []
+                while pending is not None and pending[0] == index:
+                    entries.append(pickle.loads(pending[1]))
+                    pending = next(sources, None)
+                chunk["metadata"]["sources"] = entries
+                chunk["metadata"]["duplicate_count"] = len(entries) - 1
+                yield chunk
+        finally:
+            kept.close()
+
+    def dedup(self, chunks: Iterable[Chunk], source: str = None) -> List[Chunk]:
+        """Deduplicates a complete collection in either mode."""
+        result = list(self.feed(chunks, source))
+        result.extend(self.finish())
+        return result
+
+    def _match(self, chunk: Chunk) -> Optional[int]:
+        """Index of the representative this chunk duplicates, or None after registering it as new."""
+        normalized = normalize(chunk["text"])
+
+        # 1. Exact duplicate of the normalized text
+        digest = hashlib.blake2b(normalized.encode("utf-8"), digest_size=16).digest()
+        index = self._exact.get(digest)
+        if index is not None:
+            return index
+
+        # 2. Near duplicate: compare against every member sharing a band, stopping at the first match
+        signature = self.hasher.signature(normalized)
+        keys = []
+        match = None
+        if signature is not None:
+            keys = [hash(signature[band * self.rows:(band + 1) * self.rows].tobytes()) for band in range(self.bands)]
+            compared = set()
+            for band, key in enumerate(keys):
+                for member in self._buckets[band].get(key, ()):
+                    if member in compared:
+                        continue
+                    compared.add(member)
+                    similarity = int((self._signatures[member] == signature).sum()) / signature.size
+                    if similarity >= self.threshold:
+                        match = self._owner[member]
+                        break
+                if match is not None:
+                    break
+
+        # 3. Register the text as a member, of the matched group or of a new representative
+        if match is None:
+            owner = self._representatives
+            self._representatives += 1
+        else:
+            owner = match
+        member = len(self._signatures)
+        self._signatures.append(signature)
+        self._owner.append(owner)
+        self._exact[digest] = owner
+        for band, key in enumerate(keys):
+            self._buckets[band].setdefault(key, []).append(member)
+        return match
+
+    @staticmethod
+    def _source_entry(chunk: Chunk, source: Optional[str]) -> Dict[str, Any]:
+        metadata = chunk.get("metadata", {})
+        entry = {key: metadata[key] for key in SOURCE_KEYS if key in metadata}
+        if source is not None:
+            entry["source"] = source
+        return entry
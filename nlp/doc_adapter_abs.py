@@ -1,5 +1,10 @@
+import io
+import mmap
+import os
 from abc import ABC, abstractmethod
-from typing import List, Dict, Any
+from contextlib import contextmanager
+from typing import List, Dict, Any, BinaryIO, Iterator, TextIO, Tuple, Union
+from chunk_batch import ChunkBatch
 from rag_config import RAGConfig
 
 """
@@ -18,18 +23,154 @@ Benefits of this Pattern
 
 """
 
+class BufferSource:
+    """
+    Document content that is already in memory (bytes) or memory-mapped (mmap),
+    plus the name it was delivered under. Lets adapters parse a document without
+    re-opening it, and ingest content that never lived on the local filesystem.
+    """
+    def __init__(self, data: Union[bytes, bytearray, memoryview, mmap.mmap], name: str = "document", path: str = None):
+        if isinstance(data, memoryview):
+            # Adapters search the buffer (bytes.find/mmap.find); a memoryview over a
+            # whole bytes/mmap object is unwrapped for free, anything else is copied once
+            whole = isinstance(data.obj, (bytes, mmap.mmap)) and data.nbytes == len(data.obj)
+            data = data.obj if whole else data.tobytes()
+        self.data = data
+        self.name = name
+
+        # Backing file, when the buffer is a mapping of one (lets worker processes re-open it)
+        self.path = path
+
+    def __len__(self) -> int:
+        return len(self.data)
+
+
+# What DocumentAdapter.load accepts: a file path or a buffer
+Source = Union[str, BufferSource]
+
+
+class BufferReader(io.RawIOBase):
+    """Read-only, seekable file object over a buffer, without copying it."""
+
+    def __init__(self, data):
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def readinto(self, target) -> int:
+        size = min(len(target), len(self._view) - self._pos)
+        target[:size] = self._view[self._pos:self._pos + size]
+        self._pos += size
+        return size
+
+    def seek(self, offset: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._pos, io.SEEK_END: len(self._view)}[whence]
+        self._pos = max(0, base + offset)
+        return self._pos
+
+    def tell(self) -> int:
+        return self._pos
+
+    def close(self):
+        self._view.release()
+        super().close()
+
+
+def as_source(source: Union[Source, bytes, bytearray, memoryview]) -> Source:
+    """Wraps bare bytes-like objects in a BufferSource; paths and BufferSources pass through."""
+    if isinstance(source, (bytes, bytearray, memoryview, mmap.mmap)):
+        return BufferSource(source)
+    return source
+
+
+def source_name(source: Source) -> str:
+    return source.name if isinstance(source, BufferSource) else source
+
+
+def source_size(source: Source) -> int:
+    return len(source) if isinstance(source, BufferSource) else os.path.getsize(source)
+
+
+def open_binary(source: Source) -> BinaryIO:
+    """Binary file object for a path or a buffer (the buffer is not copied)."""
+    if isinstance(source, BufferSource):
+        return io.BufferedReader(BufferReader(source.data))
+    return open(source, "rb")
+
+
+def open_text(source: Source, encoding: str) -> TextIO:
+    """Text-mode file object (universal newlines) for a path or a buffer."""
+    if isinstance(source, BufferSource):
+        return io.TextIOWrapper(open_binary(source), encoding=encoding, newline=None)
+    return open(source, "r", encoding=encoding)
+
+
+@contextmanager
+def map_file(path: str) -> Iterator[BufferSource]:
+    """Memory-maps a file once so detection, hashing and parsing share one read."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield BufferSource(b"", name=path, path=path)  # Empty files can't be mapped
+            return
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            yield BufferSource(mapped, name=path, path=path)
+        finally:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # A parser still holds a view; the mapping is released with it
+
+
 class DocumentAdapter(ABC):
     """
     Abstract Base Class for document processing adapters.
     Ensures a consistent interface for different file formats in the RAG pipeline.
     """
 
+    # Scheduling hint: adapters that spend most of their time in layout/vision
+    # models (PDF hi_res, OCR) are routed to a separate process pool.
+    cpu_bound: bool = False
+
+    # Cache identity: bump version whenever the adapter's output changes, and list
+    # the RAGConfig fields its chunks depend on (see IngestionManifest.make_key).
+    version: str = "1"
+    config_fields: Tuple[str, ...] = ("chunk_size", "chunk_overlap")
+
+    # load() must not depend on chunking settings, so its output can be parsed once
+    # and re-chunked under many configs. load_fields lists the RAGConfig fields it
+    # does depend on; cache_raw marks load() as expensive enough to persist.
+    load_fields: Tuple[str, ...] = ()
+    cache_raw: bool = False
+    # Keys the parsed cache: bump it whenever load()'s output changes, together with
+    # version, since the chunks are derived from that output
+    parse_version: str = "1"
+
     def __init__(self, config: RAGConfig):
         self.config = config
 
+    def warm_up(self):
+        """
+        Load any expensive model handles ahead of the first file.
+        Adapters without models have nothing to do.
+        """
+        pass
+
+    def release(self):
+        """Drop the model handles loaded by warm_up (or lazily by load)."""
+        pass
+
     @abstractmethod
-    def load(self, source: str) -> str:
-        """Extract raw text or structural data from the source file."""
+    def load(self, source: Source) -> str:
+        """
+        Extract raw text or structural data from the source: a file path, or a
+        BufferSource whose bytes (or mapping) should be parsed without re-reading.
+        """
         pass
 
     @abstractmethod
@@ -39,3 +180,26 @@ class DocumentAdapter(ABC):
         Returns: List of dicts with 'text' and 'metadata'.
         """
         pass
+
+    def iter_process(self, raw_data: Any) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming variant of process(): yields chunks one at a time so callers
+        never have to hold a whole document's chunks in memory.
+        Adapters that can produce chunks incrementally should override this.
+        """
+        yield from self.process(raw_data)
+
+    def process_batch(self, raw_data: Any) -> ChunkBatch:
+        """
+        process() as a columnar ChunkBatch. Chunks are appended as they are produced,
+        so the per-chunk dicts never exist all at once.
+        """
+        return ChunkBatch.from_chunks(self.iter_process(raw_data))
+
+    def dump_raw(self, raw_data: Any) -> bytes:
+        """Serialize load() output into a durable intermediate form."""
+        return raw_data.encode("utf-8")
+
+    def restore_raw(self, data: bytes) -> Any:
+        """Inverse of dump_raw."""
+        return data.decode("utf-8")
@@ -0,0 +1,288 @@
+import hashlib
+import math
+import re
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+from rag_config import RAGConfig
+from chunker import count_tokens
+
+
+"""
+Embedding is the slowest and most expensive step of RAG ingestion: every chunk is a paid API call's worth of tokens.
+The EmbeddingStage sits after IngestionFactory.process_file (or iter_chunks) and turns chunks into chunks with an "embedding" vector.
+
+Key Features:
+1. Pluggable Backends: RAGConfig.embedding_model picks the backend. "local-*" models use the deterministic HashingEmbedder (no network, ideal for offline tests); anything else goes to OpenAI through langchain-openai.
+2. Token-Budget Batching: Chunks are packed into requests by estimated token count (tiktoken when available) instead of a fixed number of chunks, so large chunks never push a request over the provider's limit and small ones are not sent one by one.
+3. Concurrency: Several batches are in flight at once on a thread pool; embedding calls are network-bound, so threads are enough.
+4. Persistent Cache: Vectors are stored on disk keyed by (model and output dimensions, sha256 of the chunk text) with LRU and size eviction. Re-ingesting a mostly unchanged corpus only embeds the chunks whose text actually changed; identical chunks within a run are embedded once.
+"""
+
+
+Chunk = Dict[str, Any]
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# --------------------------------------------------
+# Backends
+# --------------------------------------------------
+class EmbeddingBackend(ABC):
+    """
+    Turns a batch of texts into vectors.
+    """
+    model_name: str
+    # Output size, when the model can produce several
+    dimensions: Optional[int] = None
+
+    @property
+    def cache_key(self) -> str:
+        """Model identity in the cache; the same model at another size gives other vectors."""
+        return self.model_name if self.dimensions is None else f"{self.model_name}/{self.dimensions}"
+
+    @abstractmethod
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        pass
+
+
+class HashingEmbedder(EmbeddingBackend):
+    """
+    Deterministic local stand-in: signed feature hashing of lowercase word tokens,
+    L2-normalized. Same text, same vector, on every machine.
+    """
+    def __init__(self, dimensions: int = 256, model_name: str = None):
+        self.dimensions = dimensions
+        self.model_name = model_name or f"local-hashing-{dimensions}"
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed_one(text) for text in texts]
+
+    def _embed_one(self, text: str) -> List[float]:
+        vector = [0.0] * self.dimensions
+        for token in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += 1.0 if (value >> 63) else -1.0
+
+        norm = math.sqrt(sum(v * v for v in vector))
+        if norm:
+            vector = [v / norm for v in vector]
+        return vector
+
+
+class OpenAIEmbedder(EmbeddingBackend):
+    """Embeds through OpenAI (langchain-openai), e.g. text-embedding-3-small."""
+
+    def __init__(self, model_name: str, dimensions: int = None):
+        # Imported lazily: only needed when a hosted model is configured
+        from langchain_openai import OpenAIEmbeddings
+
+        # Shortened vectors are an explicit opt-in, and only text-embedding-3 models support them
+        if dimensions is not None and not model_name.startswith("text-embedding-3"):
+            raise ValueError(f"{model_name} does not support embedding_dimensions (leave it unset)")
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self._client = OpenAIEmbeddings(model=model_name, dimensions=self.dimensions)
+
+    def embed(self, texts: List[str]) -> List[List[float]]:
+        return self._client.embed_documents(texts)
+
+
+def get_embedder(config: RAGConfig) -> EmbeddingBackend:
+    """Builds the backend named by config.embedding_model."""
+    if config.embedding_model.startswith("local"):
+        return HashingEmbedder(config.embedding_dimensions or 256, model_name=config.embedding_model)
+    return OpenAIEmbedder(config.embedding_model, config.embedding_dimensions)
+
+
+# --------------------------------------------------
+# Cache
+# --------------------------------------------------
+class EmbeddingCache:
+    """
+    Disk-backed vector cache keyed by (model, text hash), evicted least-recently-used first.
+    The model column holds the backend's cache_key, which includes its output dimensions.
+    """
+    def __init__(self, path: str, max_entries: int = None, max_bytes: int = None):
+        self.path = path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model       TEXT NOT NULL,
+                text_hash   TEXT NOT NULL,
+                vector      BLOB NOT NULL,
+                size        INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            );
+            CREATE INDEX IF NOT EXISTS idx_embeddings_last_access ON embeddings (last_access);
+            """
+        )
+
+    def get_many(self, model: str, hashes: List[str]) -> Dict[str, List[float]]:
+        """Returns the cached vectors among hashes and refreshes their LRU timestamps."""
+        found: Dict[str, List[float]] = {}
+        with self._lock:
+            # SQLite limits bound parameters, so look up in slices
+            for start in range(0, len(hashes), 500):
+                part = hashes[start:start + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    (model, *part),
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_access = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, key) for key in found],
+                )
+                self._conn.commit()
+        return found
+
+    def put_many(self, model: str, vectors: Dict[str, List[float]]):
+        """Stores vectors as float32 and enforces the size limits."""
+        now = time.time()
+        rows = []
+        for key, vector in vectors.items():
+            blob = array("f", vector).tobytes()
+            rows.append((model, key, blob, len(blob), now))
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?)", rows)
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        if self.max_entries is not None:
+            self._conn.execute(
+                "DELETE FROM embeddings WHERE rowid NOT IN "
+                "(SELECT rowid FROM embeddings ORDER BY last_access DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+        if self.max_bytes is not None:
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM embeddings").fetchone()[0]
+            if total > self.max_bytes:
+                doomed = []
+                for rowid, size in self._conn.execute(
+                    "SELECT rowid, size FROM embeddings ORDER BY last_access ASC"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    doomed.append((rowid,))
+                    total -= size
+                self._conn.executemany("DELETE FROM embeddings WHERE rowid = ?", doomed)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+# --------------------------------------------------
+# Stage
+# --------------------------------------------------
+class EmbeddingStage:
+    """
+    Adds an "embedding" vector to every chunk, batching by token budget,
+    running batches concurrently and reusing cached vectors.
+    """
+    def __init__(
+        self,
+        embedder: EmbeddingBackend,
+        cache: EmbeddingCache = None,
+        batch_tokens: int = 8000,
+        max_batch_size: int = 256,
+        concurrency: int = 4,
+    ):
+        self.embedder = embedder
+        self.cache = cache
+        self.batch_tokens = batch_tokens
+        self.max_batch_size = max_batch_size
+        self.concurrency = concurrency
+
+        # Counters for the current stage lifetime
+        self.cache_hits = 0
+        self.embedded = 0
+
+    @classmethod
+    def from_config(cls, config: RAGConfig, cache: EmbeddingCache = None) -> "EmbeddingStage":
+        return cls(
+            get_embedder(config),
+            cache=cache,
+            batch_tokens=config.embedding_batch_tokens,
+            concurrency=config.embedding_concurrency,
+        )
+
+    def embed_chunks(self, chunks: List[Chunk]) -> List[Chunk]:
+        """Embeds a list of chunks in place and returns it."""
+        vectors = self._vectors_for([chunk["text"] for chunk in chunks])
+        for chunk, vector in zip(chunks, vectors):
+            chunk["embedding"] = vector
+        return chunks
+
+    def iter_embed(self, chunks: Iterable[Chunk], window: int = 1024) -> Iterator[Chunk]:
+        """Streaming variant: embeds window chunks at a time, so memory stays bounded."""
+        iterator = iter(chunks)
+        while True:
+            block = list(islice(iterator, window))
+            if not block:
+                return
+            yield from self.embed_chunks(block)
+
+    def _vectors_for(self, texts: List[str]) -> List[List[float]]:
+        model = self.embedder.cache_key
+
+        # 1. Identical texts are embedded once
+        hashes = [text_hash(text) for text in texts]
+        unique: Dict[str, str] = dict(zip(hashes, texts))
+
+        # 2. Reuse cached vectors
+        vectors: Dict[str, List[float]] = {}
+        if self.cache is not None:
+            vectors = self.cache.get_many(model, list(unique))
+            self.cache_hits += len(vectors)
+
+        # 3. Embed the rest in token-budgeted batches, several at a time
+        missing = [(key, text) for key, text in unique.items() if key not in vectors]
+        if missing:
+            batches = list(self._batches(missing))
+            with ThreadPoolExecutor(max_workers=self.concurrency) as pool:
+                results = pool.map(lambda batch: self.embedder.embed([text for _, text in batch]), batches)
+                fresh: Dict[str, List[float]] = {}
+                for batch, batch_vectors in zip(batches, results):
+                    for (key, _), vector in zip(batch, batch_vectors):
+                        fresh[key] = vector
+            self.embedded += len(fresh)
+            if self.cache is not None:
+                self.cache.put_many(model, fresh)
+            vectors.update(fresh)
+
+        return [vectors[key] for key in hashes]
+
+    def _batches(self, items: List[Tuple[str, str]]) -> Iterator[List[Tuple[str, str]]]:
+        """Packs (hash, text) pairs into batches under the token and size limits."""
+        batch: List[Tuple[str, str]] = []
+        tokens = 0
+        for item in items:
+            cost = count_tokens(item[1])
+            if batch and (tokens + cost > self.batch_tokens or len(batch) >= self.max_batch_size):
+                yield batch
+                batch, tokens = [], 0
+            batch.append(item)
+            tokens += cost
+        if batch:
+            yield batch
@@ -1,12 +1,16 @@
 import magic
 import mimetypes
-from typing import Dict, Type
-from doc_adapter_abs import DocumentAdapter
-from pdf_adapter import GenericPDFAdapter
-from markdown_adapter import MarkdownAdapter
-from text_adapter import TextAdapter
-from ocr_img_adapter import OCRAdapter
+import importlib
+from importlib.metadata import entry_points
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple, Type, Union
+from chunk_batch import ChunkBatch
+from doc_adapter_abs import BufferSource, DocumentAdapter, Source, map_file, source_name, source_size
 from rag_config import RAGConfig
+from ingestion_manifest import IngestionManifest
+import metrics
+import model_cache
 import os
 
 
@@ -19,42 +23,98 @@ Benefits:
 2. Decoupled Logic: The factory doesn't need to know how to parse a PDF; it only needs to know which class is responsible for it.
 3. Extensibility: To support a new format (like .docx or .csv), we simply create a new adapter subclass and add one line to the _adapters registry.
 4. Automatic Meta-Tagging: During the get_adapter step, we can automatically inject metadata (like file_type or encoding) into the resulting chunks for better RAG filtering later. 
+5. Single Read: process_file() memory-maps each file once; MIME sniffing (magic.from_buffer), manifest hashing and adapter.load() all work on that same BufferSource. process_bytes() accepts content that never touched the filesystem.
+6. Columnar Results: With as_batch=True the process_* methods return a ChunkBatch (one text buffer + dictionary-encoded metadata) instead of a list of dicts; worker pools use it to ship results between processes.
 
 The IngestionFactory class is the one responsible for distributing the configuration to the adapters it creates.
 
 Why this is essential?
-1. A/B Testing: We can run two versions of our pipeline with different chunk_size values (e.g., 512 vs 1024) to see which provides better retrieval accuracy for our specific dataset.
+1. A/B Testing: We can run two versions of our pipeline with different chunk_size values (e.g., 512 vs 1024) to see which provides better retrieval accuracy for our specific dataset. sweep() parses each file once and re-chunks the same load() output under every variant, so a whole sweep costs about as much as a single run.
 2. Scaling: In 2025, modern embedding models (like those from OpenAI or Cohere) support much larger context windows. We may want to increase chunk_size for complex technical documents while keeping it small for simple FAQs.
 3. Environment Injection: We can populate the RAGConfig from a .yaml file or os.getenv(), making our code "Twelve-Factor App" compliant for cloud deployment.
+
+Lazy Registry:
+The registry stores "module:ClassName" references instead of imported classes. Adapter modules (and their heavy dependencies: unstructured, cv2, docling, LangChain splitters) are imported the first time a file of that MIME type actually shows up, so a run that only touches .txt files never pays for the vision stack.
+Third-party adapters register the same way, either by calling IngestionFactory.register() or by publishing an entry point in the "nlp.adapters" group whose name is the MIME type and whose value is "package.module:AdapterClass".
 """
 
 
+# Entry-point group scanned for third-party adapters on a registry miss
+ADAPTER_ENTRY_POINT_GROUP = "nlp.adapters"
+
+# Header bytes handed to libmagic when sniffing a buffer (libmagic's own read limit)
+MIME_SNIFF_BYTES = 1024 * 1024
+
+
+@dataclass(frozen=True)
+class AdapterSpec:
+    """
+    Lazy reference to an adapter: a "module:ClassName" string (or the class itself).
+    cpu_bound is a routing hint available without importing the module.
+    """
+    target: Union[str, Type[DocumentAdapter]]
+    cpu_bound: Optional[bool] = None
+
+
+# Built-in registry mapping MIME types to their specific Adapter classes
+_DEFAULT_ADAPTERS: Dict[str, AdapterSpec] = {
+    "application/pdf": AdapterSpec("pdf_adapter:GenericPDFAdapter", cpu_bound=True),
+    "text/markdown": AdapterSpec("markdown_adapter:MarkdownAdapter", cpu_bound=False),
+    "text/x-markdown": AdapterSpec("markdown_adapter:MarkdownAdapter", cpu_bound=False),
+    "text/plain": AdapterSpec("text_adapter:TextAdapter", cpu_bound=False),
+    "image/png": AdapterSpec("ocr_img_adapter:OCRAdapter", cpu_bound=True),     # For images
+    "image/jpeg": AdapterSpec("ocr_img_adapter:OCRAdapter", cpu_bound=True),    # For images
+    # Add more as needed (e.g., application/vnd.openxmlformats-officedocument.wordprocessingml.document for .docx)
+}
+
+
 class IngestionFactory:
     """
     Automates file type detection and adapter selection.
     """
-    def __init__(self, config: RAGConfig = None):
+    # Warm adapter instances shared by every factory in this process,
+    # one per (adapter class, RAGConfig). RAGConfig is frozen, so it hashes.
+    _instances: Dict[Tuple[Type[DocumentAdapter], RAGConfig], DocumentAdapter] = {}
+
+    # Adapter classes already imported, keyed by their "module:ClassName" reference
+    _resolved: Dict[str, Type[DocumentAdapter]] = {}
+
+    def __init__(self, config: RAGConfig = None, manifest: IngestionManifest = None):
         # Use provided config or a default instance
         self.config = config or RAGConfig()
 
-        # Registry mapping MIME types to their specific Adapter classes
-        self._adapters: Dict[str, Type[DocumentAdapter]] = {
-            "application/pdf": GenericPDFAdapter,
-            "text/markdown": MarkdownAdapter,
-            "text/x-markdown": MarkdownAdapter,
-            "text/plain": TextAdapter,
-            "image/png": OCRAdapter,             # For images
-            "image/jpeg": OCRAdapter,            # For images
-            # Add more as needed (e.g., application/vnd.openxmlformats-officedocument.wordprocessingml.document for .docx)
-        }
+        # Optional content-addressed manifest; unchanged inputs skip load/process
+        self.manifest = manifest
+
+        # Registry mapping MIME types to lazy adapter references
+        self._adapters: Dict[str, AdapterSpec] = dict(_DEFAULT_ADAPTERS)
 
-    def get_adapter(self, file_path: str) -> DocumentAdapter:
+    def register(
+        self,
+        mime_type: str,
+        target: Union[str, Type[DocumentAdapter]],
+        cpu_bound: bool = None,
+    ):
         """
-        Detects file type and returns the corresponding adapter instance.
+        Registers an adapter for a MIME type without importing it.
+        target is either "module:ClassName" or an adapter class.
+        """
+        if cpu_bound is None and not isinstance(target, str):
+            cpu_bound = target.cpu_bound
+        self._adapters[mime_type] = AdapterSpec(target, cpu_bound)
+
+    def detect_mime_type(self, source: Source) -> str:
+        """
+        Detects the MIME type of a file (or buffer) from its content, with extension fallbacks.
         """
         # Detect MIME type based on file content (magic numbers)
         # 1. Try content-based detection first
-        mime_type = magic.from_file(file_path, mime=True)
+        if isinstance(source, BufferSource):
+            # Sniff the header already in memory instead of opening the file again
+            mime_type = magic.from_buffer(bytes(source.data[:MIME_SNIFF_BYTES]), mime=True)
+        else:
+            mime_type = magic.from_file(source, mime=True)
+        file_path = source_name(source)
         
         # 2. Windows Fallback: If magic fails (octet-stream), guess by extension
         if mime_type == "application/octet-stream":
@@ -65,17 +125,320 @@ class IngestionFactory:
         # 3. Final Fallback: Default to text/plain if it's a known text extension
         if mime_type == "application/octet-stream" and file_path.endswith('.txt'):
             mime_type = "text/plain"
+
+        return mime_type
+
+    def get_adapter_class(self, mime_type: str) -> Type[DocumentAdapter]:
+        """Looks up the adapter registered for a MIME type, importing it on first use."""
+        return self._resolve(self._get_spec(mime_type))
+
+    def is_cpu_bound(self, mime_type: str) -> bool:
+        """Routing hint for a MIME type; only imports the adapter if the spec has no hint."""
+        spec = self._get_spec(mime_type)
+        if spec.cpu_bound is None:
+            return self._resolve(spec).cpu_bound
+        return spec.cpu_bound
+
+    def _get_spec(self, mime_type: str) -> AdapterSpec:
+        """Finds the spec for a MIME type, falling back to installed entry points."""
+        spec = self._adapters.get(mime_type)
+
+        if spec is None:
+            # Third-party adapters are only discovered when a built-in one is missing
+            for ep in entry_points(group=ADAPTER_ENTRY_POINT_GROUP):
+                if ep.name == mime_type:
+                    spec = AdapterSpec(ep.value)
+                    self._adapters[mime_type] = spec
+                    break
         
-        adapter_class = self._adapters.get(mime_type)
-        
-        if not adapter_class:
+        if not spec:
             raise ValueError(f"No adapter found for file type: {mime_type}")
+
+        return spec
+
+    def _resolve(self, spec: AdapterSpec) -> Type[DocumentAdapter]:
+        """Imports the adapter class behind a spec (once per process)."""
+        if not isinstance(spec.target, str):
+            return spec.target
+
+        adapter_class = self._resolved.get(spec.target)
+        if adapter_class is None:
+            module_name, _, class_name = spec.target.partition(":")
+            adapter_class = getattr(importlib.import_module(module_name), class_name)
+            self._resolved[spec.target] = adapter_class
+        return adapter_class
+
+    def get_adapter(self, source: Source) -> DocumentAdapter:
+        """
+        Detects file type and returns the corresponding adapter instance.
+        """
+        adapter_class = self.get_adapter_class(self.detect_mime_type(source))
             
-        # Pass the global config into the specific adapter instance
-        return adapter_class(config=self.config)
+        return self._get_instance(adapter_class)
+
+    def _get_instance(self, adapter_class: Type[DocumentAdapter]) -> DocumentAdapter:
+        """Returns the cached adapter for this factory's config, creating it once."""
+        key = (adapter_class, self.config)
+        adapter = self._instances.get(key)
+        if adapter is None:
+            # Pass the global config into the specific adapter instance
+            adapter = adapter_class(config=self.config)
+            self._instances[key] = adapter
+        return adapter
 
-    def process_file(self, file_path: str):
+    def registered_mime_types(self, cpu_bound: bool = None) -> List[str]:
+        """MIME types in the registry, optionally filtered by the adapters' cpu_bound hint."""
+        return [
+            mime_type for mime_type in self._adapters
+            if cpu_bound is None or self.is_cpu_bound(mime_type) == cpu_bound
+        ]
+
+    def warm_up(self, mime_types: Iterable[str] = None):
+        """
+        Creates the adapters for the given MIME types (default: all registered)
+        and loads their model handles, e.g. from a worker pool initializer.
+        """
+        if mime_types is None:
+            mime_types = self._adapters
+        for adapter_class in {self.get_adapter_class(m) for m in mime_types}:
+            self._get_instance(adapter_class).warm_up()
+
+    @classmethod
+    def release(cls):
+        """Releases every cached adapter and model handle held by this process."""
+        for adapter in cls._instances.values():
+            adapter.release()
+        cls._instances.clear()
+        model_cache.release_model()
+
+    def process_file(self, file_path: str, as_batch: bool = False):
         """Standard entry point for all file processing."""
-        adapter = self.get_adapter(file_path)
-        raw_data = adapter.load(file_path)
-        return adapter.process(raw_data)
\ No newline at end of file
+        # The file is read once: detection, hashing and parsing all use the mapping
+        with map_file(file_path) as source:
+            return self.process_source(source, as_batch)
+
+    def process_bytes(self, data: Union[bytes, bytearray, memoryview], name: str = "document", as_batch: bool = False):
+        """Ingests content that is already in memory (object stores, archives, sockets)."""
+        return self.process_source(BufferSource(data, name=name), as_batch)
+
+    def process_source(self, source: Source, as_batch: bool = False):
+        """process_file() for a path or a BufferSource."""
+        labels: Dict[str, str] = {}
+        try:
+            adapter = self._instrumented_adapter(source, labels)
+            chunks = self._process_source(adapter, source, labels, as_batch)
+        except Exception:
+            metrics.count("ingest_failures_total", **labels)
+            raise
+        metrics.count("ingest_chunks_total", len(chunks), **labels)
+        return chunks
+
+    def _process_source(self, adapter: DocumentAdapter, source: Source, labels: Dict[str, str], as_batch: bool = False):
+        if self.manifest is None:
+            with metrics.span("load", **labels):
+                raw_data = adapter.load(source)
+            try:
+                with metrics.span("process", **labels):
+                    return adapter.process_batch(raw_data) if as_batch else adapter.process(raw_data)
+            finally:
+                _close_raw(raw_data)
+
+        # Serve unchanged inputs from the manifest without parsing them again
+        content_hash = self._hash(source)
+        key = self.manifest.make_key(content_hash, type(adapter), self.config)
+        cached = self.manifest.get(key)
+        if cached is not None:
+            metrics.count("ingest_cache_hits_total", **labels)
+            return ChunkBatch.from_chunks(cached) if as_batch else cached
+
+        with metrics.span("load", **labels):
+            raw_data = self._load_raw(adapter, source, content_hash)
+        try:
+            with metrics.span("process", **labels):
+                chunks = adapter.process(raw_data)
+        finally:
+            _close_raw(raw_data)
+        self.manifest.put(key, content_hash, type(adapter), chunks)
+        return ChunkBatch.from_chunks(chunks) if as_batch else chunks
+
+    def _instrumented_adapter(self, source: Source, labels: Dict[str, str]) -> DocumentAdapter:
+        """
+        get_adapter() with mime/construct spans. Fills in the file's metric labels as they
+        become known, so a failure (e.g. an unsupported type) is still counted under its MIME type.
+        """
+        with metrics.span("mime") as span:
+            mime_type = self.detect_mime_type(source)
+            span.set(mime_type=mime_type)
+        labels["mime_type"] = mime_type
+
+        adapter_class = self.get_adapter_class(mime_type)
+        labels["adapter"] = adapter_class.__name__
+        with metrics.span("construct", **labels):
+            adapter = self._get_instance(adapter_class)
+
+        metrics.count("ingest_files_total", **labels)
+        if metrics.enabled():
+            metrics.count("ingest_bytes_total", source_size(source), **labels)
+        return adapter
+
+    def iter_file(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Streaming counterpart of process_file(): yields one file's chunks as the
+        adapter produces them. With a manifest, results go through process_file
+        so they can be cached.
+        """
+        with map_file(file_path) as source:
+            yield from self.iter_source(source)
+
+    def iter_source(self, source: Source) -> Iterator[Dict[str, Any]]:
+        """iter_file() for a path or a BufferSource."""
+        if self.manifest is not None:
+            yield from self.process_source(source)
+            return
+
+        labels: Dict[str, str] = {}
+        try:
+            adapter = self._instrumented_adapter(source, labels)
+            with metrics.span("load", **labels):
+                raw_data = adapter.load(source)
+            try:
+                # Only the time spent inside the adapter counts as "process"
+                yield from metrics.timed_iter(
+                    adapter.iter_process(raw_data), "process", "ingest_chunks_total", **labels
+                )
+            finally:
+                _close_raw(raw_data)
+        except Exception:
+            metrics.count("ingest_failures_total", **labels)
+            raise
+
+    def iter_chunks(
+        self,
+        file_paths: Iterable[str],
+        on_error: Callable[[str, Exception], None] = None,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Yields the chunks of many files as a single stream, so memory stays flat
+        regardless of corpus size. Without on_error the first failure propagates;
+        with it, the failing file is reported and the stream moves on.
+        """
+        for file_path in file_paths:
+            try:
+                yield from self.iter_file(file_path)
+            except Exception as e:
+                if on_error is None:
+                    raise
+                on_error(file_path, e)
+
+    def sweep(
+        self,
+        file_path: str,
+        configs: Sequence[RAGConfig],
+        max_workers: int = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Parse once, chunk many: loads the file a single time (with this factory's
+        config) and runs process() under every config variant.
+        Returns one chunk list per config, in the same order.
+        """
+        with map_file(file_path) as source:
+            return self._sweep(source, configs, max_workers)
+
+    def _sweep(
+        self,
+        source: Source,
+        configs: Sequence[RAGConfig],
+        max_workers: Optional[int],
+    ) -> List[List[Dict[str, Any]]]:
+        adapter = self.get_adapter(source)
+        adapter_class = type(adapter)
+
+        content_hash = None
+        if self.manifest is not None:
+            content_hash = self._hash(source)
+
+        # 1. Variants already in the chunk cache need no work at all
+        results: List[Optional[List[Dict[str, Any]]]] = [None] * len(configs)
+        keys: List[Optional[str]] = [None] * len(configs)
+        if content_hash is not None:
+            for i, config in enumerate(configs):
+                keys[i] = self.manifest.make_key(content_hash, adapter_class, config)
+                results[i] = self.manifest.get(keys[i])
+
+        todo = [i for i, chunks in enumerate(results) if chunks is None]
+        if not todo:
+            return results
+
+        # 2. The expensive part runs exactly once
+        raw_data = self._load_raw(adapter, source, content_hash)
+
+        # 3. Re-chunk under each remaining variant, optionally in parallel
+        try:
+            self._process_variants(adapter, raw_data, configs, todo, results, max_workers)
+        finally:
+            _close_raw(raw_data)
+
+        if content_hash is not None:
+            for i in todo:
+                self.manifest.put(keys[i], content_hash, adapter_class, results[i])
+
+        return results
+
+    @staticmethod
+    def _process_variants(
+        adapter: DocumentAdapter,
+        raw_data: Any,
+        configs: Sequence[RAGConfig],
+        todo: List[int],
+        results: List[Optional[List[Dict[str, Any]]]],
+        max_workers: Optional[int],
+    ):
+        """Fills results[i] with the chunks for configs[i], for every index in todo."""
+        adapter_class = type(adapter)
+        if max_workers and max_workers > 1 and len(todo) > 1:
+            blob = adapter.dump_raw(raw_data)
+            with ProcessPoolExecutor(max_workers=min(max_workers, len(todo))) as pool:
+                futures = {
+                    i: pool.submit(_process_variant, adapter_class, configs[i], blob)
+                    for i in todo
+                }
+                for i, future in futures.items():
+                    results[i] = future.result()
+        else:
+            for i in todo:
+                variant = IngestionFactory(configs[i])._get_instance(adapter_class)
+                results[i] = variant.process(raw_data)
+
+    def _hash(self, source: Source) -> str:
+        if isinstance(source, BufferSource):
+            return self.manifest.hash_bytes(source.data)
+        return self.manifest.hash_file(source)
+
+    def _load_raw(self, adapter: DocumentAdapter, source: Source, content_hash: str = None) -> Any:
+        """Runs adapter.load, going through the manifest's parsed cache when possible."""
+        if self.manifest is None or content_hash is None or not adapter.cache_raw:
+            return adapter.load(source)
+
+        key = self.manifest.make_key(
+            content_hash, type(adapter), self.config, adapter.load_fields, version=adapter.parse_version
+        )
+        data = self.manifest.get_parsed(key)
+        if data is not None:
+            return adapter.restore_raw(data)
+
+        raw_data = adapter.load(source)
+        self.manifest.put_parsed(key, content_hash, type(adapter), adapter.dump_raw(raw_data))
+        return raw_data
+
+
+def _close_raw(raw_data: Any):
+    """Releases load() output that holds OS resources (e.g. a memory-mapped file)."""
+    close = getattr(raw_data, "close", None)
+    if callable(close):
+        close()
+
+
+def _process_variant(adapter_class: Type[DocumentAdapter], config: RAGConfig, blob: bytes) -> List[Dict[str, Any]]:
+    """Sweep worker: restores the shared load() output and chunks it under one config."""
+    adapter = IngestionFactory(config)._get_instance(adapter_class)
+    return adapter.process(adapter.restore_raw(blob))
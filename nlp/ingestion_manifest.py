@@ -0,0 +1,246 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, List, Optional, Tuple
+from rag_config import RAGConfig
+
+
+"""
+Moving a file into processed/ is not a reliable "already done" marker: the same document lands in raw/ again, a run crashes halfway, or a copy arrives under a new name.
+Re-running hi_res layout detection or OCR on those duplicates wastes hours of CPU.
+
+The IngestionManifest is a small SQLite database keyed by *what* was ingested rather than *where* it came from:
+    key = sha256(content hash, adapter class, adapter version, relevant RAGConfig fields)
+
+Key Features:
+1. Content Addressing: Renamed or re-delivered files hit the same entry; a single changed byte produces a new one.
+2. Invalidation by Construction: Bumping an adapter's version (parse_version for the parsed cache), or changing a RAGConfig field it declares in config_fields (e.g. chunk_size), changes the key, so stale chunks are never served.
+3. Chunk Cache: The resulting chunks are stored zlib-compressed, so a hit returns them without calling adapter.load or adapter.process at all. With store_chunks=False the manifest only records what was seen, and hits are skipped (no chunks returned).
+4. Parsed Cache: The expensive, config-independent output of adapter.load (unstructured elements, OCR Markdown) is kept in a second table keyed only by the fields in load_fields, so re-chunking the same document under a new chunk_size skips layout detection and OCR entirely.
+5. Bounded Size: Entries (per table) are evicted least-recently-used first once max_entries or max_bytes is exceeded, and entries idle for longer than max_age_seconds are dropped, which is also how entries for retired adapter versions/configs age out.
+6. Multi-Process Safe: WAL mode lets pool workers share one manifest file; the connection is opened lazily per process, so a manifest can be passed to worker pools as-is.
+"""
+
+
+# "chunks" caches process() output, "parsed" caches load() output
+TABLES = ("chunks", "parsed")
+
+SCHEMA = "".join(
+    f"""
+CREATE TABLE IF NOT EXISTS {table} (
+    key          TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    adapter      TEXT NOT NULL,
+    payload      BLOB,
+    size         INTEGER NOT NULL,
+    created_at   REAL NOT NULL,
+    last_access  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_{table}_last_access ON {table} (last_access);
+"""
+    for table in TABLES
+)
+
+
+class IngestionManifest:
+    """
+    Persistent, content-addressed record of ingested documents with a chunk cache.
+    """
+    def __init__(
+        self,
+        path: str,
+        store_chunks: bool = True,
+        max_entries: int = None,
+        max_bytes: int = None,
+        max_age_seconds: float = None,
+    ):
+        self.path = path
+        self.store_chunks = store_chunks
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+
+    # --------------------------------------------------
+    # Keys
+    # --------------------------------------------------
+    @staticmethod
+    def hash_file(file_path: str) -> str:
+        """SHA-256 of the file content, read in blocks."""
+        with open(file_path, "rb") as f:
+            return hashlib.file_digest(f, "sha256").hexdigest()
+
+    @staticmethod
+    def hash_bytes(data) -> str:
+        """SHA-256 of an in-memory or memory-mapped buffer; same digest as hash_file."""
+        return hashlib.sha256(data).hexdigest()
+
+    @staticmethod
+    def make_key(
+        content_hash: str,
+        adapter_class: type,
+        config: RAGConfig,
+        fields: Tuple[str, ...] = None,
+        version: str = None,
+    ) -> str:
+        """
+        Combines content, adapter identity/version and the config fields it depends on
+        (adapter_class.config_fields and adapter_class.version unless given).
+        """
+        adapter = f"{adapter_class.__module__}.{adapter_class.__qualname__}"
+        if fields is None:
+            fields = adapter_class.config_fields
+        if version is None:
+            version = adapter_class.version
+        fields = {name: getattr(config, name) for name in fields}
+        material = json.dumps(
+            [content_hash, adapter, version, fields],
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    # --------------------------------------------------
+    # Lookups
+    # --------------------------------------------------
+    def get(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """
+        Returns the cached chunks for key, [] for a record-only hit, or None on a miss.
+        """
+        found, payload = self._read("chunks", key)
+        if not found:
+            return None
+        if payload is None:
+            return []
+        return json.loads(zlib.decompress(payload))
+
+    def put(self, key: str, content_hash: str, adapter_class: type, chunks: List[Dict[str, Any]]):
+        """Records a successful ingestion (and its chunks) and enforces the size limits."""
+        payload = None
+        if self.store_chunks:
+            payload = zlib.compress(json.dumps(chunks, default=str).encode("utf-8"))
+        self._write("chunks", key, content_hash, adapter_class, payload)
+
+    def get_parsed(self, key: str) -> Optional[bytes]:
+        """Returns the serialized load() output for key, or None on a miss."""
+        found, payload = self._read("parsed", key)
+        if not found or payload is None:
+            return None
+        return zlib.decompress(payload)
+
+    def put_parsed(self, key: str, content_hash: str, adapter_class: type, data: bytes):
+        """Stores serialized load() output (see DocumentAdapter.dump_raw)."""
+        self._write("parsed", key, content_hash, adapter_class, zlib.compress(data))
+
+    def _read(self, table: str, key: str) -> Tuple[bool, Optional[bytes]]:
+        """Fetches a payload and refreshes its LRU timestamp."""
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(f"SELECT payload FROM {table} WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return False, None
+            conn.execute(f"UPDATE {table} SET last_access = ? WHERE key = ?", (time.time(), key))
+            conn.commit()
+        return True, row[0]
+
+    def _write(self, table: str, key: str, content_hash: str, adapter_class: type, payload: Optional[bytes]):
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute(
+                f"INSERT OR REPLACE INTO {table} VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    content_hash,
+                    f"{adapter_class.__module__}.{adapter_class.__qualname__}",
+                    payload,
+                    len(payload) if payload else 0,
+                    now,
+                    now,
+                ),
+            )
+            self._evict(conn, table)
+            conn.commit()
+
+    # --------------------------------------------------
+    # Eviction
+    # --------------------------------------------------
+    def evict(self):
+        """Applies the age, entry-count and byte limits to every table."""
+        with self._lock:
+            conn = self._connect()
+            for table in TABLES:
+                self._evict(conn, table)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection, table: str):
+        # 1. Drop entries that have been idle for too long
+        if self.max_age_seconds is not None:
+            cutoff = time.time() - self.max_age_seconds
+            conn.execute(f"DELETE FROM {table} WHERE last_access < ?", (cutoff,))
+
+        # 2. Keep only the most recently used max_entries
+        if self.max_entries is not None:
+            conn.execute(
+                f"DELETE FROM {table} WHERE key NOT IN "
+                f"(SELECT key FROM {table} ORDER BY last_access DESC LIMIT ?)",
+                (self.max_entries,),
+            )
+
+        # 3. Trim least recently used entries until the payloads fit in max_bytes
+        if self.max_bytes is not None:
+            total = conn.execute(f"SELECT COALESCE(SUM(size), 0) FROM {table}").fetchone()[0]
+            if total > self.max_bytes:
+                rows = conn.execute(f"SELECT key, size FROM {table} ORDER BY last_access ASC").fetchall()
+                doomed = []
+                for key, size in rows:
+                    if total <= self.max_bytes:
+                        break
+                    doomed.append((key,))
+                    total -= size
+                conn.executemany(f"DELETE FROM {table} WHERE key = ?", doomed)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """Entry count and total payload bytes per table."""
+        result = {}
+        with self._lock:
+            conn = self._connect()
+            for table in TABLES:
+                entries, size = conn.execute(
+                    f"SELECT COUNT(*), COALESCE(SUM(size), 0) FROM {table}"
+                ).fetchone()
+                result[table] = {"entries": entries, "bytes": size}
+        return result
+
+    # --------------------------------------------------
+    # Connection handling
+    # --------------------------------------------------
+    def _connect(self) -> sqlite3.Connection:
+        """Opens the database on first use in this process."""
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def close(self):
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def __getstate__(self):
+        # Connections and locks don't pickle; each worker process reconnects lazily
+        state = self.__dict__.copy()
+        state["_conn"] = None
+        state["_lock"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
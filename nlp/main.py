@@ -1,4 +1,13 @@
 from ingestion_factory import IngestionFactory
+from ingestion_manifest import IngestionManifest
+from rag_config import RAGConfig
+from parallel_ingestion import ParallelIngestor, iter_sequential
+from watch_daemon import WatchDaemon
+from sinks import BatchWriter, ChunkSpool, make_sink
+from chunk_batch import ChunkBatch
+from embedding import EmbeddingCache, EmbeddingStage
+from dedup import ChunkDeduplicator
+import metrics
 from dotenv import load_dotenv
 import os
 import shutil
@@ -7,6 +16,11 @@ def ensure_dir(path: str):
     """Create directory if it doesn't exist."""
     os.makedirs(path, exist_ok=True)
 
+def env_int(name: str):
+    """Read an optional integer setting from the environment."""
+    value = os.getenv(name)
+    return int(value) if value else None
+
 if __name__ == "__main__":
     # --------------------------------------------------
     # Load environment variables
@@ -27,63 +41,237 @@ if __name__ == "__main__":
     ensure_dir(PROCESSED_DIR)
     ensure_dir(ERROR_DIR)
 
+    # Optional content-addressed manifest: re-delivered files are served
+    # from the chunk cache instead of being parsed again
+    MANIFEST_PATH = os.getenv("INGEST_MANIFEST")
+    manifest = None
+    if MANIFEST_PATH:
+        manifest = IngestionManifest(
+            MANIFEST_PATH,
+            max_entries=env_int("INGEST_MANIFEST_MAX_ENTRIES"),
+            max_bytes=env_int("INGEST_MANIFEST_MAX_BYTES"),
+        )
+
+    # INGEST_PDF_STRATEGY=auto sends only scanned/tabular pages through hi_res
+    config = RAGConfig(
+        pdf_strategy=os.getenv("INGEST_PDF_STRATEGY", "hi_res"),
+        embedding_model=os.getenv("INGEST_EMBEDDING_MODEL", RAGConfig.embedding_model),
+    )
+
+    # INGEST_METRICS=<path> records per-stage timings and counters and writes
+    # them at the end (Prometheus text, or JSON for a .json path)
+    METRICS_PATH = os.getenv("INGEST_METRICS")
+    registry = metrics.add_hook(metrics.MetricsRegistry()) if METRICS_PATH else None
+
     # Initialize ingestion factory
-    factory = IngestionFactory()
+    factory = IngestionFactory(config, manifest=manifest)
 
     print(f"\n--- Starting Automatic Ingestion Pipeline ---")
     print(f"Root Folder : {DOCUMENT_FOLDER}")
     print(f"Raw Folder  : {RAW_DIR}")
 
-    all_rag_documents = []
+    # Chunks are streamed into a sink in bounded batches instead of being
+    # collected in memory (INGEST_SINK: jsonl | parquet | sqlite | vectors)
+    SINK_KIND = os.getenv("INGEST_SINK", "jsonl")
+    SINK_PATH = os.getenv("INGEST_SINK_PATH") or os.path.join(DOCUMENT_FOLDER, f"chunks.{SINK_KIND}")
+    print(f"Sink        : {SINK_KIND} -> {SINK_PATH}")
 
-    # --------------------------------------------------
-    # Process only files in raw/
-    # --------------------------------------------------
-    for filename in os.listdir(RAW_DIR):
-        file_path = os.path.join(RAW_DIR, filename)
+    writer = BatchWriter(
+        make_sink(SINK_KIND, SINK_PATH),
+        batch_size=env_int("INGEST_SINK_BATCH_SIZE") or 256,
+    )
+    total_chunks = 0
 
-        if not os.path.isfile(file_path):
-            continue
+    # INGEST_EMBED=1 embeds chunks before they reach the sink; vectors are
+    # cached on disk so unchanged chunks are never embedded twice
+    embedder = None
+    if os.getenv("INGEST_EMBED", "0") == "1":
+        cache_path = os.getenv("INGEST_EMBEDDING_CACHE") or os.path.join(DOCUMENT_FOLDER, "embeddings.sqlite")
+        embedder = EmbeddingStage.from_config(
+            config,
+            cache=EmbeddingCache(cache_path, max_bytes=env_int("INGEST_EMBEDDING_CACHE_MAX_BYTES")),
+        )
+        print(f"Embeddings  : {config.embedding_model} (cache: {cache_path})")
 
-        print(f"\nProcessing file: {file_path}")
+    # INGEST_DEDUP=drop|collapse removes exact and near-duplicate chunks
+    # (boilerplate headers, license blocks, repeated log lines) before embedding
+    deduplicator = None
+    DEDUP_MODE = os.getenv("INGEST_DEDUP")
+    if DEDUP_MODE:
+        deduplicator = ChunkDeduplicator(
+            mode=DEDUP_MODE,
+            threshold=float(os.getenv("INGEST_DEDUP_THRESHOLD", "0.8")),
+        )
+        print(f"Dedup       : {DEDUP_MODE}")
 
-        try:
-            chunks = factory.process_file(file_path)
-            all_rag_documents.extend(chunks)
+    # INGEST_WATCH=1 keeps running and ingests files within seconds of them
+    # landing in raw/, instead of a one-shot scan
+    if os.getenv("INGEST_WATCH", "0") == "1":
+        if DEDUP_MODE == "collapse":
+            raise EnvironmentError("INGEST_DEDUP=collapse needs a finite run; use drop with INGEST_WATCH")
 
-            # Move to processed/
-            shutil.move(
-                file_path,
-                os.path.join(PROCESSED_DIR, filename)
+        def prepare(chunks, filename):
+            if deduplicator is not None:
+                chunks = deduplicator.feed(chunks, source=filename)
+            if embedder is not None:
+                chunks = embedder.iter_embed(chunks)
+            return chunks
+
+        daemon = WatchDaemon(
+            DOCUMENT_FOLDER,
+            writer,
+            config=factory.config,
+            manifest=manifest,
+            heavy_workers=env_int("INGEST_HEAVY_WORKERS"),
+            light_workers=env_int("INGEST_LIGHT_WORKERS"),
+            max_in_flight=env_int("INGEST_WATCH_MAX_IN_FLIGHT"),
+            stable_seconds=float(os.getenv("INGEST_WATCH_STABLE_SECONDS", "2")),
+            prepare=prepare,
+        )
+        daemon.run()
+        total_chunks = daemon.total_chunks
+    else:
+        # --------------------------------------------------
+        # Process only files in raw/ (sorted for a stable chunk order)
+        # --------------------------------------------------
+        file_paths = [
+            os.path.join(RAW_DIR, filename)
+            for filename in sorted(os.listdir(RAW_DIR))
+            if os.path.isfile(os.path.join(RAW_DIR, filename))
+        ]
+
+        # INGEST_PARALLEL=1 fans files out to separate heavy (PDF/OCR) and
+        # light (text/markdown) process pools; results still arrive in order.
+        if os.getenv("INGEST_PARALLEL", "0") == "1":
+            ingestor = ParallelIngestor(
+                config=factory.config,
+                heavy_workers=env_int("INGEST_HEAVY_WORKERS"),
+                light_workers=env_int("INGEST_LIGHT_WORKERS"),
+                manifest=manifest,
             )
+            results = ingestor.run(file_paths)
+        else:
+            results = iter_sequential(factory, file_paths)
 
-            print(f"✔ Successfully created {len(chunks)} chunks.")
+        # Collapse mode writes nothing until every file has been seen, so its files
+        # only leave raw/ once finish() has been written
+        collapsing = deduplicator is not None and deduplicator.mode == "collapse"
+        deferred = []
 
-        except ValueError as e:
-            # Unsupported MIME / registry mismatch
-            print(f"✖ Skipping file (unsupported type): {e}")
+        for result in results:
+            file_path = result.file_path
+            filename = os.path.basename(file_path)
 
-            shutil.move(
-                file_path,
-                os.path.join(ERROR_DIR, filename)
-            )
+            # In parallel mode the file has already been parsed by a worker at this point
+            print(f"\nResult for: {file_path}")
 
-        except Exception as e:
-            # Any unexpected processing failure
-            print(f"✖ Error processing file: {e}")
+            # 1. Parse: the whole file is staged before anything reaches dedup or the sink, so a
+            #    file that fails halfway leaves no partial output. Worker results already arrive
+            #    as a compact ChunkBatch; streamed chunks are spooled (to disk once they get large).
+            staged = result.chunks
+            spool = None
+            try:
+                if not result.ok:
+                    raise result.error
 
+                if not isinstance(staged, ChunkBatch):
+                    spool = staged = ChunkSpool()
+                    spool.extend(result.chunks)
+
+            except ValueError as e:
+                # Unsupported MIME / registry mismatch
+                print(f"✖ Skipping file (unsupported type): {e}")
+                if spool is not None:
+                    spool.close()
+
+                shutil.move(
+                    file_path,
+                    os.path.join(ERROR_DIR, filename)
+                )
+                continue
+
+            except Exception as e:
+                # Any unexpected processing failure
+                print(f"✖ Error processing file: {e}")
+                if spool is not None:
+                    spool.close()
+
+                shutil.move(
+                    file_path,
+                    os.path.join(ERROR_DIR, filename)
+                )
+                continue
+
+            # 2. Commit: dedup, embedding and sink failures are not the file's fault. They
+            #    stop the run and the file stays in raw/ for the next one.
+            try:
+                chunks = staged
+                if deduplicator is not None:
+                    chunks = deduplicator.feed(chunks, source=filename)
+                if embedder is not None:
+                    chunks = embedder.iter_embed(chunks)
+
+                count = writer.extend(chunks)
+                writer.sync()
+            except Exception as e:
+                print(f"✖ Stopping: could not write chunks of {filename} ({e}); it stays in raw/.")
+                writer.abort()
+                raise
+            finally:
+                if spool is not None:
+                    spool.close()
+
+            total_chunks += count
+
+            if collapsing:
+                deferred.append(file_path)
+                print(f"✔ Staged {len(staged)} chunks for deduplication.")
+                continue
+
+            # Move to processed/
             shutil.move(
                 file_path,
-                os.path.join(ERROR_DIR, filename)
+                os.path.join(PROCESSED_DIR, filename)
             )
 
+            print(f"✔ Successfully created {count} chunks.")
+
+        # Collapse mode holds one chunk per duplicate group until every source is known
+        if deduplicator is not None:
+            try:
+                chunks = deduplicator.finish()
+                if embedder is not None:
+                    chunks = embedder.iter_embed(chunks)
+                total_chunks += writer.extend(chunks)
+                writer.sync()
+            except Exception as e:
+                print(f"✖ Stopping: could not write the deduplicated chunks ({e}); {len(deferred)} file(s) stay in raw/.")
+                writer.abort()
+                raise
+            print(f"Dedup removed {deduplicator.duplicates} of {deduplicator.seen} chunks.")
+
+            for file_path in deferred:
+                shutil.move(
+                    file_path,
+                    os.path.join(PROCESSED_DIR, os.path.basename(file_path))
+                )
+
+    # Write the last partial batch and close the sink
+    writer.close()
+
     print(
         f"\n--- Ingestion Complete. Total chunks ready for RAG: "
-        f"{len(all_rag_documents)} ---"
+        f"{total_chunks} ---"
     )
 
+    if registry is not None:
+        for stage, entry in sorted(registry.stage_summary().items()):
+            print(f"  {stage:<15} {entry['seconds']:8.2f}s over {entry['calls']} calls")
+        registry.write(METRICS_PATH)
+        print(f"Metrics written to {METRICS_PATH}")
+
     # At this point:
     # - raw/       -> empty or contains unprocessed files
     # - processed/ -> successfully ingested source files
     # - error/     -> files requiring investigation
-    # - all_rag_documents -> ready for vector DB ingestion
+    # - SINK_PATH  -> chunks ready for vector DB ingestion
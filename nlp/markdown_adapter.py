@@ -1,6 +1,6 @@
-from typing import List, Dict, Any
-from langchain_text_splitters import MarkdownHeaderTextSplitter, RecursiveCharacterTextSplitter
-from doc_adapter_abs import DocumentAdapter
+from typing import List, Dict, Any, Iterator
+from doc_adapter_abs import DocumentAdapter, Source, open_text
+from chunker import MARKDOWN_SEPARATORS, MarkdownSpanChunker, length_function
 from rag_config import RAGConfig
 
 
@@ -11,7 +11,8 @@ Unlike the PDF adapter, which has to guess the structure, the Markdown adapter c
 Key Features for RAG Ingestion:
 1. Header Metadata: If a chunk comes from a section titled ## Installation Instructions, that title is automatically added to the metadata of that chunk. During retrieval, the LLM knows exactly which section it is looking at.
 2. Table Preservation: Markdown tables are natively preserved as text. RAG systems in 2025 prefer this because modern LLMs (like GPT-4o or Claude 3.5) are excellent at parsing Markdown table syntax without specialized table-extraction logic.
-3. Recursive Splitting: If a single section (e.g., a "Terms of Service" section) is 5,000 words long, the RecursiveCharacterTextSplitter ensures it is broken down into 1,000-character chunks while respecting paragraph and sentence boundaries.
+3. Recursive Splitting: If a single section (e.g., a "Terms of Service" section) is 5,000 words long, it is broken down into 1,000-character (or chunk_unit="tokens") chunks while respecting paragraph and sentence boundaries.
+4. Single Pass: The MarkdownSpanChunker finds header sections and splits them in one scan, emitting offsets into the original text. Chunks are verbatim slices of the source (with start_index/end_index for citations) instead of text re-joined from stripped lines.
 """
 
 class MarkdownAdapter(DocumentAdapter):
@@ -19,6 +20,9 @@ class MarkdownAdapter(DocumentAdapter):
     Adapter specifically for native Markdown files. 
     Uses structural headers to maintain contextual integrity for RAG.
     """
+    # 2: single-pass span chunker (verbatim text, start_index/end_index)
+    version = "2"
+    config_fields = ("chunk_size", "chunk_overlap", "chunk_unit")
 
     def __init__(self, config: 'RAGConfig'):
 
@@ -31,9 +35,9 @@ class MarkdownAdapter(DocumentAdapter):
             ("###", "Header_3"),
         ]
 
-    def load(self, source: str) -> str:
-        """Reads the Markdown file directly as a string."""
-        with open(source, 'r', encoding='utf-8') as f:
+    def load(self, source: Source) -> str:
+        """Reads the Markdown file (or buffer) directly as a string."""
+        with open_text(source, 'utf-8') as f:
             return f.read()
 
     def process(self, raw_data: str) -> List[Dict[str, Any]]:
@@ -41,30 +45,28 @@ class MarkdownAdapter(DocumentAdapter):
         Processes Markdown by splitting on headers first to preserve context,
         then recursively splitting by character to fit token limits.
         """
-        # 1. Structural Splitting: Splits by headers and moves header text into metadata
-        md_splitter = MarkdownHeaderTextSplitter(
-            headers_to_split_on=self.headers_to_split_on,
-            strip_headers=False # Keep headers in the text for the LLM to see hierarchy
-        )
-        header_splits = md_splitter.split_text(raw_data)
+        return list(self.iter_process(raw_data))
 
-        # 2. Size-based Splitting: Ensures individual sections don't exceed the chunk size
-        text_splitter = RecursiveCharacterTextSplitter(
+    def iter_process(self, raw_data: str) -> Iterator[Dict[str, Any]]:
+        """Yields chunks section by section instead of building the full list."""
+        # 1. Structural + 2. Size-based Splitting in a single pass over the text:
+        # header sections become metadata, oversized sections are split recursively
+        chunker = MarkdownSpanChunker(
             chunk_size=self.config.chunk_size,
             chunk_overlap=self.config.chunk_overlap,
-            separators=["\n\n", "\n", " ", ""]
+            headers_to_split_on=self.headers_to_split_on,
+            separators=MARKDOWN_SEPARATORS,
+            length_function=length_function(self.config.chunk_unit),
         )
-        
-        final_docs = text_splitter.split_documents(header_splits)
-        
-        # 3. Format for Vector Database
-        return [
-            {
-                "text": doc.page_content, 
+
+        for start, end, headers in chunker.iter_spans(raw_data):
+            # 3. Format for Vector Database
+            yield {
+                "text": raw_data[start:end],
                 "metadata": {
-                    **doc.metadata,
-                    "format": "markdown"
+                    **headers,
+                    "format": "markdown",
+                    "start_index": start,
+                    "end_index": end,
                 }
-            } 
-            for doc in final_docs
-        ]
\ No newline at end of file
+            }
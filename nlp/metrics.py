@@ -0,0 +1,306 @@
+import json
+import math
+import threading
+import time
+from bisect import bisect_left
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+
+"""
+process_file is otherwise a black box: a slow run could be magic detection, hi_res layout, OCR preprocessing, splitting or the sink.
+This module gives the pipeline timing spans and counters, delivered to pluggable hooks.
+
+Key Features:
+1. Hook API: Anything implementing MetricsHook (increment + observe) can be registered with add_hook(), e.g. to forward to StatsD or OpenTelemetry.
+2. Built-in Registry: MetricsRegistry keeps counters and histograms per label set (mime_type, adapter, stage, ...) and exports them as Prometheus text or JSON.
+3. Negligible Overhead When Disabled: With no hooks registered, span() returns a shared no-op object and counters return immediately, so instrumented code pays one list check per call.
+
+Metrics emitted by the pipeline:
+- ingest_stage_seconds{stage=mime|construct|load|process|sink|ocr_preprocess, mime_type, adapter} (histogram)
+- ingest_files_total, ingest_bytes_total, ingest_chunks_total, ingest_failures_total {mime_type, adapter} (counters)
+- sink_chunks_total{sink} (counter)
+
+Hooks are per process. Pool workers (parallel and watch modes) record into an EventBuffer instead, and the parent replays each file's events into its own hooks.
+"""
+
+
+Labels = Dict[str, str]
+LabelKey = Tuple[Tuple[str, str], ...]
+# ("increment" | "observe", name, value, labels), as recorded by an EventBuffer
+Event = Tuple[str, str, float, Labels]
+
+# Seconds; wide enough for both cheap text splits and multi-minute hi_res PDFs
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300, math.inf)
+
+
+class MetricsHook:
+    """
+    Receives every metric event. Subclasses override what they need.
+    """
+    def increment(self, name: str, value: float, labels: Labels):
+        pass
+
+    def observe(self, name: str, value: float, labels: Labels):
+        pass
+
+
+# Registered hooks for this process; empty means metrics are disabled
+_hooks: List[MetricsHook] = []
+
+
+def add_hook(hook: MetricsHook) -> MetricsHook:
+    if hook not in _hooks:
+        _hooks.append(hook)
+    return hook
+
+
+def remove_hook(hook: MetricsHook):
+    if hook in _hooks:
+        _hooks.remove(hook)
+
+
+def enabled() -> bool:
+    return bool(_hooks)
+
+
+def count(name: str, value: float = 1, **labels: str):
+    """Increments a counter on every hook."""
+    if not _hooks:
+        return
+    for hook in _hooks:
+        hook.increment(name, value, labels)
+
+
+def observe(name: str, value: float, **labels: str):
+    """Records one histogram sample on every hook."""
+    if not _hooks:
+        return
+    for hook in _hooks:
+        hook.observe(name, value, labels)
+
+
+class EventBuffer(MetricsHook):
+    """
+    Records events so another process can replay them (see replay()).
+    """
+    def __init__(self):
+        self.events: List[Event] = []
+
+    def increment(self, name: str, value: float, labels: Labels):
+        self.events.append(("increment", name, value, dict(labels)))
+
+    def observe(self, name: str, value: float, labels: Labels):
+        self.events.append(("observe", name, value, dict(labels)))
+
+    def drain(self) -> List[Event]:
+        events, self.events = self.events, []
+        return events
+
+
+def replay(events: Iterable[Event]):
+    """Delivers events recorded elsewhere (e.g. in a worker process) to this process's hooks."""
+    if not _hooks:
+        return
+    for method, name, value, labels in events:
+        for hook in _hooks:
+            getattr(hook, method)(name, value, labels)
+
+
+class Span:
+    """Times a block and reports it as ingest_stage_seconds{stage, ...}."""
+
+    __slots__ = ("labels", "_start")
+
+    def __init__(self, stage: str, labels: Labels):
+        self.labels = {"stage": stage, **labels}
+        self._start = 0.0
+
+    def set(self, **labels: str):
+        """Adds labels only known inside the block (e.g. the detected MIME type)."""
+        self.labels.update(labels)
+
+    def __enter__(self) -> "Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self._start
+        for hook in _hooks:
+            hook.observe("ingest_stage_seconds", seconds, self.labels)
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def set(self, **labels: str):
+        pass
+
+    def __enter__(self) -> "_NullSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(stage: str, **labels: str):
+    """Context manager timing one pipeline stage (a shared no-op when disabled)."""
+    if not _hooks:
+        return _NULL_SPAN
+    return Span(stage, labels)
+
+
+def timed_iter(items: Iterable[Any], stage: str, counter: str = None, **labels: str) -> Iterable[Any]:
+    """
+    Wraps a lazy iterator (e.g. adapter.iter_process) and reports only the time spent
+    producing items, not the time the consumer spends on them. Optionally counts the items.
+    """
+    if not _hooks:
+        return items
+    return _timed_iter(items, stage, counter, labels)
+
+
+def _timed_iter(items: Iterable[Any], stage: str, counter: str, labels: Labels) -> Iterator[Any]:
+    iterator = iter(items)
+    seconds = 0.0
+    produced = 0
+    try:
+        while True:
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                seconds += time.perf_counter() - start
+                break
+            seconds += time.perf_counter() - start
+            produced += 1
+            yield item
+    finally:
+        observe("ingest_stage_seconds", seconds, stage=stage, **labels)
+        if counter:
+            count(counter, produced, **labels)
+
+
+# --------------------------------------------------
+# Registry + exporters
+# --------------------------------------------------
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def add(self, value: float):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _label_key(labels: Labels) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if bound == math.inf else repr(float(bound))
+
+
+class MetricsRegistry(MetricsHook):
+    """
+    In-memory counters and histograms, exportable as Prometheus text or JSON.
+    """
+    def __init__(self, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counters: Dict[str, Dict[LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[LabelKey, Histogram]] = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name: str, value: float, labels: Labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def observe(self, name: str, value: float, labels: Labels):
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram(self.buckets)
+            histogram.add(value)
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, h in sorted(series.items()):
+                    cumulative = 0
+                    for bound, bucket_count in zip(h.buckets, h.counts):
+                        cumulative += bucket_count
+                        lines.append(f"{name}_bucket{_format_labels(key, (('le', _format_bound(bound)),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {h.sum}")
+                    lines.append(f"{name}_count{_format_labels(key)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "counters": {
+                    name: [{"labels": dict(key), "value": value} for key, value in sorted(series.items())]
+                    for name, series in sorted(self.counters.items())
+                },
+                "histograms": {
+                    name: [
+                        {
+                            "labels": dict(key),
+                            "count": h.count,
+                            "sum": h.sum,
+                            "buckets": {_format_bound(b): c for b, c in zip(h.buckets, h.counts)},
+                        }
+                        for key, h in sorted(series.items())
+                    ]
+                    for name, series in sorted(self.histograms.items())
+                },
+            }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict(), indent=2)
+
+    def write(self, path: str):
+        """Writes Prometheus text, or JSON when the path ends in .json."""
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.to_json() if path.endswith(".json") else self.to_prometheus())
+
+    def stage_summary(self) -> Dict[str, Dict[str, float]]:
+        """Total seconds and calls per stage, across all labels."""
+        summary: Dict[str, Dict[str, float]] = {}
+        with self._lock:
+            for key, h in self.histograms.get("ingest_stage_seconds", {}).items():
+                stage = dict(key).get("stage", "")
+                entry = summary.setdefault(stage, {"seconds": 0.0, "calls": 0})
+                entry["seconds"] += h.sum
+                entry["calls"] += h.count
+        return summary
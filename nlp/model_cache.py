@@ -0,0 +1,53 @@
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+
+"""
+Layout and OCR models are by far the most expensive objects in the pipeline: docling's DocumentConverter and unstructured's hi_res layout model each take seconds (and hundreds of MB) to load.
+When a folder holds many small scans, loading the model for every file costs more than the OCR itself.
+
+The model cache keeps exactly one handle per model key for the lifetime of the process (i.e. once per worker process in a pool).
+Adapters fetch their handles through get_model(), so every adapter instance in the same process shares the same warm model.
+
+Lifecycle:
+1. Warm-up: IngestionFactory.warm_up() asks each adapter to load its handles ahead of the first file (ideal for pool initializers).
+2. Reuse: Subsequent calls to get_model() return the cached handle without touching disk.
+3. Release: release_model() drops a handle (or all of them) and runs its optional release hook so the library's own caches are cleared as well.
+"""
+
+# Process-wide registry: key -> (handle, release hook)
+_models: Dict[str, Any] = {}
+_release_hooks: Dict[str, Optional[Callable[[], None]]] = {}
+_lock = threading.Lock()
+
+
+def get_model(key: str, loader: Callable[[], Any], release: Callable[[], None] = None) -> Any:
+    """
+    Returns the cached handle for key, calling loader() the first time it is needed.
+    """
+    handle = _models.get(key)
+    if handle is not None:
+        return handle
+
+    with _lock:
+        # Re-check under the lock so concurrent threads load the model only once
+        if key not in _models:
+            _models[key] = loader()
+            _release_hooks[key] = release
+        return _models[key]
+
+
+def release_model(key: str = None):
+    """Drops one cached handle, or every handle when key is None."""
+    with _lock:
+        keys = [key] if key is not None else list(_models)
+        for k in keys:
+            _models.pop(k, None)
+            hook = _release_hooks.pop(k, None)
+            if hook is not None:
+                hook()
+
+
+def loaded_models() -> List[str]:
+    """Keys of the handles currently held by this process."""
+    return list(_models)
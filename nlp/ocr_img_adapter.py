@@ -1,11 +1,15 @@
 import cv2
-from PIL import Image
 import numpy as np
+import os
+from io import BytesIO
 from docling.document_converter import DocumentConverter
-from typing import List, Dict, Any
+from docling.datamodel.base_models import DocumentStream, InputFormat
+from typing import List, Dict, Any, Iterator
 from markdown_adapter import MarkdownAdapter
-from doc_adapter_abs import DocumentAdapter
+from doc_adapter_abs import BufferSource, DocumentAdapter, Source, source_name
 from rag_config import RAGConfig
+import metrics
+import model_cache
 
 
 
@@ -24,69 +28,127 @@ Recommended Libraries (2025)
 1. Docling: Excellent for speed and Markdown-ready OCR.
 2. Unstructured: Best for "high-res" layout partitioning when you need to know exactly where elements are on a page.
 3. EasyOCR: Best for "natural scene" images, like signs or labels, rather than just documents. 
+
+In-Memory Preprocessing:
+Binarization and deskewing run on NumPy arrays end to end: the scan is decoded once as 8-bit grayscale, thresholded in place, its skew angle is estimated on a downsampled copy (a 600-DPI page has tens of millions of pixels, but a 1000px thumbnail gives the same angle), and the result is PNG-encoded in memory and streamed to docling. Nothing is written next to the source file in raw/.
 """
 
+# Longest side of the thumbnail used for skew estimation
+SKEW_ESTIMATE_MAX_SIDE = 1000
+
 class OCRAdapter(DocumentAdapter):
     """
     Adapter for scanned files. It 'has-a' MarkdownAdapter 
     to handle the final processing stage.
     """
+    cpu_bound = True
+    cache_raw = True
+
+    # Chunking is the MarkdownAdapter's, so its config fields apply.
+    # 2: span chunker (chunks) and in-memory deskew preprocessing (OCR output)
+    version = "2"
+    parse_version = "2"
+    config_fields = MarkdownAdapter.config_fields
+
+    # Key of the process-wide docling converter in the model cache
+    CONVERTER_KEY = "docling.DocumentConverter"
+
     def __init__(self, config: 'RAGConfig'):
         # Pass config to the base class
         super().__init__(config)
-        self.converter = DocumentConverter()
         
         # Share the SAME config with the internal processor
         self.md_processor = MarkdownAdapter(config=self.config)
 
-    def binarize_image(self, image_path, output_path, threshold=180):
-        """Converts a color image to a high-contrast black and white image."""
-        img = Image.open(image_path).convert('L') # Convert to grayscale
-        img_np = np.array(img)
-        
-        # Apply a simple threshold: anything darker than 'threshold' becomes black (0), otherwise white (255)
-        img_np = (img_np > threshold) * 255
-        
-        # Save the processed image
-        Image.fromarray(img_np.astype(np.uint8)).save(output_path)
+    @property
+    def converter(self) -> DocumentConverter:
+        """The docling converter, built once per process and shared by all instances."""
+        return model_cache.get_model(self.CONVERTER_KEY, DocumentConverter)
 
-    def deskew_image(self, image_path, output_path):
-        """Detects and corrects the skew angle of an image using OpenCV."""
-        img = cv2.imread(image_path)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        gray = cv2.bitwise_not(gray) # Invert for finding contours correctly
+    def warm_up(self):
+        """Builds the docling converter (and its OCR models) ahead of the first scan."""
+        self.converter.initialize_pipeline(InputFormat.IMAGE)
 
-        # Detect contours to find the dominant text orientation
-        coords = np.column_stack(np.where(gray > 0))
+    def release(self):
+        """Drops the shared docling converter."""
+        model_cache.release_model(self.CONVERTER_KEY)
+
+    def read_grayscale(self, source: Source) -> np.ndarray:
+        """Decodes an image (path or buffer) straight to a single 8-bit grayscale channel."""
+        if isinstance(source, BufferSource):
+            # Decode from the caller's bytes/mapping in place: no temp file, no copy
+            img = cv2.imdecode(np.frombuffer(source.data, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        else:
+            img = cv2.imread(source, cv2.IMREAD_GRAYSCALE)
+        if img is None:
+            raise IOError(f"Could not decode image: {source_name(source)}")
+        return img
+
+    def binarize_array(self, gray: np.ndarray, threshold=180) -> np.ndarray:
+        """Converts a grayscale image to a high-contrast black and white image."""
+        # Anything darker than 'threshold' becomes black (0), otherwise white (255); stays uint8
+        _, binary = cv2.threshold(gray, threshold, 255, cv2.THRESH_BINARY)
+        return binary
+
+    def estimate_skew_angle(self, binary: np.ndarray) -> float:
+        """Estimates the dominant text orientation on a downsampled copy of the page."""
+        (h, w) = binary.shape[:2]
+        scale = min(1.0, SKEW_ESTIMATE_MAX_SIDE / max(h, w))
+        small = binary
+        if scale < 1.0:
+            small = cv2.resize(binary, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+        # Invert so text pixels are non-zero, then collect them as (row, col) points
+        points = cv2.findNonZero(cv2.bitwise_not(small))
+        if points is None:
+            return 0.0  # Blank page: nothing to align
+        coords = np.ascontiguousarray(points.reshape(-1, 2)[:, ::-1], dtype=np.float32)
         angle = cv2.minAreaRect(coords)[-1]
         
         # Correct the angle
         if angle < -45:
-            angle = -(90 + angle)
-        else:
-            angle = -angle
+            return -(90 + angle)
+        return -angle
 
-        # Rotate the image back to horizontal
-        (h, w) = img.shape[:2]
+    def deskew_array(self, binary: np.ndarray, angle: float) -> np.ndarray:
+        """Rotates the image back to horizontal."""
+        if abs(angle) < 0.01:
+            return binary  # Already straight: skip a full-resolution warp
+        (h, w) = binary.shape[:2]
         center = (w // 2, h // 2)
         M = cv2.getRotationMatrix2D(center, angle, 1.0)
-        rotated = cv2.warpAffine(gray, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+        return cv2.warpAffine(binary, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+    def preprocess(self, source: Source) -> np.ndarray:
+        """Binarization AND deskewing, array in, array out."""
+        binary = self.binarize_array(self.read_grayscale(source))
+        return self.deskew_array(binary, self.estimate_skew_angle(binary))
 
-        # Save the deskewed image (convert back to BGR for standard viewing)
-        cv2.imwrite(output_path, cv2.cvtColor(rotated, cv2.COLOR_GRAY2BGR))
+    def binarize_image(self, image_path, output_path, threshold=180):
+        """File-based wrapper around binarize_array, kept for debugging."""
+        cv2.imwrite(output_path, self.binarize_array(self.read_grayscale(image_path), threshold))
+
+    def deskew_image(self, image_path, output_path):
+        """File-based wrapper around estimate_skew_angle/deskew_array, kept for debugging."""
+        binary = self.read_grayscale(image_path)
+        cv2.imwrite(output_path, self.deskew_array(binary, self.estimate_skew_angle(binary)))
 
-    def load(self, source: str) -> str:
+    def load(self, source: Source) -> str:
         """
-        Applies binarization AND deskewing for high accuracy OCR.
+        Applies binarization AND deskewing for high accuracy OCR, entirely in memory.
         """
-        temp_binarized_path = source + ".binarized.png"
-        temp_deskewed_path = source + ".deskewed.png"
+        with metrics.span("ocr_preprocess", adapter=type(self).__name__):
+            clean = self.preprocess(source)
 
-        self.binarize_image(source, temp_binarized_path) # Use the previous function
-        self.deskew_image(temp_binarized_path, temp_deskewed_path) # Add this step
+        # Encode once in memory and hand docling the buffer instead of a temp file
+        ok, png = cv2.imencode(".png", clean)
+        if not ok:
+            raise IOError(f"Could not encode preprocessed image: {source_name(source)}")
+        name = os.path.splitext(os.path.basename(source_name(source)))[0] + ".png"
+        stream = DocumentStream(name=name, stream=BytesIO(png.tobytes()))
 
         # Convert the final, clean image
-        result = self.converter.convert(temp_deskewed_path)
+        result = self.converter.convert(stream)
         return result.document.export_to_markdown()
 
     def process(self, raw_data: str) -> List[Dict[str, Any]]:
@@ -94,11 +156,12 @@ class OCRAdapter(DocumentAdapter):
         Delegate the final processing to the MarkdownAdapter.
         This keeps your chunking logic consistent across all adapters.
         """
+        return list(self.iter_process(raw_data))
+
+    def iter_process(self, raw_data: str) -> Iterator[Dict[str, Any]]:
+        """Streams the MarkdownAdapter's chunks, tagged as scanned content."""
         # Call the MarkdownAdapter's process method on the OCR output
-        chunks = self.md_processor.process(raw_data)
-        
-        # Optionally tag these chunks so you know they came from an image
-        for chunk in chunks:
+        for chunk in self.md_processor.iter_process(raw_data):
+            # Optionally tag these chunks so you know they came from an image
             chunk["metadata"]["source_type"] = "scanned_image"
-            
-        return chunks
+            yield chunk
@@ -0,0 +1,178 @@
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+from chunk_batch import ChunkBatch
+from ingestion_factory import IngestionFactory
+from ingestion_manifest import IngestionManifest
+from rag_config import RAGConfig, pool_worker_config
+import metrics
+
+
+"""
+Processing a folder one file at a time means a single slow hi_res PDF or OCR scan holds up hundreds of cheap .txt/.md files queued behind it.
+The ParallelIngestor fans files out to two independent process pools, chosen by the adapter's cpu_bound hint:
+- a "heavy" pool for layout/vision adapters (GenericPDFAdapter, OCRAdapter)
+- a "light" pool for cheap splitters (TextAdapter, MarkdownAdapter)
+
+Key Design Points:
+1. Separate Concurrency Limits: Heavy adapters load large models and saturate a core each, so their pool is kept small; cheap adapters can use many more workers without starving the heavy ones.
+2. Stable Output Order: Results are yielded in the same order the files were submitted, regardless of which pool finishes first, so downstream chunk order is reproducible.
+3. Bounded Memory: At most max_in_flight files are submitted ahead of the result being consumed, so finished chunk lists don't pile up for huge folders.
+4. Warm Workers: Each pool's initializer warms only the adapters routed to it, so layout/OCR models load once per heavy worker instead of once per file.
+5. Parent-Side Bookkeeping: Workers only parse; the caller moves files into processed/ or error/ once each result arrives, so a crashed worker never leaves a half-moved file.
+6. Compact Results: Workers return a ChunkBatch rather than a list of dicts; it unpickles as a few buffers, and the results held in flight take a fraction of the memory.
+7. Worker Metrics: When metrics are enabled in the parent, workers buffer each file's metric events and ship them back with the result (or the error); collect_result() replays them into the parent's hooks.
+"""
+
+
+# One factory per worker process, created by the pool initializer
+_worker_factory: Optional[IngestionFactory] = None
+# Metric events of the file being ingested, when the parent collects metrics
+_worker_events: Optional[metrics.EventBuffer] = None
+
+
+def init_worker(
+    config: RAGConfig,
+    manifest: Optional[IngestionManifest],
+    warm_mime_types: List[str],
+    collect_metrics: bool = False,
+):
+    """Pool initializer: builds the per-process factory and warms its models once."""
+    global _worker_factory, _worker_events
+    _worker_factory = IngestionFactory(config, manifest=manifest)
+    if collect_metrics:
+        _worker_events = metrics.add_hook(metrics.EventBuffer())
+    try:
+        _worker_factory.warm_up(warm_mime_types)
+    except Exception as e:
+        # A failed warm-up must not break the pool; models load lazily instead
+        print(f"Worker warm-up failed, loading models lazily: {e}")
+
+
+def ingest_file(file_path: str) -> Tuple[ChunkBatch, List[metrics.Event]]:
+    """
+    Runs inside a worker process (pools initialized with init_worker). Returns the
+    chunks and the file's metric events; use collect_result() on the future.
+    """
+    try:
+        batch = _worker_factory.process_file(file_path, as_batch=True)
+    except Exception as e:
+        # Exceptions pickle with their __dict__, so the events reach the parent too
+        e.metric_events = _drain_events()
+        raise
+    return batch, _drain_events()
+
+
+def _drain_events() -> List[metrics.Event]:
+    return _worker_events.drain() if _worker_events is not None else []
+
+
+def collect_result(future: Future) -> ChunkBatch:
+    """future.result() for an ingest_file() future, replaying the worker's metric events here."""
+    try:
+        batch, events = future.result()
+    except Exception as e:
+        metrics.replay(getattr(e, "metric_events", ()))
+        raise
+    metrics.replay(events)
+    return batch
+
+
+@dataclass
+class IngestionResult:
+    """
+    Outcome of ingesting a single file.
+    chunks may be a lazy iterator (sequential mode), in which case processing
+    errors surface while it is being consumed rather than in error.
+    """
+    file_path: str
+    chunks: Iterable[Dict[str, Any]]
+    error: Optional[BaseException] = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def iter_sequential(factory: IngestionFactory, file_paths: Iterable[str]) -> Iterator[IngestionResult]:
+    """
+    Ingests files one at a time in the current process. Chunks are streamed
+    straight from the adapter, so even a huge file is never held in memory.
+    """
+    for file_path in file_paths:
+        yield IngestionResult(file_path, factory.iter_file(file_path))
+
+
+class ParallelIngestor:
+    """
+    Ingests files concurrently using a heavy and a light process pool.
+    """
+    def __init__(
+        self,
+        config: RAGConfig = None,
+        heavy_workers: int = None,
+        light_workers: int = None,
+        max_in_flight: int = None,
+        warm_up: bool = True,
+        manifest: IngestionManifest = None,
+    ):
+        self.config = config or RAGConfig()
+        cpus = os.cpu_count() or 1
+
+        # Heavy adapters get roughly half the cores; light ones get the rest
+        self.heavy_workers = heavy_workers or max(1, cpus // 2)
+        self.light_workers = light_workers or max(1, cpus - self.heavy_workers)
+        self.max_in_flight = max_in_flight or 8 * (self.heavy_workers + self.light_workers)
+
+        self.warm_up = warm_up
+        self.manifest = manifest
+
+        # Parent-side factory, used only for MIME detection and routing
+        self.factory = IngestionFactory(self.config)
+
+    def run(self, file_paths: Iterable[str]) -> Iterator[IngestionResult]:
+        """
+        Submits every file to the pool matching its adapter and yields
+        results in submission order.
+        """
+        def pool_args(cpu_bound: bool, workers: int) -> dict:
+            warm = self.factory.registered_mime_types(cpu_bound) if self.warm_up else []
+            config = pool_worker_config(self.config, workers)
+            initargs = (config, self.manifest, warm, metrics.enabled())
+            return dict(max_workers=workers, initializer=init_worker, initargs=initargs)
+
+        with ProcessPoolExecutor(**pool_args(True, self.heavy_workers)) as heavy_pool, \
+             ProcessPoolExecutor(**pool_args(False, self.light_workers)) as light_pool:
+
+            pending: Deque[Tuple[str, Any]] = deque()
+
+            for file_path in file_paths:
+                try:
+                    # 1. Route by the registry's hint without importing the adapter
+                    cpu_bound = self.factory.is_cpu_bound(
+                        self.factory.detect_mime_type(file_path)
+                    )
+                    pool = heavy_pool if cpu_bound else light_pool
+                    pending.append((file_path, pool.submit(ingest_file, file_path)))
+                except Exception as e:
+                    # Unsupported types fail fast but still keep their position
+                    pending.append((file_path, e))
+
+                # 2. Backpressure: drain the oldest result before submitting more
+                while len(pending) >= self.max_in_flight:
+                    yield self._collect(*pending.popleft())
+
+            while pending:
+                yield self._collect(*pending.popleft())
+
+    @staticmethod
+    def _collect(file_path: str, outcome: Any) -> IngestionResult:
+        """Waits for a submitted file and wraps its outcome."""
+        if isinstance(outcome, BaseException):
+            return IngestionResult(file_path, [], outcome)
+        try:
+            return IngestionResult(file_path, collect_result(outcome))
+        except Exception as e:
+            return IngestionResult(file_path, [], e)
@@ -1,6 +1,16 @@
 from unstructured.partition.pdf import partition_pdf
-from typing import List, Dict, Any
-from doc_adapter_abs import DocumentAdapter
+from unstructured.chunking.title import chunk_by_title
+from unstructured.staging.base import elements_from_dicts, elements_to_dicts
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from io import BytesIO
+import json
+import os
+import tempfile
+from doc_adapter_abs import BufferSource, DocumentAdapter, Source, map_file, open_binary, source_name
+import model_cache
+from rag_config import DEFAULT_PDF_SHARD_WORKERS
 
 """
 A truly "generic" and robust PDFAdapter doesn't just treat the file as a text stream; it uses Document Layout Analysis (DLA) to identify objects like titles, narrative text, tables, and images. 
@@ -13,33 +23,306 @@ Why this is "Generic":
 2. Object Identification: It distinguishes between a Title (high-importance for search) and NarrativeText.
 3. Table Precision: Instead of converting a table into a garbled string, it can provide the LLM with an HTML representation, which is significantly better for RAG reasoning.
 4. Strategy Flexibility: We can swap the strategy to fast for simple text-heavy PDFs or ocr_only for scanned images within the same adapter. 
+
+Automatic Strategy Routing (RAGConfig.pdf_strategy = "auto"):
+Most born-digital PDFs have a perfect text layer, and running hi_res on them is pure overhead. In "auto" mode each page is profiled cheaply with pdfminer (no layout analysis, no rendering):
+- text coverage: number of non-whitespace characters in the text layer
+- image coverage: fraction of the page area covered by embedded images
+- table hints: number of ruling lines/rectangles drawn on the page
+Pages that look scanned (little text, mostly image) or tabular go through hi_res; every other page uses the fast text-layer extractor.
+Consecutive pages with the same route are partitioned together (as an in-memory sub-PDF) and merged back in page order, with starting_page_number keeping page_number metadata correct.
+
+Page-Range Sharding (RAGConfig.pdf_shard_pages / pdf_shard_workers):
+A 600-page report partitioned as one call runs on one core and sets the completion time of the whole batch. Documents longer than pdf_shard_pages are cut into page-range shards that are partitioned concurrently in a process pool (kept alive per process, like the layout model) and concatenated back in document order.
+Sharding is safe for by_title chunking because chunking happens in process(), after the shards are merged: a section that starts on the last page of one shard and continues into the next is still grouped under its title.
 """
 
+# Routing thresholds for pdf_strategy="auto"
+MIN_TEXT_CHARS = 100        # Below this, a page has no usable text layer
+SCANNED_IMAGE_RATIO = 0.5   # Above this image coverage, a text-poor page is a scan
+TABLE_RULING_LINES = 8      # At least this many lines/rects suggests a ruled table
+
+
+@dataclass
+class PageProfile:
+    """Cheap per-page statistics used to choose a partition strategy."""
+    page_number: int
+    text_chars: int
+    image_ratio: float
+    ruling_lines: int
+
+
+def profile_pages(source: Source) -> List[PageProfile]:
+    """Profiles every page from the PDF's object tree, without layout analysis."""
+    from pdfminer.converter import PDFPageAggregator
+    from pdfminer.layout import LTChar, LTImage, LTLine, LTRect
+    from pdfminer.pdfinterp import PDFPageInterpreter, PDFResourceManager
+    from pdfminer.pdfpage import PDFPage
+
+    def walk(obj) -> Iterator[Any]:
+        yield obj
+        if hasattr(obj, "__iter__") and not isinstance(obj, LTChar):
+            for child in obj:
+                yield from walk(child)
+
+    profiles = []
+    with open_binary(source) as f:
+        manager = PDFResourceManager()
+        device = PDFPageAggregator(manager, laparams=None)
+        interpreter = PDFPageInterpreter(manager, device)
+
+        for page_number, page in enumerate(PDFPage.get_pages(f), start=1):
+            interpreter.process_page(page)
+            layout = device.get_result()
+            page_area = max(layout.width * layout.height, 1.0)
+
+            text_chars, image_area, ruling_lines = 0, 0.0, 0
+            for obj in walk(layout):
+                if isinstance(obj, LTChar):
+                    text_chars += not obj.get_text().isspace()
+                elif isinstance(obj, LTImage):
+                    image_area += obj.width * obj.height
+                elif isinstance(obj, (LTLine, LTRect)):
+                    ruling_lines += 1
+
+            profiles.append(
+                PageProfile(page_number, text_chars, min(image_area / page_area, 1.0), ruling_lines)
+            )
+    return profiles
+
+
+def route_page(profile: PageProfile) -> str:
+    """Chooses 'hi_res' for scanned or tabular pages and 'fast' for everything else."""
+    scanned = profile.text_chars < MIN_TEXT_CHARS and profile.image_ratio >= SCANNED_IMAGE_RATIO
+    tabular = profile.ruling_lines >= TABLE_RULING_LINES
+    return "hi_res" if scanned or tabular else "fast"
+
+
+def strategy_runs(strategies: List[str]) -> List[Tuple[str, int, int]]:
+    """Groups per-page strategies into (strategy, first_page, last_page) runs, 1-based."""
+    runs = []
+    for page_number, strategy in enumerate(strategies, start=1):
+        if runs and runs[-1][0] == strategy:
+            runs[-1] = (strategy, runs[-1][1], page_number)
+        else:
+            runs.append((strategy, page_number, page_number))
+    return runs
+
+
+def split_runs(runs: List[Tuple[str, int, int]], max_pages: int) -> List[Tuple[str, int, int]]:
+    """Cuts every run into shards of at most max_pages pages, preserving order."""
+    shards = []
+    for strategy, first_page, last_page in runs:
+        for start in range(first_page, last_page + 1, max_pages):
+            shards.append((strategy, start, min(start + max_pages - 1, last_page)))
+    return shards
+
+
+def count_pages(source: Source) -> int:
+    from pypdf import PdfReader
+
+    with open_binary(source) as f:
+        return len(PdfReader(f).pages)
+
+
+def extract_page_range(source: Source, first_page: int, last_page: int) -> BytesIO:
+    """Copies pages [first_page, last_page] (1-based) into an in-memory PDF."""
+    from pypdf import PdfReader, PdfWriter
+
+    with open_binary(source) as f:
+        reader = PdfReader(f)
+        writer = PdfWriter()
+        for index in range(first_page - 1, last_page):
+            writer.add_page(reader.pages[index])
+
+        buffer = BytesIO()
+        writer.write(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+# Key of the process-wide hi_res layout model in the model cache
+LAYOUT_MODEL_KEY = "unstructured.hi_res_layout"
+
+
+def load_layout_model():
+    """
+    The hi_res layout detection model, loaded once per process through the model cache.
+    partition_pdf reuses it through unstructured_inference's own model registry, and
+    releasing the cache entry clears that registry too.
+    """
+    from unstructured_inference.models import base as inference_models
+
+    return model_cache.get_model(
+        LAYOUT_MODEL_KEY,
+        inference_models.get_model,
+        release=inference_models.models.clear,
+    )
+
+
+def partition_page_range(source: Source, strategy: str, first_page: int = None, last_page: int = None) -> List[Any]:
+    """
+    Partitions the whole PDF, or only pages [first_page, last_page] (1-based)
+    with page_number metadata still counted from the start of the document.
+    """
+    kwargs = dict(strategy=strategy)
+    if strategy == "hi_res":
+        kwargs["infer_table_structure"] = True  # Preserves table rows/cols as HTML
+        # Registered with the model cache even when warm_up() never ran, so release() frees it
+        load_layout_model()
+
+    if first_page is None:
+        if isinstance(source, BufferSource):
+            with open_binary(source) as f:
+                return partition_pdf(file=f, metadata_filename=source.name, **kwargs)
+        return partition_pdf(filename=source, **kwargs)
+
+    return partition_pdf(
+        file=extract_page_range(source, first_page, last_page),
+        metadata_filename=source_name(source),  # Keeps file_name metadata pointing at the original
+        starting_page_number=first_page,
+        **kwargs,
+    )
+
+
+def _partition_shard(path: str, name: str, strategy: str, first_page: int, last_page: int) -> List[Dict[str, Any]]:
+    """Shard worker: returns element dicts, which cross process boundaries reliably."""
+    with map_file(path) as source:
+        source.name = name  # file_name metadata names the original, not a spilled copy
+        return elements_to_dicts(partition_page_range(source, strategy, first_page, last_page))
+
+
+# Process-wide shard pool, created on first use and kept warm between documents
+_shard_pool: Optional[ProcessPoolExecutor] = None
+_shard_pool_workers = 0
+
+
+def get_shard_pool(workers: int) -> ProcessPoolExecutor:
+    global _shard_pool, _shard_pool_workers
+    if _shard_pool is None or _shard_pool_workers != workers:
+        shutdown_shard_pool()
+        _shard_pool = ProcessPoolExecutor(max_workers=workers)
+        _shard_pool_workers = workers
+    return _shard_pool
+
+
+def shutdown_shard_pool():
+    global _shard_pool, _shard_pool_workers
+    if _shard_pool is not None:
+        _shard_pool.shutdown()
+        _shard_pool, _shard_pool_workers = None, 0
+
 class GenericPDFAdapter(DocumentAdapter):
     """
     A layout-aware adapter that identifies objects (Tables, Titles, Text) 
     using Computer Vision (Unstructured) for generic PDF processing.
     """
+    cpu_bound = True
+    cache_raw = True
+    load_fields = ("pdf_strategy",)
+    # The elements (and so the chunks) depend on the strategy, not just on the chunk sizes
+    config_fields = ("chunk_size", "chunk_overlap", "pdf_strategy")
+
+    def warm_up(self):
+        """Loads the hi_res layout detection model ahead of the first file."""
+        load_layout_model()
+
+    def release(self):
+        """Drops the layout model, including unstructured_inference's reference to it, and the shard pool."""
+        model_cache.release_model(LAYOUT_MODEL_KEY)
+        shutdown_shard_pool()
 
-    def load(self, source: str) -> List[Any]:
+    def load(self, source: Source) -> List[Any]:
         """
         Partitions the PDF into structural elements.
         - 'hi_res' strategy uses layout detection models.
         - 'infer_table_structure' extracts tables as HTML for LLMs.
+        - pdf_strategy="auto" routes each page to 'hi_res' or 'fast' (see route_page).
+        - Documents longer than pdf_shard_pages are partitioned as parallel page-range shards.
+        Chunking is deferred to process() so the elements can be re-chunked under
+        any RAGConfig without running layout detection again.
         """
-        return partition_pdf(
-            filename=source,
-            strategy="hi_res",          # Uses vision models to find objects
-            infer_table_structure=True, # Preserves table rows/cols as HTML
-            chunking_strategy="by_title", # Automatically groups text under its heading
-            max_characters=self.config.chunk_size, 
-            overlap=self.config.chunk_overlap
-        )
+        strategy = self.config.pdf_strategy
+        workers = self.shard_workers()
+
+        # 1. Plan page runs: routed page by page, or one run for the whole document
+        if strategy == "auto":
+            runs = strategy_runs([route_page(profile) for profile in profile_pages(source)])
+        elif workers > 1:
+            runs = [(strategy, 1, count_pages(source))]
+        else:
+            return partition_page_range(source, strategy)
+
+        if not runs:
+            return partition_page_range(source, "fast" if strategy == "auto" else strategy)
+
+        # 2. Large documents are cut into shards for the worker pool
+        shards = split_runs(runs, self.config.pdf_shard_pages) if workers > 1 else runs
+
+        # A single route covers the whole document: no need to split it
+        if len(shards) == 1:
+            return partition_page_range(source, shards[0][0])
+
+        if workers > 1:
+            return self.partition_shards(source, shards, workers)
+
+        elements = []
+        for run_strategy, first_page, last_page in shards:
+            elements.extend(partition_page_range(source, run_strategy, first_page, last_page))
+        return elements
+
+    def shard_workers(self) -> int:
+        """Worker processes for page-range sharding (1 means disabled)."""
+        if self.config.pdf_shard_pages <= 0:
+            return 1
+        return self.config.pdf_shard_workers or min(DEFAULT_PDF_SHARD_WORKERS, os.cpu_count() or 1)
+
+    def partition_shards(self, source: Source, shards: List[Tuple[str, int, int]], workers: int) -> List[Any]:
+        """Partitions shards concurrently and merges the elements in document order."""
+        # Mappings can't cross process boundaries: workers re-open the backing file.
+        # A buffer without one is spilled to a temporary file once, rather than
+        # pickling a copy of the whole PDF into every shard task.
+        name, path, spilled = source_name(source), source, None
+        if isinstance(source, BufferSource):
+            path = source.path
+            if path is None:
+                with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as spilled:
+                    spilled.write(source.data)
+                path = spilled.name
+
+        try:
+            pool = get_shard_pool(workers)
+            futures = [
+                pool.submit(_partition_shard, path, name, strategy, first_page, last_page)
+                for strategy, first_page, last_page in shards
+            ]
+
+            elements = []
+            for future in futures:  # Submission order == page order
+                elements.extend(elements_from_dicts(future.result()))
+            return elements
+        finally:
+            if spilled is not None:
+                os.remove(spilled.name)
+
+    def dump_raw(self, elements: List[Any]) -> bytes:
+        """Serializes elements (including table HTML and page numbers) as JSON."""
+        return json.dumps(elements_to_dicts(elements)).encode("utf-8")
+
+    def restore_raw(self, data: bytes) -> List[Any]:
+        return elements_from_dicts(json.loads(data))
 
     def process(self, elements: List[Any]) -> List[Dict[str, Any]]:
         """
         Iterates through identified objects and handles them based on type.
         """
+        # Automatically groups text under its heading (same as partition_pdf's chunking_strategy="by_title")
+        elements = chunk_by_title(
+            elements,
+            max_characters=self.config.chunk_size,
+            overlap=self.config.chunk_overlap,
+        )
+
         processed_chunks = []
         
         for el in elements:
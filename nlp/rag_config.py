@@ -1,10 +1,48 @@
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
+from typing import Optional
+import os
 
-@dataclass
+# Shard processes per PDF when pdf_shard_workers is 0: each one loads its own layout model
+DEFAULT_PDF_SHARD_WORKERS = 4
+
+
+@dataclass(frozen=True)
 class RAGConfig:
-    """Centralized configuration for the ingestion pipeline."""
+    """
+    Centralized configuration for the ingestion pipeline.
+    Frozen (and therefore hashable) so it can key caches of warm adapters.
+    """
     chunk_size: int = 1000
     chunk_overlap: int = 100
+    # Unit of chunk_size/chunk_overlap: "chars", or "tokens" (local tokenizer)
+    chunk_unit: str = "chars"
     # Add 2025-specific settings here
     ocr_enabled: bool = True
     embedding_model: str = "text-embedding-3-small"
+    # Embedding stage: "local-*" models use the offline HashingEmbedder (256
+    # dimensions unless set). Setting it for OpenAI's text-embedding-3 models
+    # opts in to shortened vectors; None keeps their native size.
+    embedding_dimensions: Optional[int] = None
+    embedding_batch_tokens: int = 8000
+    embedding_concurrency: int = 4
+    # PDF partition strategy: "hi_res", "fast", or "auto" (route page by page)
+    pdf_strategy: str = "hi_res"
+    # PDFs longer than this many pages are partitioned as concurrent page-range
+    # shards (0 disables); pdf_shard_workers=0 means min(DEFAULT_PDF_SHARD_WORKERS, CPU cores)
+    pdf_shard_pages: int = 50
+    pdf_shard_workers: int = 0
+    # Text files at least this large are memory-mapped and chunked as a stream
+    text_stream_threshold: int = 64 * 1024 * 1024
+
+
+def pool_worker_config(config: RAGConfig, pool_size: int) -> RAGConfig:
+    """
+    Config for a worker of a pool_size-process pool. The pool already runs files in
+    parallel, so PDF page sharding only gets the cores the pool leaves free; without
+    at least two spare cores per worker it is disabled rather than oversubscribing.
+    """
+    spare = (os.cpu_count() or 1) // max(1, pool_size) - 1
+    if spare < 2:
+        return replace(config, pdf_shard_pages=0)
+    workers = config.pdf_shard_workers or DEFAULT_PDF_SHARD_WORKERS
+    return replace(config, pdf_shard_workers=min(workers, spare))
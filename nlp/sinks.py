@@ -0,0 +1,344 @@
+import json
+import os
+import pickle
+import queue
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from array import array
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+import metrics
+
+
+"""
+Collecting every chunk of every file into one list means peak memory grows with the size of the corpus.
+Sinks turn the end of the pipeline into a stream: chunks are grouped into bounded batches and handed to a sink as soon as each batch is full.
+
+Available Sinks:
+1. JSONLSink: One JSON object per line; the simplest durable hand-off to any downstream loader.
+2. ParquetSink: Columnar output via pyarrow (optional dependency), one row group per batch; metadata is stored as a JSON string column because every adapter emits different keys.
+   Parquet files cannot be appended to, so the path is a dataset directory and each run writes its own part file (pyarrow.parquet.read_table(path) reads them all).
+3. LocalStoreSink: A SQLite table that stands in for a vector database during local runs and tests.
+4. VectorStoreSink: Appends embedded chunks to a LocalVectorStore directory for local retrieval.
+Chunks that went through the EmbeddingStage carry an "embedding" vector, which the Parquet and SQLite sinks store as float32 (list column / blob).
+
+Backpressure:
+The BatchWriter hands batches to a background writer thread through a bounded queue. When the sink is slower than the adapters (e.g. a remote vector DB), the queue fills up and the producer blocks, so at most (max_pending_batches + 1) * batch_size chunks are ever buffered.
+
+Staging:
+A file must not leave partial output behind when its adapter fails halfway. ChunkSpool stages one file's chunks before they reach the writer: in memory up to
+max_memory bytes, then in an anonymous temporary file, so even a multi-GB text file is streamed rather than held in RAM.
+"""
+
+
+Chunk = Dict[str, Any]
+
+
+class ChunkSink(ABC):
+    """
+    Destination for RAG-ready chunks, fed in batches.
+    """
+
+    @abstractmethod
+    def write_batch(self, batch: List[Chunk]):
+        """Persist one batch of chunks."""
+        pass
+
+    def close(self):
+        """Flush and release any resources."""
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class JSONLSink(ChunkSink):
+    """Appends chunks to a JSON Lines file."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+
+    def write_batch(self, batch: List[Chunk]):
+        self._file.writelines(
+            json.dumps(dict(chunk), ensure_ascii=False, default=str) + "\n" for chunk in batch
+        )
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink(ChunkSink):
+    """Writes chunks to a new part file in a Parquet dataset directory, one row group per batch."""
+
+    def __init__(self, path: str):
+        # Optional dependency: only needed when Parquet output is requested
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if os.path.isfile(path):
+            raise FileExistsError(
+                f"{path} is a Parquet file from an older run; move it into a directory of that name "
+                "(the sink now writes one part file per run there)"
+            )
+        os.makedirs(path, exist_ok=True)
+
+        self._pa = pa
+        self.path = os.path.join(path, f"part-{time.strftime('%Y%m%dT%H%M%S')}-{uuid.uuid4().hex[:8]}.parquet")
+        self.schema = pa.schema([
+            ("text", pa.string()),
+            ("metadata", pa.string()),
+            ("embedding", pa.list_(pa.float32())),
+        ])
+        self._writer = pq.ParquetWriter(self.path, self.schema)
+
+    def write_batch(self, batch: List[Chunk]):
+        table = self._pa.table(
+            {
+                "text": [chunk["text"] for chunk in batch],
+                "metadata": [json.dumps(chunk["metadata"], default=str) for chunk in batch],
+                "embedding": [chunk.get("embedding") for chunk in batch],
+            },
+            schema=self.schema,
+        )
+        self._writer.write_table(table)
+
+    def close(self):
+        self._writer.close()
+
+
+class LocalStoreSink(ChunkSink):
+    """
+    Stores chunks in a local SQLite table, standing in for a vector database.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, text TEXT NOT NULL, metadata TEXT NOT NULL, "
+            "embedding BLOB)"
+        )
+        # Tables created before the embedding stage existed lack the column
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "embedding" not in columns:
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN embedding BLOB")
+            self._conn.commit()
+
+    def write_batch(self, batch: List[Chunk]):
+        self._conn.executemany(
+            "INSERT INTO chunks (text, metadata, embedding) VALUES (?, ?, ?)",
+            [
+                (
+                    chunk["text"],
+                    json.dumps(chunk["metadata"], default=str),
+                    array("f", chunk["embedding"]).tobytes() if chunk.get("embedding") else None,
+                )
+                for chunk in batch
+            ],
+        )
+        self._conn.commit()
+
+    def count(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def close(self):
+        self._conn.close()
+
+
+class VectorStoreSink(ChunkSink):
+    """
+    Appends embedded chunks to a LocalVectorStore directory.
+    """
+
+    def __init__(self, path: str):
+        # Imported lazily so the other sinks don't require numpy
+        from vector_store import LocalVectorStore
+
+        self.store = LocalVectorStore(path)
+
+    def write_batch(self, batch: List[Chunk]):
+        if any(chunk.get("embedding") is None for chunk in batch):
+            raise ValueError("VectorStoreSink needs embedded chunks (enable the embedding stage)")
+        self.store.add(batch)
+
+
+SINKS = {
+    "jsonl": JSONLSink,
+    "parquet": ParquetSink,
+    "sqlite": LocalStoreSink,
+    "vectors": VectorStoreSink,
+}
+
+
+def make_sink(kind: str, path: str) -> ChunkSink:
+    """Builds a sink by name ('jsonl', 'parquet', 'sqlite' or 'vectors')."""
+    sink_class = SINKS.get(kind)
+    if sink_class is None:
+        raise ValueError(f"Unknown sink type: {kind}")
+    return sink_class(path)
+
+
+class ChunkSpool:
+    """
+    Stages a stream of chunks (in memory, spilling to a temporary file) so it can be
+    replayed once it is known to be complete.
+    """
+    def __init__(self, max_memory: int = 8 * 1024 * 1024, block_size: int = 256):
+        self.block_size = block_size
+        self.count = 0
+        self._file = tempfile.SpooledTemporaryFile(max_size=max_memory)
+
+    def extend(self, chunks: Iterable[Chunk]) -> int:
+        """Stages every chunk (a plain dict copy of it) and returns how many."""
+        block: List[Chunk] = []
+        for chunk in chunks:
+            block.append(dict(chunk))
+            if len(block) >= self.block_size:
+                self._dump(block)
+                block = []
+        if block:
+            self._dump(block)
+        return self.count
+
+    def _dump(self, block: List[Chunk]):
+        pickle.dump(block, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.count += len(block)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __iter__(self) -> Iterator[Chunk]:
+        self._file.seek(0)
+        while True:
+            try:
+                block = pickle.load(self._file)
+            except EOFError:
+                return
+            yield from block
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self) -> "ChunkSpool":
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# Queue marker telling the writer thread to stop
+_DONE = object()
+
+
+class BatchWriter:
+    """
+    Groups chunks into batches and writes them to a sink from a background thread.
+    Producers block when max_pending_batches batches are already waiting.
+    """
+    def __init__(self, sink: ChunkSink, batch_size: int = 256, max_pending_batches: int = 4):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.written = 0
+
+        self._batch: List[Chunk] = []
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=max_pending_batches)
+        self._error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._drain, name="chunk-sink-writer", daemon=True)
+        self._thread.start()
+
+    def add(self, chunk: Chunk):
+        self._batch.append(chunk)
+        if len(self._batch) >= self.batch_size:
+            self._submit()
+
+    def extend(self, chunks: Iterable[Chunk]) -> int:
+        """Adds every chunk from an iterable (e.g. a generator) and returns how many."""
+        count = 0
+        for chunk in chunks:
+            self.add(chunk)
+            count += 1
+        return count
+
+    def flush(self):
+        """Hands the current partial batch to the writer thread."""
+        if self._batch:
+            self._submit()
+
+    def sync(self):
+        """Flushes and waits until every batch so far is written; raises the sink's error if one failed."""
+        self.flush()
+        self._queue.join()
+        self._raise_if_failed()
+
+    def abort(self):
+        """Stops after a failure: drops the partial batch and closes the sink without raising."""
+        self._batch = []
+        try:
+            self._queue.put(_DONE)
+            self._thread.join()
+        finally:
+            self.sink.close()
+
+    def close(self):
+        """Writes everything still buffered, stops the thread and closes the sink."""
+        try:
+            self.flush()
+            self._queue.put(_DONE)
+            self._thread.join()
+            self._raise_if_failed()
+        finally:
+            self.sink.close()
+
+    def _submit(self):
+        self._raise_if_failed()
+        batch, self._batch = self._batch, []
+        # Blocks while the queue is full: this is the backpressure point
+        self._queue.put(batch)
+
+    def _drain(self):
+        while True:
+            batch = self._queue.get()
+            try:
+                if batch is _DONE:
+                    return
+                if self._error is not None:
+                    continue  # Keep consuming so producers never deadlock
+                with metrics.span("sink", sink=type(self.sink).__name__):
+                    self.sink.write_batch(batch)
+                self.written += len(batch)
+                metrics.count("sink_chunks_total", len(batch), sink=type(self.sink).__name__)
+            except BaseException as e:
+                self._error = e
+            finally:
+                self._queue.task_done()
+
+    def _raise_if_failed(self):
+        if self._error is not None:
+            raise self._error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def write_chunks(
+    chunks: Iterable[Chunk],
+    sink: ChunkSink,
+    batch_size: int = 256,
+    max_pending_batches: int = 4,
+) -> int:
+    """Streams chunks into a sink with bounded buffering; returns the number written."""
+    with BatchWriter(sink, batch_size, max_pending_batches) as writer:
+        writer.extend(chunks)
+    return writer.written
@@ -1,6 +1,9 @@
-from typing import List, Dict, Any
-from langchain_text_splitters import RecursiveCharacterTextSplitter
-from doc_adapter_abs import DocumentAdapter
+import codecs
+import mmap
+import tempfile
+from typing import List, Dict, Any, Iterator, Union
+from doc_adapter_abs import BufferSource, DocumentAdapter, Source, open_text, source_size
+from chunker import ByteView, RecursiveSpanSplitter, StrView, length_function
 
 
 """
@@ -11,47 +14,140 @@ Key Considerations for Plain Text:
 1. Separator Hierarchy: Notice the separators list. It starts with \n\n (double newline). This ensures that if your text has distinct paragraphs, they are treated as separate units. It only breaks a paragraph into smaller pieces if that paragraph exceeds the chunk_size.
 2. Encoding Resilience: Text files often come in varied encodings (UTF-8, Latin-1). The load method includes a basic try-except block to prevent the ingestion pipeline from crashing on older text documents.
 3. Semantic Overlap: The chunk_overlap (100 characters) is critical for plain text. Since there are no headers to provide context, the overlap ensures that a search query matching the end of "Chunk A" can still "see" the beginning of the context in "Chunk B."
+4. Multi-GB Logs: Files at or above RAGConfig.text_stream_threshold are not read into a string at all. load() returns a memory-mapped MappedText, and iter_process() walks it with the span-based RecursiveSpanSplitter, which yields exactly the same chunks (including overlap across what would be window edges) while memory stays at a few multiples of chunk_size.
+5. Offsets: Every chunk records start_index/end_index, its character offsets in the loaded text (after newline normalization), so citations can point at the exact passage. With chunk_unit="tokens", chunk_size and chunk_overlap count tokens instead of characters.
 """
 
+# Paragraphs > Sentences > Words
+TEXT_SEPARATORS = ["\n\n", "\n", ". ", "? ", "! ", " ", ""]
+
+# Bytes inspected to guess the encoding, and window size for validating the rest
+ENCODING_SAMPLE_BYTES = 64 * 1024
+VALIDATION_WINDOW_BYTES = 8 * 1024 * 1024
+
+
+class MappedText:
+    """
+    A large text file mapped into memory instead of read into a string.
+    Mirrors load()'s text-mode semantics: UTF-8 with a Latin-1 fallback, and
+    universal newlines (\\r\\n and \\r become \\n).
+    """
+    def __init__(self, source: Source):
+        self.source = source
+        if isinstance(source, BufferSource):
+            # Already in memory or mapped by the caller, who also owns its lifetime
+            self._file = None
+            self._map = source.data
+        else:
+            self._file = open(source, "rb")
+            self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.encoding = self._detect_encoding(self._map)
+
+        # Text mode would translate line endings; do the same once, into a spill file
+        if self._map.find(b"\r") != -1:
+            self._normalize_newlines()
+
+        self.view = ByteView(self._map, self.encoding)
+
+    @staticmethod
+    def _detect_encoding(buf) -> str:
+        """Guesses the encoding from a sample, then validates the rest window by window."""
+        decoder = codecs.getincrementaldecoder("utf-8")()
+        try:
+            decoder.decode(buf[:ENCODING_SAMPLE_BYTES], final=False)
+            for offset in range(ENCODING_SAMPLE_BYTES, len(buf), VALIDATION_WINDOW_BYTES):
+                decoder.decode(buf[offset:offset + VALIDATION_WINDOW_BYTES], final=False)
+            decoder.decode(b"", final=True)
+            return "utf-8"
+        except UnicodeDecodeError:
+            # Fallback for legacy text files (e.g., Windows-1252)
+            return "latin-1"
+
+    def _normalize_newlines(self):
+        """Rewrites the file with universal newlines into an anonymous temp file and maps that."""
+        spill = tempfile.TemporaryFile()
+        with open_text(self.source, self.encoding) as src:
+            while True:
+                block = src.read(VALIDATION_WINDOW_BYTES)
+                if not block:
+                    break
+                spill.write(block.encode(self.encoding))
+        spill.flush()
+
+        self.close()
+        self._file = spill
+        self._map = mmap.mmap(spill.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def read(self) -> str:
+        """Decodes the whole file (only for callers that really need one string)."""
+        return self.view.text(0, self.view.size)
+
+    def close(self):
+        if self._file is not None:
+            self._map.close()
+            self._file.close()
+
 class TextAdapter(DocumentAdapter):
     """
     Adapter for plain text files.
     Uses recursive splitting to preserve semantic boundaries (paragraphs/sentences).
     """
+    # 2: chunks carry start_index/end_index and can be sized in tokens
+    version = "2"
+    config_fields = ("chunk_size", "chunk_overlap", "chunk_unit")
+
+    def load(self, source: Source) -> Union[str, MappedText]:
+        """
+        Reads the plain text file (or buffer) with fallback encoding handling.
+        Sources at or above config.text_stream_threshold are memory-mapped (or
+        split straight from the buffer) instead.
+        """
+        size = source_size(source)
+        if size and size >= self.config.text_stream_threshold:
+            return MappedText(source)
 
-    def load(self, source: str) -> str:
-        """Reads the plain text file with fallback encoding handling."""
         try:
-            with open(source, 'r', encoding='utf-8') as f:
+            with open_text(source, 'utf-8') as f:
                 return f.read()
         except UnicodeDecodeError:
             # Fallback for legacy text files (e.g., Windows-1252)
-            with open(source, 'r', encoding='latin-1') as f:
+            with open_text(source, 'latin-1') as f:
                 return f.read()
 
-    def process(self, raw_data: str) -> List[Dict[str, Any]]:
+    def process(self, raw_data: Union[str, MappedText]) -> List[Dict[str, Any]]:
         """
         Splits text based on a hierarchy of separators to keep 
         related sentences together.
         """
-        # Recursive splitter tries to split by the first separator, 
+        return list(self.iter_process(raw_data))
+
+    def iter_process(self, raw_data: Union[str, MappedText]) -> Iterator[Dict[str, Any]]:
+        """Yields chunks lazily; memory-mapped input is never copied into one string."""
+        # Recursive splitter tries to split by the first separator,
         # moving to the next if the chunk is still too large.
-        text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=self.config.chunk_size, 
+        splitter = RecursiveSpanSplitter(
+            chunk_size=self.config.chunk_size,
             chunk_overlap=self.config.chunk_overlap,
-            # Priority: Paragraphs > Sentences > Words
-            separators=["\n\n", "\n", ". ", "? ", "! ", " ", ""]
+            separators=TEXT_SEPARATORS,
+            length_function=length_function(self.config.chunk_unit),
         )
-        
-        chunks = text_splitter.split_text(raw_data)
-        
-        return [
-            {
+        # Same separator hierarchy for strings and byte spans of a mapped file
+        view = raw_data.view if isinstance(raw_data, MappedText) else StrView(raw_data)
+
+        for start, end in splitter.iter_spans(view):
+            chunk = view.text(start, end)
+            yield {
                 "text": chunk, 
                 "metadata": {
                     "format": "plain_text",
-                    "character_count": len(chunk)
+                    "character_count": len(chunk),
+                    # Character offsets into the loaded text, for citations
+                    "start_index": view.char_offset(start),
+                    "end_index": view.char_offset(end),
                 }
-            } 
-            for chunk in chunks
-        ]
+            }
+
+    def dump_raw(self, raw_data: Union[str, MappedText]) -> bytes:
+        if isinstance(raw_data, MappedText):
+            raw_data = raw_data.read()
+        return super().dump_raw(raw_data)
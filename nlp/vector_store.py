@@ -0,0 +1,454 @@
+import json
+import os
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+import numpy as np
+
+
+"""
+Ingested chunks need somewhere to live for retrieval. The LocalVectorStore serves them from a single node without an external vector DB.
+
+On-disk Layout (one directory):
+- meta.json: dimension, dtype, row count, column kinds, dictionary file sizes and IVF settings. It stays small and is replaced atomically as the last step of every append, so its row count is the commit point.
+- vectors.bin: the embedding matrix as raw float32/float16 rows, opened with np.memmap.
+- texts.bin / text_offsets.bin: chunk texts as concatenated UTF-8 with int64 end offsets.
+- meta_<column>.i64: integer metadata (page_number, start_index, ...) as raw int64 values; INT64_MIN means the row has no value.
+- meta_<column>.bin / meta_<column>.dict: every other metadata key (format, type, Header_1, source_type, ...) as one int32 code per row (-1 means no value) plus an append-only dictionary, one JSON value per line.
+- ivf_centroids.npy / ivf_lists.bin: optional IVF index (k-means centroids and the list of every row).
+
+Opening a store truncates every file to what meta.json commits, so an append interrupted by a crash leaves no misaligned rows behind.
+
+Key Features:
+1. Lazy Opening: Nothing but meta.json is read at open time (dictionaries load per column on first use); vectors, texts and metadata columns are memory-mapped, so the OS pages in only what a search touches.
+2. Exact Search: Cosine similarity (vectors are L2-normalized on insert) computed with NumPy over blocks of rows, keeping only the running top-k, so memory is bounded by the block size.
+3. Approximate Search (IVF): build_ivf() clusters a sample of the vectors with k-means; a query scores only the rows in its nprobe nearest lists. Rows appended later are assigned to their nearest list at insert time.
+4. Metadata Filtering: Filters like {"format": "markdown", "page_number": [1, 2]} are resolved to dictionary codes once and evaluated as vectorized comparisons over the code columns before any vector math.
+5. Incremental Appends: add() only appends to the files, so an ingestion run can stream into an existing store (see VectorStoreSink in sinks.py).
+"""
+
+
+Chunk = Dict[str, Any]
+
+DTYPES = {"float32": np.float32, "float16": np.float16}
+MISSING = -1
+MISSING_INT = np.iinfo(np.int64).min
+INT, DICT = "int", "dict"
+
+
+def _column_file(name: str, suffix: str = "bin") -> str:
+    # Metadata keys are free-form; keep the file name filesystem-safe
+    safe = "".join(c if c.isalnum() or c in "-_" else f"%{ord(c):02x}" for c in name)
+    return f"meta_{safe}.{suffix}"
+
+
+def _is_int(value: Any) -> bool:
+    return type(value) is int and MISSING_INT < value <= np.iinfo(np.int64).max
+
+
+def _encode(value: Any) -> str:
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class LocalVectorStore:
+    """
+    Memory-mapped vector index with columnar metadata, exact and IVF search.
+    """
+    def __init__(self, path: str, dimension: int = None, dtype: str = "float32"):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        if dtype not in DTYPES:
+            raise ValueError(f"Unsupported dtype: {dtype} (expected one of {list(DTYPES)})")
+        self._new_meta = {
+            "dimension": dimension,
+            "dtype": dtype,
+            "count": 0,
+            # column -> {"kind": "int"} or {"kind": "dict", "bytes": <dictionary file size>}
+            "columns": {},
+            "nlist": 0,
+        }
+        self._open()
+
+    def _open(self):
+        """(Re)reads meta.json and truncates every file to the rows it commits."""
+        meta_path = os.path.join(self.path, "meta.json")
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                self.meta = json.load(f)
+        else:
+            self.meta = json.loads(json.dumps(self._new_meta))
+
+        # Per column, loaded on first use: decoded values and value -> code lookups
+        self._values: Dict[str, List[Any]] = {}
+        self._codes: Dict[str, Dict[str, int]] = {}
+        self._maps: Dict[str, np.memmap] = {}
+        self._centroids: Optional[np.ndarray] = None
+        self._reconcile()
+
+    def _reconcile(self):
+        count = self.count
+        sizes = {"text_offsets.bin": count * 8, "texts.bin": self._text_end()}
+        if self.dimension:
+            sizes["vectors.bin"] = count * self.dimension * np.dtype(self.dtype).itemsize
+        if self.meta["nlist"]:
+            sizes["ivf_lists.bin"] = count * 4
+        for column, info in self.meta["columns"].items():
+            if info["kind"] == INT:
+                sizes[_column_file(column, "i64")] = count * 8
+            else:
+                sizes[_column_file(column)] = count * 4
+                sizes[_column_file(column, "dict")] = info["bytes"]
+        for name, size in sizes.items():
+            file_path = os.path.join(self.path, name)
+            if os.path.exists(file_path) and os.path.getsize(file_path) > size:
+                os.truncate(file_path, size)
+        self._maps.clear()
+
+    # --------------------------------------------------
+    # Properties
+    # --------------------------------------------------
+    @property
+    def count(self) -> int:
+        return self.meta["count"]
+
+    @property
+    def dimension(self) -> Optional[int]:
+        return self.meta["dimension"]
+
+    @property
+    def dtype(self):
+        return DTYPES[self.meta["dtype"]]
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.meta["columns"])
+
+    def __len__(self) -> int:
+        return self.count
+
+    # --------------------------------------------------
+    # Appends
+    # --------------------------------------------------
+    def add(self, chunks: Iterable[Chunk]) -> int:
+        """Appends chunks that carry an "embedding"; returns how many were added."""
+        chunks = [chunk for chunk in chunks if chunk.get("embedding") is not None]
+        if not chunks:
+            return 0
+        try:
+            self._add(chunks)
+        except BaseException:
+            # Drop whatever part of the batch reached the files (and the in-memory state)
+            self._open()
+            raise
+        return len(chunks)
+
+    def _add(self, chunks: List[Chunk]):
+        vectors = np.asarray([chunk["embedding"] for chunk in chunks], dtype=np.float32)
+        if self.dimension is None:
+            self.meta["dimension"] = vectors.shape[1]
+        if vectors.shape[1] != self.dimension:
+            raise ValueError(f"Expected {self.dimension}-dimensional embeddings, got {vectors.shape[1]}")
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        vectors /= np.where(norms == 0, 1, norms)
+
+        start = self.count
+        self._append("vectors.bin", vectors.astype(self.dtype))
+
+        # Texts: concatenated UTF-8 with cumulative end offsets
+        encoded = [chunk["text"].encode("utf-8") for chunk in chunks]
+        base = self._text_end()
+        ends = base + np.cumsum([len(b) for b in encoded], dtype=np.int64)
+        self._append("texts.bin", b"".join(encoded))
+        self._append("text_offsets.bin", ends)
+
+        # Metadata: one column per key, backfilled for keys seen for the first time.
+        # Integer keys are stored as is; a non-integer value turns the column into a dictionary one.
+        metadatas = [chunk.get("metadata", {}) for chunk in chunks]
+        values: Dict[str, List[Any]] = {}
+        for metadata in metadatas:
+            for key, value in metadata.items():
+                values.setdefault(key, []).append(value)
+        converted = []
+        for key, seen in values.items():
+            all_ints = all(_is_int(value) for value in seen)
+            info = self.meta["columns"].get(key)
+            if info is None:
+                if all_ints:
+                    self.meta["columns"][key] = {"kind": INT}
+                    self._write(_column_file(key, "i64"), np.full(start, MISSING_INT, dtype=np.int64))
+                else:
+                    self.meta["columns"][key] = {"kind": DICT, "bytes": 0}
+                    self._values[key], self._codes[key] = [], {}
+                    self._write(_column_file(key, "dict"), b"")
+                    self._write(_column_file(key), np.full(start, MISSING, dtype=np.int32))
+            elif info["kind"] == INT and not all_ints:
+                self._to_dictionary(key)
+                converted.append(key)
+
+        for column, info in self.meta["columns"].items():
+            if info["kind"] == INT:
+                data = np.fromiter(
+                    (metadata.get(column, MISSING_INT) for metadata in metadatas),
+                    dtype=np.int64,
+                    count=len(chunks),
+                )
+                self._append(_column_file(column, "i64"), data)
+            else:
+                self._load_dictionary(column)
+                new_values: List[str] = []
+                data = np.fromiter(
+                    (self._code_for(column, metadata, new_values) for metadata in metadatas),
+                    dtype=np.int32,
+                    count=len(chunks),
+                )
+                if new_values:
+                    encoded = "".join(value + "\n" for value in new_values).encode("utf-8")
+                    self._append(_column_file(column, "dict"), encoded)
+                    info["bytes"] += len(encoded)
+                self._append(_column_file(column), data)
+
+        if self.meta["nlist"]:
+            self._append("ivf_lists.bin", self._assign(vectors))
+
+        self.meta["count"] = start + len(chunks)
+        self._save_meta()
+        for column in converted:
+            os.remove(os.path.join(self.path, _column_file(column, "i64")))
+
+    def _to_dictionary(self, column: str):
+        """Rewrites an integer column as dictionary codes (committed by the next _save_meta)."""
+        ints = self._map(_column_file(column, "i64"), np.int64)
+        distinct = np.unique(ints[ints != MISSING_INT])
+        encoded = "".join(_encode(int(value)) + "\n" for value in distinct).encode("utf-8")
+        codes = np.full(self.count, MISSING, dtype=np.int32)
+        present = ints != MISSING_INT
+        codes[present] = np.searchsorted(distinct, ints[present])
+
+        self._write(_column_file(column, "dict"), encoded)
+        self._write(_column_file(column), codes)
+        self.meta["columns"][column] = {"kind": DICT, "bytes": len(encoded)}
+        self._values[column] = [int(value) for value in distinct]
+        self._codes[column] = {_encode(value): code for code, value in enumerate(self._values[column])}
+
+    def _load_dictionary(self, column: str):
+        if column in self._codes:
+            return
+        with open(os.path.join(self.path, _column_file(column, "dict")), "rb") as f:
+            lines = f.read(self.meta["columns"][column]["bytes"]).decode("utf-8").splitlines()
+        self._values[column] = [json.loads(line) for line in lines]
+        self._codes[column] = {line: code for code, line in enumerate(lines)}
+
+    def _code_for(self, column: str, metadata: Dict[str, Any], new_values: List[str]) -> int:
+        if column not in metadata:
+            return MISSING
+        value = _encode(metadata[column])
+        code = self._codes[column].get(value)
+        if code is None:
+            code = self._codes[column][value] = len(self._values[column])
+            self._values[column].append(json.loads(value))
+            new_values.append(value)
+        return code
+
+    def _append(self, name: str, data, mode: str = "ab"):
+        with open(os.path.join(self.path, name), mode) as f:
+            f.write(data if isinstance(data, bytes) else data.tobytes())
+        self._maps.pop(name, None)
+
+    def _write(self, name: str, data):
+        # New column files replace any uncommitted leftovers of an interrupted append
+        self._append(name, data, mode="wb")
+
+    def _text_end(self) -> int:
+        if self.count == 0:
+            return 0
+        return int(self._map("text_offsets.bin", np.int64)[self.count - 1])
+
+    def _save_meta(self):
+        tmp = os.path.join(self.path, "meta.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.meta, f)
+        os.replace(tmp, os.path.join(self.path, "meta.json"))
+
+    # --------------------------------------------------
+    # Memory maps
+    # --------------------------------------------------
+    def _map(self, name: str, dtype, columns: int = None) -> np.ndarray:
+        """Read-only memory map of the first count rows of a file."""
+        mapped = self._maps.get(name)
+        rows = self.count
+        if mapped is None or mapped.shape[0] != rows:
+            if rows == 0:
+                shape = (0, columns) if columns else (0,)
+                return np.empty(shape, dtype=dtype)
+            shape = (rows, columns) if columns else (rows,)
+            mapped = self._maps[name] = np.memmap(
+                os.path.join(self.path, name), dtype=dtype, mode="r", shape=shape
+            )
+        return mapped
+
+    def vectors(self) -> np.ndarray:
+        return self._map("vectors.bin", self.dtype, self.dimension)
+
+    def _column(self, column: str) -> np.ndarray:
+        if self.meta["columns"][column]["kind"] == INT:
+            return self._map(_column_file(column, "i64"), np.int64)
+        return self._map(_column_file(column), np.int32)
+
+    # --------------------------------------------------
+    # Row access
+    # --------------------------------------------------
+    def text(self, row: int) -> str:
+        ends = self._map("text_offsets.bin", np.int64)
+        start = int(ends[row - 1]) if row else 0
+        with open(os.path.join(self.path, "texts.bin"), "rb") as f:
+            f.seek(start)
+            return f.read(int(ends[row]) - start).decode("utf-8")
+
+    def metadata(self, row: int) -> Dict[str, Any]:
+        result = {}
+        for column, info in self.meta["columns"].items():
+            value = int(self._column(column)[row])
+            if info["kind"] == INT:
+                if value != MISSING_INT:
+                    result[column] = value
+            elif value != MISSING:
+                self._load_dictionary(column)
+                result[column] = self._values[column][value]
+        return result
+
+    def get(self, row: int) -> Chunk:
+        return {"text": self.text(row), "metadata": self.metadata(row)}
+
+    # --------------------------------------------------
+    # Filtering
+    # --------------------------------------------------
+    def filter_mask(self, where: Dict[str, Any]) -> np.ndarray:
+        """
+        Boolean row mask for equality filters; a list/tuple/set value means "any of".
+        Unknown columns or values match nothing.
+        """
+        mask = np.ones(self.count, dtype=bool)
+        for column, wanted in where.items():
+            options = wanted if isinstance(wanted, (list, tuple, set)) else [wanted]
+            info = self.meta["columns"].get(column)
+            if info is None:
+                codes = []
+            elif info["kind"] == INT:
+                codes = [v for v in options if _is_int(v)]
+            else:
+                self._load_dictionary(column)
+                codes = [self._codes[column].get(_encode(v)) for v in options]
+                codes = [code for code in codes if code is not None]
+            if not codes:
+                return np.zeros(self.count, dtype=bool)
+            mask &= np.isin(self._column(column), codes)
+        return mask
+
+    # --------------------------------------------------
+    # Search
+    # --------------------------------------------------
+    def search(
+        self,
+        query: Sequence[float],
+        k: int = 5,
+        where: Dict[str, Any] = None,
+        nprobe: int = None,
+        block_rows: int = 65536,
+    ) -> List[Chunk]:
+        """
+        Top-k chunks by cosine similarity, each with a "score" and its "row".
+        Uses the IVF index when one is built and nprobe is given; otherwise scans exactly.
+        """
+        if self.count == 0:
+            return []
+        q = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(q)
+        if norm:
+            q = q / norm
+
+        mask = self.filter_mask(where) if where else None
+        if nprobe and self.meta["nlist"]:
+            probes = np.argsort(self.centroids() @ q)[::-1][:nprobe]
+            in_lists = np.isin(self._map("ivf_lists.bin", np.int32), probes)
+            mask = in_lists if mask is None else mask & in_lists
+
+        rows, scores = self._scan(q, k, mask, block_rows)
+        results = []
+        for row, score in zip(rows, scores):
+            chunk = self.get(int(row))
+            chunk["score"] = float(score)
+            chunk["row"] = int(row)
+            results.append(chunk)
+        return results
+
+    def _scan(self, q: np.ndarray, k: int, mask: Optional[np.ndarray], block_rows: int):
+        """Blockwise dot products keeping only the running top-k."""
+        vectors = self.vectors()
+        best_rows = np.empty(0, dtype=np.int64)
+        best_scores = np.empty(0, dtype=np.float32)
+
+        for start in range(0, self.count, block_rows):
+            end = min(start + block_rows, self.count)
+            if mask is None:
+                rows = np.arange(start, end)
+            else:
+                rows = start + np.flatnonzero(mask[start:end])
+                if rows.size == 0:
+                    continue
+            block = vectors[rows] if mask is not None else vectors[start:end]
+            scores = block.astype(np.float32) @ q
+
+            best_rows = np.concatenate([best_rows, rows])
+            best_scores = np.concatenate([best_scores, scores])
+            if best_scores.size > k:
+                keep = np.argpartition(best_scores, -k)[-k:]
+                best_rows, best_scores = best_rows[keep], best_scores[keep]
+
+        order = np.argsort(best_scores)[::-1]
+        return best_rows[order], best_scores[order]
+
+    # --------------------------------------------------
+    # IVF index
+    # --------------------------------------------------
+    def centroids(self) -> np.ndarray:
+        if self._centroids is None:
+            self._centroids = np.load(os.path.join(self.path, "ivf_centroids.npy"))
+        return self._centroids
+
+    def build_ivf(self, nlist: int = None, iterations: int = 10, sample_size: int = 50000, seed: int = 0):
+        """
+        Clusters a sample of the vectors into nlist lists (k-means, spherical)
+        and assigns every row to its nearest list.
+        """
+        if self.count == 0:
+            raise ValueError("Cannot build an IVF index over an empty store")
+        nlist = min(nlist or max(1, int(np.sqrt(self.count))), self.count)
+        rng = np.random.default_rng(seed)
+        vectors = self.vectors()
+
+        sample_rows = np.sort(rng.choice(self.count, size=min(sample_size, self.count), replace=False))
+        sample = np.asarray(vectors[sample_rows], dtype=np.float32)
+        centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[labels == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    centroids[c] = centroid / (np.linalg.norm(centroid) or 1)
+
+        np.save(os.path.join(self.path, "ivf_centroids.npy"), centroids)
+        self._centroids = centroids
+
+        # Assign every row, a block at a time
+        lists = os.path.join(self.path, "ivf_lists.bin")
+        with open(lists, "wb") as f:
+            for start in range(0, self.count, 65536):
+                f.write(self._assign(vectors[start:start + 65536]).tobytes())
+        self._maps.pop("ivf_lists.bin", None)
+
+        self.meta["nlist"] = nlist
+        self._save_meta()
+
+    def _assign(self, vectors: np.ndarray) -> np.ndarray:
+        return np.argmax(np.asarray(vectors, dtype=np.float32) @ self.centroids().T, axis=1).astype(np.int32)
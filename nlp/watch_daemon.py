@@ -0,0 +1,338 @@
+import os
+import signal
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+from ingestion_factory import IngestionFactory
+from ingestion_manifest import IngestionManifest
+from parallel_ingestion import collect_result, ingest_file, init_worker
+from rag_config import RAGConfig, pool_worker_config
+from sinks import BatchWriter
+import metrics
+
+
+"""
+Running main.py from cron adds minutes of latency and re-lists large raw/ folders on every tick.
+The WatchDaemon keeps the pipeline running and ingests each file within seconds of it landing in raw/.
+
+Key Features:
+1. Change Detection: Uses watchdog (inotify on Linux) when installed; otherwise polls raw/ every poll_interval seconds. Either way, raw/ is fully listed only once at start-up when watchdog is available.
+2. Stability Window: A file is only picked up once its size and mtime have not changed for stable_seconds, so partially copied files are never parsed. Temporary/hidden names (.part, .tmp, dotfiles) are ignored.
+3. Backpressure: At most max_in_flight files are submitted to the worker pools. When workers fall behind, ready files simply stay in raw/ until a slot frees up, so nothing is buffered in memory.
+4. Heavy/Light Pools: Like the ParallelIngestor, PDF/OCR files go to a small heavy pool and text/markdown to a light pool, with warm models per worker.
+5. Atomic Moves: Finished files are moved into processed/ or error/ with os.replace, which is atomic on the same filesystem.
+6. Graceful Shutdown: SIGTERM/SIGINT stop new submissions and let in-flight files finish (up to shutdown_timeout). Workers still busy after that are terminated and their files are left in raw/, so the next start re-queues them.
+7. Crash Recovery: If a worker process dies (e.g. killed for memory on a huge PDF), its pool is recreated and the affected files stay in raw/ to be retried; a file involved in max_crashes crashes is moved to error/. A sink failure stops the daemon and leaves the file in raw/.
+"""
+
+
+# Names written by copy tools and editors while a file is still incomplete
+IGNORED_SUFFIXES = (".part", ".tmp", ".crdownload", ".partial", ".swp")
+
+
+def _terminate_workers(executor: ProcessPoolExecutor):
+    """Shuts a pool down without waiting for running tasks, killing its workers."""
+    terminate = getattr(executor, "terminate_workers", None)  # Python 3.14+
+    if terminate is not None:
+        terminate()
+        return
+    # shutdown() drops the process table, so grab it first
+    processes = list((executor._processes or {}).values())
+    executor.shutdown(wait=False, cancel_futures=True)
+    for process in processes:
+        process.terminate()
+
+
+def _init_daemon_worker(
+    config: RAGConfig,
+    manifest: Optional[IngestionManifest],
+    warm_mime_types: List[str],
+    collect_metrics: bool = False,
+):
+    """Worker initializer: leave signal handling to the daemon, then build the factory."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    init_worker(config, manifest, warm_mime_types, collect_metrics)
+
+
+class FolderWatcher:
+    """
+    Tracks files in a folder and reports the ones that have stopped changing.
+    """
+    def __init__(self, folder: str, stable_seconds: float = 2.0, use_watchdog: bool = True):
+        self.folder = folder
+        self.stable_seconds = stable_seconds
+
+        # path -> (size, mtime_ns, monotonic time the stat last changed)
+        self._pending: Dict[str, Tuple[int, int, float]] = {}
+        self._lock = threading.Lock()
+        self._observer = None
+
+        if use_watchdog:
+            self._observer = self._start_observer()
+        self.rescan()
+
+    @property
+    def uses_events(self) -> bool:
+        return self._observer is not None
+
+    def _start_observer(self):
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            return None
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                # Moves into raw/ report the new name as dest_path
+                watcher.touch(getattr(event, "dest_path", None) or event.src_path)
+
+        observer = Observer()
+        observer.schedule(Handler(), self.folder, recursive=False)
+        observer.daemon = True
+        observer.start()
+        return observer
+
+    def touch(self, path: str):
+        """Marks a path as (possibly) changed."""
+        name = os.path.basename(path)
+        if name.startswith(".") or name.endswith(IGNORED_SUFFIXES):
+            return
+        if os.path.dirname(os.path.abspath(path)) != os.path.abspath(self.folder):
+            return
+        with self._lock:
+            self._pending.setdefault(path, (-1, -1, time.monotonic()))
+
+    def rescan(self):
+        """Lists the folder once (start-up, or every tick in polling mode)."""
+        with os.scandir(self.folder) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    self.touch(entry.path)
+
+    def ready(self, exclude: Iterable[str] = ()) -> List[str]:
+        """Files whose size and mtime have not changed for stable_seconds, oldest first."""
+        if not self.uses_events:
+            self.rescan()
+
+        exclude = set(exclude)
+        now = time.monotonic()
+        ready = []
+        with self._lock:
+            for path, (size, mtime, since) in list(self._pending.items()):
+                if path in exclude:
+                    continue
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    del self._pending[path]  # Deleted or moved away before it settled
+                    continue
+                if (stat.st_size, stat.st_mtime_ns) != (size, mtime):
+                    self._pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+                elif now - since >= self.stable_seconds:
+                    ready.append((since, path))
+        return [path for _, path in sorted(ready)]
+
+    def forget(self, path: str):
+        """Stops tracking a file (after it was moved out of the folder)."""
+        with self._lock:
+            self._pending.pop(path, None)
+
+    def stop(self):
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
+
+
+class WatchDaemon:
+    """
+    Continuously ingests files that land in <document_folder>/raw.
+    """
+    def __init__(
+        self,
+        document_folder: str,
+        writer: BatchWriter,
+        config: RAGConfig = None,
+        manifest: IngestionManifest = None,
+        heavy_workers: int = None,
+        light_workers: int = None,
+        max_in_flight: int = None,
+        stable_seconds: float = 2.0,
+        poll_interval: float = 1.0,
+        shutdown_timeout: float = 300.0,
+        max_crashes: int = 3,
+        prepare: Callable[[Iterable[Dict[str, Any]], str], Iterable[Dict[str, Any]]] = None,
+    ):
+        self.raw_dir = os.path.join(document_folder, "raw")
+        self.processed_dir = os.path.join(document_folder, "processed")
+        self.error_dir = os.path.join(document_folder, "error")
+        for folder in (self.raw_dir, self.processed_dir, self.error_dir):
+            os.makedirs(folder, exist_ok=True)
+
+        self.writer = writer
+        self.config = config or RAGConfig()
+        self.manifest = manifest
+        cpus = os.cpu_count() or 1
+        self.heavy_workers = heavy_workers or max(1, cpus // 2)
+        self.light_workers = light_workers or max(1, cpus - self.heavy_workers)
+        self.max_in_flight = max_in_flight or 2 * (self.heavy_workers + self.light_workers)
+        self.stable_seconds = stable_seconds
+        self.poll_interval = poll_interval
+        self.shutdown_timeout = shutdown_timeout
+        self.max_crashes = max_crashes
+
+        # Optional per-file chunk transform (dedup, embedding) applied before the sink
+        self.prepare = prepare
+
+        # Parent-side factory, used only for MIME detection and routing
+        self.factory = IngestionFactory(self.config)
+        self._stop = threading.Event()
+        # path -> how many times a worker died while the file was in flight
+        self._crashes: Dict[str, int] = {}
+
+        self.processed = 0
+        self.failed = 0
+        self.total_chunks = 0
+
+    def stop(self, *_):
+        """Requests a graceful shutdown (also the SIGTERM/SIGINT handler)."""
+        self._stop.set()
+
+    def run(self):
+        """Watches raw/ until stop() is called or a termination signal arrives."""
+        previous = {
+            sig: signal.signal(sig, self.stop) for sig in (signal.SIGTERM, signal.SIGINT)
+        }
+        watcher = FolderWatcher(self.raw_dir, self.stable_seconds)
+        mode = "inotify/watchdog" if watcher.uses_events else f"polling every {self.poll_interval}s"
+        print(f"Watching {self.raw_dir} ({mode}); Ctrl+C or SIGTERM to stop.")
+
+        def pool(cpu_bound: bool, workers: int) -> ProcessPoolExecutor:
+            warm = self.factory.registered_mime_types(cpu_bound)
+            return ProcessPoolExecutor(
+                max_workers=workers,
+                initializer=_init_daemon_worker,
+                initargs=(pool_worker_config(self.config, workers), self.manifest, warm, metrics.enabled()),
+            )
+
+        sizes = {True: self.heavy_workers, False: self.light_workers}
+        pools = {cpu_bound: pool(cpu_bound, workers) for cpu_bound, workers in sizes.items()}
+        # future -> (file path, pool it was submitted to)
+        in_flight: Dict[Future, Tuple[str, ProcessPoolExecutor]] = {}
+
+        def replace_if_broken(executor: ProcessPoolExecutor):
+            for cpu_bound, current in pools.items():
+                if current is executor:
+                    print(f"A {'heavy' if cpu_bound else 'light'} worker died; restarting its pool.")
+                    current.shutdown(wait=False)
+                    pools[cpu_bound] = pool(cpu_bound, sizes[cpu_bound])
+
+        def collect(done: Iterable[Future]):
+            for future in done:
+                file_path, executor = in_flight.pop(future)
+                if isinstance(future.exception(), BrokenProcessPool):
+                    replace_if_broken(executor)
+                self._collect(watcher, file_path, future)
+
+        try:
+            while not self._stop.is_set():
+                # 1. Admit stable files only while there is room (backpressure)
+                free = self.max_in_flight - len(in_flight)
+                if free > 0:
+                    busy = [file_path for file_path, _ in in_flight.values()]
+                    for file_path in watcher.ready(exclude=busy)[:free]:
+                        try:
+                            mime_type = self.factory.detect_mime_type(file_path)
+                            cpu_bound = self.factory.is_cpu_bound(mime_type)
+                        except Exception as e:
+                            self._finish(watcher, file_path, error=e)
+                            continue
+                        target = pools[cpu_bound]
+                        try:
+                            in_flight[target.submit(ingest_file, file_path)] = (file_path, target)
+                        except BrokenProcessPool:
+                            # The file stays in raw/ and is picked up again next tick
+                            replace_if_broken(target)
+
+                # 2. Handle whatever finished, waking up at least every poll_interval
+                if in_flight:
+                    done, _ = wait(in_flight, timeout=self.poll_interval, return_when=FIRST_COMPLETED)
+                    collect(done)
+                else:
+                    self._stop.wait(self.poll_interval)
+
+            # 3. Graceful shutdown: finish what is running, leave the rest in raw/
+            if in_flight:
+                print(f"Shutting down: waiting for {len(in_flight)} in-flight file(s)...")
+                done, _ = wait(in_flight, timeout=self.shutdown_timeout)
+                collect(done)
+                for file_path, _ in in_flight.values():
+                    print(f"Re-queued for next start: {file_path}")
+        finally:
+            # Files still in flight here were abandoned (timeout or sink failure): don't wait for them
+            for executor in pools.values():
+                if in_flight:
+                    _terminate_workers(executor)
+                else:
+                    executor.shutdown(wait=True)
+            watcher.stop()
+            for sig, handler in previous.items():
+                signal.signal(sig, handler)
+
+        print(f"Watcher stopped: {self.processed} processed, {self.failed} failed, {self.total_chunks} chunks.")
+
+    def _collect(self, watcher: FolderWatcher, file_path: str, future: Future):
+        filename = os.path.basename(file_path)
+        try:
+            chunks = collect_result(future)
+        except BrokenProcessPool as e:
+            # Any file in flight on the pool fails this way, not just the one that killed the worker
+            self._crashes[file_path] = self._crashes.get(file_path, 0) + 1
+            if self._crashes[file_path] >= self.max_crashes:
+                self._finish(watcher, file_path, error=e)
+            else:
+                print(f"↻ {filename}: worker crashed, retrying.")
+            return
+        except Exception as e:
+            self._finish(watcher, file_path, error=e)
+            return
+
+        # Dedup, embedding and sink failures are not the file's fault: stop, and
+        # leave the file in raw/ for the next start
+        try:
+            if self.prepare is not None:
+                chunks = self.prepare(chunks, filename)
+            count = self.writer.extend(chunks)
+            # Make the file's chunks visible to readers right away
+            self.writer.sync()
+        except Exception as e:
+            print(f"✖ Stopping: could not write chunks of {filename} ({e}); it stays in raw/.")
+            self.writer.abort()
+            self._stop.set()
+            raise
+
+        self.total_chunks += count
+        self._finish(watcher, file_path)
+        print(f"✔ {os.path.basename(file_path)}: {count} chunks.")
+
+    def _finish(self, watcher: FolderWatcher, file_path: str, error: BaseException = None):
+        """Moves a file out of raw/ atomically."""
+        self._crashes.pop(file_path, None)
+        target_dir = self.processed_dir if error is None else self.error_dir
+        if error is None:
+            self.processed += 1
+        else:
+            self.failed += 1
+            print(f"✖ {os.path.basename(file_path)}: {error}")
+        try:
+            os.replace(file_path, os.path.join(target_dir, os.path.basename(file_path)))
+        except FileNotFoundError:
+            pass  # Removed from raw/ while it was being processed
+        watcher.forget(file_path)